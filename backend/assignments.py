@@ -0,0 +1,242 @@
+# assignments.py
+
+import json
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+# Bind parameters per IN (...) list; stays under SQLite's default variable limit
+ID_CHUNK = 900
+
+_assignments = models.TruckAssignment.__table__
+_loads = models.TruckLoad.__table__
+_shipments = models.Shipment.__table__
+_trucks = models.Truck.__table__
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK):
+        yield ids[start:start + ID_CHUNK]
+
+
+def _city(column):
+    return func.lower(func.trim(column["city"].as_string()))
+
+
+# ===================== LOADS ===================== #
+def _load_select():
+    """Per-truck aggregate over truck_assignments joined to shipments."""
+    return (
+        select(
+            _assignments.c.truck_id,
+            func.count(),
+            func.coalesce(func.sum(_shipments.c.weight), 0.0),
+            func.coalesce(func.sum(_shipments.c.volume), 0.0),
+            func.count(func.distinct(_city(_shipments.c.origin_address)))
+            + func.count(func.distinct(_city(_shipments.c.destination_address))),
+            literal(datetime.utcnow()),
+        )
+        .join(_shipments, _shipments.c.shipment_id == _assignments.c.shipment_id)
+        .group_by(_assignments.c.truck_id)
+    )
+
+
+def refresh_truck_loads(db, truck_ids=None):
+    """
+    Recomputes truck_loads for `truck_ids` (all trucks if None) with one
+    INSERT ... SELECT per chunk. Trucks left with nothing assigned get no row.
+    `db` may be a Session or a Connection.
+    """
+    columns = ["truck_id", "shipment_count", "weight_kg", "volume_cubic_m", "stop_count", "updated_at"]
+    if truck_ids is None:
+        db.execute(delete(_loads))
+        db.execute(insert(_loads).from_select(columns, _load_select()))
+        return
+    for chunk in _chunks(set(truck_ids)):
+        db.execute(delete(_loads).where(_loads.c.truck_id.in_(chunk)))
+        db.execute(insert(_loads).from_select(
+            columns, _load_select().where(_assignments.c.truck_id.in_(chunk))
+        ))
+
+
+def _trucks_of(db: Session, shipment_ids) -> set:
+    found = set()
+    for chunk in _chunks(shipment_ids):
+        found.update(db.scalars(
+            select(_assignments.c.truck_id).where(_assignments.c.shipment_id.in_(chunk))
+        ))
+    return found
+
+
+def refresh_loads_for_shipments(db: Session, shipment_ids):
+    """Call after assigned shipments changed weight, volume or address."""
+    truck_ids = _trucks_of(db, shipment_ids)
+    if truck_ids:
+        refresh_truck_loads(db, truck_ids)
+
+
+# ===================== ASSIGN / UNASSIGN ===================== #
+def assign_shipments(db: Session, plan: dict, release=()):
+    """
+    `plan` maps truck_id -> shipment_ids. Each listed shipment is moved onto
+    its truck (replacing any previous assignment), Shipment.vehicle_id is set
+    to the truck's registration number, and the loads of every truck that
+    gained or lost a shipment are refreshed. Shipments in `release` that the
+    plan does not list lose their assignment and vehicle_id, so a full
+    re-plan replaces the whole assignment set. The caller commits.
+    """
+    plan = {truck_id: list(ids) for truck_id, ids in plan.items() if ids}
+    moved = [sid for ids in plan.values() for sid in ids]
+    placed = set(moved)
+    released = [sid for sid in dict.fromkeys(release) if sid not in placed]
+    if not moved and not released:
+        return
+    touched = _trucks_of(db, moved + released) | set(plan)
+
+    now = datetime.utcnow()
+    for chunk in _chunks(moved + released):
+        db.execute(delete(_assignments).where(_assignments.c.shipment_id.in_(chunk)))
+    if moved:
+        db.execute(insert(_assignments), [
+            {"shipment_id": sid, "truck_id": truck_id, "assigned_at": now}
+            for truck_id, ids in plan.items() for sid in ids
+        ])
+
+    registrations = dict(db.execute(
+        select(_trucks.c.truck_id, _trucks.c.registration_number).where(_trucks.c.truck_id.in_(list(plan)))
+    ).all())
+    for truck_id, ids in plan.items():
+        for chunk in _chunks(ids):
+            db.execute(
+                update(_shipments).where(_shipments.c.shipment_id.in_(chunk))
+                .values(vehicle_id=registrations[truck_id], updated_at=now)
+            )
+    for chunk in _chunks(released):
+        db.execute(
+            update(_shipments)
+            .where(_shipments.c.shipment_id.in_(chunk), _shipments.c.vehicle_id.is_not(None))
+            .values(vehicle_id=None, updated_at=now)
+        )
+    refresh_truck_loads(db, touched)
+
+
+def unassign_shipments(db: Session, shipment_ids):
+    """Removes assignments (e.g. before deleting shipments) and refreshes loads."""
+    touched = _trucks_of(db, shipment_ids)
+    for chunk in _chunks(shipment_ids):
+        db.execute(delete(_assignments).where(_assignments.c.shipment_id.in_(chunk)))
+    if touched:
+        refresh_truck_loads(db, touched)
+
+
+def unassign_truck(db: Session, truck_id: str):
+    """Frees everything on a truck (e.g. before deleting it)."""
+    shipment_ids = select(_assignments.c.shipment_id).where(_assignments.c.truck_id == truck_id)
+    db.execute(
+        update(_shipments).where(_shipments.c.shipment_id.in_(shipment_ids))
+        .values(vehicle_id=None, updated_at=datetime.utcnow())
+    )
+    db.execute(delete(_assignments).where(_assignments.c.truck_id == truck_id))
+    db.execute(delete(_loads).where(_loads.c.truck_id == truck_id))
+
+
+# ===================== QUERIES ===================== #
+def truck_load(db: Session, truck) -> dict:
+    """O(1): one primary-key lookup in truck_loads."""
+    load = db.get(models.TruckLoad, truck.truck_id)
+    weight = load.weight_kg if load else 0.0
+    volume = load.volume_cubic_m if load else 0.0
+    return {
+        "truck_id": truck.truck_id,
+        "registration_number": truck.registration_number,
+        "shipment_count": load.shipment_count if load else 0,
+        "stop_count": load.stop_count if load else 0,
+        "weight_kg": weight,
+        "volume_cubic_m": volume,
+        "capacity_kg": truck.capacity_kg,
+        "available_volume_cubic_m": truck.available_volume_cubic_m,
+        "weight_utilization": weight / truck.capacity_kg if truck.capacity_kg else None,
+        "volume_utilization": volume / truck.available_volume_cubic_m if truck.available_volume_cubic_m else None,
+    }
+
+
+def fleet_utilization(db: Session, status=None) -> list:
+    """Every truck with its load, as one trucks LEFT JOIN truck_loads query."""
+    weight = func.coalesce(_loads.c.weight_kg, 0.0)
+    volume = func.coalesce(_loads.c.volume_cubic_m, 0.0)
+    statement = (
+        select(
+            _trucks.c.truck_id,
+            _trucks.c.registration_number,
+            func.coalesce(_loads.c.shipment_count, 0).label("shipment_count"),
+            func.coalesce(_loads.c.stop_count, 0).label("stop_count"),
+            weight.label("weight_kg"),
+            volume.label("volume_cubic_m"),
+            _trucks.c.capacity_kg,
+            _trucks.c.available_volume_cubic_m,
+            (weight / func.nullif(_trucks.c.capacity_kg, 0)).label("weight_utilization"),
+            (volume / func.nullif(_trucks.c.available_volume_cubic_m, 0)).label("volume_utilization"),
+        )
+        .select_from(_trucks.outerjoin(_loads, _loads.c.truck_id == _trucks.c.truck_id))
+        .order_by(_trucks.c.registration_number)
+    )
+    if status is not None:
+        statement = statement.where(_trucks.c.status == status)
+    return [dict(row._mapping) for row in db.execute(statement)]
+
+
+def shipments_on_truck(db: Session, truck_id: str) -> list:
+    return (
+        db.query(models.Shipment)
+        .join(models.TruckAssignment, models.TruckAssignment.shipment_id == models.Shipment.shipment_id)
+        .filter(models.TruckAssignment.truck_id == truck_id)
+        .order_by(models.Shipment.delivery_date)
+        .all()
+    )
+
+
+def trucks_on_lane(db: Session, origin_city: str, destination_city: str) -> list:
+    """Trucks carrying at least one shipment from origin_city to destination_city."""
+    carrying = (
+        select(_assignments.c.truck_id)
+        .join(_shipments, _shipments.c.shipment_id == _assignments.c.shipment_id)
+        .where(_city(_shipments.c.origin_address) == origin_city.strip().lower())
+        .where(_city(_shipments.c.destination_address) == destination_city.strip().lower())
+    )
+    return db.query(models.Truck).filter(models.Truck.truck_id.in_(carrying)).all()
+
+
+# ===================== BACKFILL ===================== #
+def backfill_assignments(bind) -> int:
+    """
+    One-off: fills truck_assignments from Shipment.vehicle_id and, where the
+    legacy column still exists, from trucks.shipment_ids. Returns rows added.
+    """
+    with bind.begin() as conn:
+        pairs = dict(conn.execute(
+            select(_shipments.c.shipment_id, _trucks.c.truck_id)
+            .join(_trucks, _trucks.c.registration_number == _shipments.c.vehicle_id)
+        ).all())
+
+        if "shipment_ids" in {c["name"] for c in inspect(conn).get_columns("trucks")}:
+            known = set(conn.scalars(select(_shipments.c.shipment_id)))
+            for truck_id, raw in conn.exec_driver_sql("SELECT truck_id, shipment_ids FROM trucks"):
+                try:
+                    listed = json.loads(raw or "[]")
+                except ValueError:
+                    continue
+                for sid in listed:
+                    if sid in known:
+                        pairs.setdefault(sid, truck_id)
+
+        if pairs:
+            now = datetime.utcnow()
+            conn.execute(insert(_assignments), [
+                {"shipment_id": sid, "truck_id": truck_id, "assigned_at": now} for sid, truck_id in pairs.items()
+            ])
+        refresh_truck_loads(conn, None)
+    return len(pairs)
@@ -0,0 +1,257 @@
+# batch_geocoder.py
+
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from geocode_cache import GeocodeStats, lookup_cached_many, normalize_address, store_geocode
+from metrics import GEOCODE_LOOKUPS, GEOCODE_SECONDS, stage
+from models import Shipment
+from spatial import index_shipment
+
+# ===================== SETTINGS ===================== #
+OPENCAGE_URL = os.getenv("OPENCAGE_URL", "https://api.opencagedata.com/geocode/v1/json")
+# Free OpenCage accounts allow 1 request/second; raise this to match a paid plan
+GEOCODE_RATE_PER_SEC = float(os.getenv("GEOCODE_RATE_PER_SEC", "1"))
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "8"))
+
+
+# ===================== RATE LIMITER ===================== #
+class TokenBucket:
+    """Token bucket shared by all in-flight geocoding requests; waits without blocking the event loop."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError(f"Geocoding rate must be positive, got {rate} (see GEOCODE_RATE_PER_SEC).")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _take(self) -> float:
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        # Single-threaded event loop: _take() runs without interleaving, no lock needed
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+# ===================== BATCH GEOCODER ===================== #
+class BatchGeocoder:
+    """
+    Resolves many addresses at once: dedupes them, serves what it can from the
+    geocode cache, and fetches the rest concurrently over one pooled async
+    HTTP client under a token-bucket rate limit.
+    """
+
+    def __init__(self, api_key: str = None, url: str = OPENCAGE_URL,
+                 workers: int = GEOCODE_WORKERS, rate_per_sec: float = GEOCODE_RATE_PER_SEC):
+        self.api_key = api_key or os.getenv("OPENCAGE_API_KEY")
+        self.url = url
+        self.workers = max(1, workers)
+        self.bucket = TokenBucket(rate_per_sec)
+
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+            timeout=30,
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def fetch(self, address: str):
+        if not self.api_key:
+            raise ValueError("Missing OpenCage API key in environment variables.")
+        await self.bucket.acquire()
+        with GEOCODE_SECONDS.time():
+            response = await self.client.get(self.url, params={"q": address, "key": self.api_key, "limit": 1})
+        if response.status_code != 200:
+            raise Exception(f"OpenCage API Error: {response.status_code} - {response.text}")
+        results = response.json().get("results")
+        if results:
+            loc = results[0]["geometry"]
+            return {"lat": loc["lat"], "lng": loc["lng"]}
+        return None
+
+    async def geocode_many(self, addresses, db: AsyncSession, stats: GeocodeStats = None, progress=None) -> dict:
+        """
+        Returns {address: coords_or_None} for every address that resolved.
+        Addresses whose fetch failed are left out so they are retried next time.
+        `progress(fraction, message)` is called as provider lookups complete.
+        """
+        # One representative address per cache key
+        unique = {}
+        for address in addresses:
+            unique.setdefault(normalize_address(address), address)
+
+        resolved = await db.run_sync(lambda session: lookup_cached_many(list(unique.values()), session, stats))
+        misses = [a for a in unique.values() if a not in resolved]
+
+        in_flight = asyncio.Semaphore(self.workers)
+        done = 0
+
+        async def fetch_one(address):
+            nonlocal done
+            async with in_flight:
+                try:
+                    outcome = address, await self.fetch(address), None
+                except Exception as e:
+                    outcome = address, None, e
+            done += 1
+            if progress:
+                progress(done / len(misses), f"{done} of {len(misses)} addresses geocoded")
+            return outcome
+
+        fetched = {}
+        for address, coords, error in await asyncio.gather(*(fetch_one(a) for a in misses)):
+            if error is not None:
+                print(f"[ERROR] Geocoding failed for '{address}': {error}")
+                GEOCODE_LOOKUPS.inc(layer="error")
+                if stats:
+                    stats.errors += 1
+                continue
+            GEOCODE_LOOKUPS.inc(layer="api")
+            if stats:
+                stats.api += 1
+            fetched[address] = coords
+
+        def store_all(session: Session):
+            for address, coords in fetched.items():
+                store_geocode(address, coords, session)
+
+        if fetched:
+            await db.run_sync(store_all)
+            resolved.update(fetched)
+
+        # Fan the representative answers back out to every spelling
+        results = {}
+        for address in addresses:
+            representative = unique[normalize_address(address)]
+            if representative in resolved:
+                results[address] = resolved[representative]
+        return results
+
+
+# ===================== FILL PIPELINE ===================== #
+ADDRESS_FIELDS = ("street", "city", "state", "pincode", "country")
+
+
+def _address_string(address: dict):
+    """The query string for an address, or None when the stored address is incomplete."""
+    if not isinstance(address, dict) or any(address.get(field) is None for field in ADDRESS_FIELDS):
+        return None
+    return ", ".join(str(address[field]) for field in ADDRESS_FIELDS)
+
+
+async def fill_missing_coordinates(db: AsyncSession, shipments, geocoder: BatchGeocoder,
+                                   stats: GeocodeStats = None, progress=None) -> dict:
+    """
+    Geocodes the missing origin/destination coordinates of `shipments` and
+    writes them back with one bulk UPDATE. Returns the shipment IDs that were
+    updated and the throughput of the run.
+    """
+    started = time.perf_counter()
+
+    # Incomplete addresses are skipped and counted instead of failing the whole batch
+    wanted = []
+    skipped = 0
+    for s in shipments:
+        for missing, address in (
+            (s.origin_lat is None or s.origin_lng is None, s.origin_address),
+            (s.destination_lat is None or s.destination_lng is None, s.destination_address),
+        ):
+            if not missing:
+                continue
+            query = _address_string(address)
+            if query is None:
+                skipped += 1
+            else:
+                wanted.append(query)
+    if skipped:
+        print(f"[WARN] Skipped {skipped} incomplete address(es) while geocoding.")
+
+    coords_by_address = await geocoder.geocode_many(wanted, db, stats, progress=progress)
+
+    now = datetime.utcnow()
+    updates = []
+    for s in shipments:
+        # Every row carries all four columns (and both cells) so the whole batch is one executemany
+        row = {
+            "shipment_id": s.shipment_id,
+            "origin_lat": s.origin_lat,
+            "origin_lng": s.origin_lng,
+            "destination_lat": s.destination_lat,
+            "destination_lng": s.destination_lng,
+            "updated_at": now,
+        }
+        changed = False
+        if s.origin_lat is None or s.origin_lng is None:
+            coords = coords_by_address.get(_address_string(s.origin_address) or "")
+            if coords:
+                row["origin_lat"], row["origin_lng"] = coords["lat"], coords["lng"]
+                changed = True
+        if s.destination_lat is None or s.destination_lng is None:
+            coords = coords_by_address.get(_address_string(s.destination_address) or "")
+            if coords:
+                row["destination_lat"], row["destination_lng"] = coords["lat"], coords["lng"]
+                changed = True
+        if changed:
+            updates.append(index_shipment(row))
+
+    if updates:
+        await db.run_sync(Session.bulk_update_mappings, Shipment, updates)
+
+    elapsed = time.perf_counter() - started
+    unique_addresses = len({normalize_address(a) for a in wanted})
+    return {
+        "updated_ids": [row["shipment_id"] for row in updates],
+        "throughput": {
+            "unique_addresses": unique_addresses,
+            "seconds": round(elapsed, 3),
+            "addresses_per_second": round(unique_addresses / elapsed, 2) if elapsed > 0 else None,
+            "skipped_addresses": skipped,
+        },
+    }
+
+
+async def fill_pending_shipments(db: AsyncSession, stats: GeocodeStats = None, progress=None) -> dict:
+    """
+    Geocodes every shipment that is still missing a coordinate and commits.
+    Returns the fill_missing_coordinates result.
+    """
+    with stage("fill", "db_fetch"):
+        shipments = (await db.scalars(select(Shipment).where(
+            or_(
+                Shipment.origin_lat == None,  # noqa: E711
+                Shipment.origin_lng == None,  # noqa: E711
+                Shipment.destination_lat == None,  # noqa: E711
+                Shipment.destination_lng == None,  # noqa: E711
+            )
+        ))).all()
+
+    geocoder = BatchGeocoder()
+    try:
+        with stage("fill", "geocode"):
+            fill_result = await fill_missing_coordinates(db, shipments, geocoder, stats=stats, progress=progress)
+    finally:
+        await geocoder.close()
+    with stage("fill", "commit"):
+        await db.commit()
+    return fill_result
@@ -0,0 +1,220 @@
+# benchmarks/bench_async_load.py
+#
+# p50/p99 latency of cheap read endpoints (/weights/get, /Trucks/page) with
+# and without long jobs in flight. The long jobs are real /shipments/fill
+# calls against the stub geocoder and /delay/ calls against the stub Gemini
+# model from stub_llm.py, sleeping --llm-seconds per prompt. The app runs under uvicorn in a child
+# process on a scratch SQLite file, so client threads do not share its GIL.
+# The server's threadpool is shrunk to --threadpool workers to show that the
+# long jobs no longer hold one.
+# Run from the backend directory:
+#   python benchmarks/bench_async_load.py --duration 15 --clients 8 --jobs 6
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+READ_PATHS = ["/weights/get", "/Trucks/page?limit=20"]
+CITIES = [("Delhi", "DL", "110001"), ("Mumbai", "MH", "400001"), ("Pune", "MH", "411001"),
+          ("Jaipur", "RJ", "302001"), ("Chennai", "TN", "600001")]
+
+
+# ===================== SERVER (child process) ===================== #
+def serve(args):
+    # Every delay request must reach the (stubbed) LLM, so no lane cache
+    os.environ["DELAY_LANE_CACHE_TTL_MINUTES"] = "0"
+    os.environ["OPENCAGE_API_KEY"] = "stub"
+    os.environ["OPENCAGE_URL"] = args.geocoder_url
+    os.environ["GEOCODE_RATE_PER_SEC"] = str(args.geocode_rate)
+
+    import anyio.to_thread
+    import uvicorn
+
+    import main as app_module
+    import stub_llm
+
+    stub_llm.install(latency_s=args.llm_seconds)
+
+    config = uvicorn.Config(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+
+    async def run():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.threadpool
+        await server.serve()
+
+    asyncio.run(run())
+
+
+# ===================== CLIENT ===================== #
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed(base_url, shipments, trucks, seed_value=7):
+    rng = random.Random(seed_value)
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        client.post("/weights/fixed/", json={
+            "value": 0.2, "weight": 0.2, "volume": 0.2, "shelf_life_days": 0.2, "days_to_delivery": 0.2,
+        }).raise_for_status()
+        rows = []
+        for i in range(shipments):
+            origin, destination = rng.sample(CITIES, 2)
+            rows.append({
+                "order_id": f"ORD-{i}", "customer_id": f"CUST-{i}",
+                "origin_address": {"street": f"{i} Main Rd", "city": origin[0], "state": origin[1],
+                                   "pincode": origin[2], "country": "India"},
+                "destination_address": {"street": f"{i} Ring Rd", "city": destination[0],
+                                        "state": destination[1], "pincode": destination[2], "country": "India"},
+                "value": 1000.0, "weight": 10.0, "volume": 1.0, "shelf_life_days": 10,
+                "delivery_date": "2030-01-01", "shipment_type": "normal",
+            })
+        client.post("/shipments/bulk/", json=rows).raise_for_status()
+        client.post("/shipments/bulktruck/", json=[
+            {"registration_number": f"BENCH{i:04d}", "capacity_kg": 1000.0, "available_volume_cubic_m": 50.0,
+             "current_location_lat": 20.0, "current_location_lng": 77.0}
+            for i in range(trucks)
+        ]).raise_for_status()
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(base_url + "/weights/get", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def measure_reads(base_url, clients, duration) -> np.ndarray:
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(offset):
+        local = []
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            i = offset
+            while time.monotonic() < stop_at:
+                started = time.perf_counter()
+                client.get(READ_PATHS[i % len(READ_PATHS)]).raise_for_status()
+                local.append(time.perf_counter() - started)
+                i += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.array(latencies) * 1000
+
+
+def run_jobs(base_url, jobs, stop, finished):
+    """One /shipments/fill (geocodes every seeded shipment) plus jobs - 1 /delay/ loops until `stop` is set."""
+    paths = ["/shipments/fill"] + ["/delay/"] * (jobs - 1)
+
+    def worker(path):
+        with httpx.Client(base_url=base_url, timeout=600) as client:
+            while True:
+                response = client.post(path)
+                with finished[1]:
+                    finished[0].append((path, response.status_code))
+                # A second fill would find nothing left to geocode
+                if stop.is_set() or path == "/shipments/fill":
+                    return
+
+    threads = [threading.Thread(target=worker, args=(p,), daemon=True) for p in paths]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def report(label, ms):
+    print(f"{label:<22} {len(ms):>7} reqs  p50 {np.percentile(ms, 50):8.2f} ms  "
+          f"p99 {np.percentile(ms, 99):8.2f} ms  max {ms.max():8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per phase")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent read clients")
+    parser.add_argument("--jobs", type=int, default=6, help="long jobs kept in flight (1 fill + N-1 delay)")
+    parser.add_argument("--threadpool", type=int, default=4, help="server threadpool size")
+    parser.add_argument("--shipments", type=int, default=500)
+    parser.add_argument("--trucks", type=int, default=50)
+    parser.add_argument("--llm-seconds", type=float, default=5.0)
+    parser.add_argument("--geocoder-latency-ms", type=float, default=100.0)
+    parser.add_argument("--geocode-rate", type=float, default=50.0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--geocoder-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    from stub_geocoder import StubGeocoderServer
+
+    geocoder = StubGeocoderServer(latency_ms=args.geocoder_latency_ms)
+    threading.Thread(target=geocoder.serve_forever, daemon=True).start()
+
+    # database.py points at ./shipments.db, so the server works in a scratch directory
+    workdir = tempfile.mkdtemp(prefix="bench_async_")
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+         "--geocoder-url", geocoder.url, "--threadpool", str(args.threadpool),
+         "--llm-seconds", str(args.llm_seconds), "--geocode-rate", str(args.geocode_rate)],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": BACKEND},
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(base_url)
+        seed(base_url, args.shipments, args.trucks)
+        print(f"{args.clients} read clients, {args.jobs} long jobs, threadpool={args.threadpool}, "
+              f"{args.duration:.0f}s per phase")
+
+        report("idle", measure_reads(base_url, args.clients, args.duration))
+
+        stop, finished = threading.Event(), ([], threading.Lock())
+        jobs = run_jobs(base_url, args.jobs, stop, finished)
+        time.sleep(1.0)  # let every job get past its first query
+        report("with long jobs", measure_reads(base_url, args.clients, args.duration))
+        stop.set()
+        for t in jobs:
+            t.join()
+
+        codes = {}
+        for path, code in finished[0]:
+            codes[(path, code)] = codes.get((path, code), 0) + 1
+        print("long jobs completed:", ", ".join(f"{p} {c} x{n}" for (p, c), n in sorted(codes.items())))
+    finally:
+        server.terminate()
+        server.wait()
+        geocoder.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_bulk_ingest.py
+#
+# Rows/second for the JSON /shipments/bulk/ endpoint versus the NDJSON
+# /shipments/bulk/stream endpoint, each against a fresh SQLite file.
+# Run from the backend directory:
+#   python benchmarks/bench_bulk_ingest.py --sizes 1000 10000 50000
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# database.py points at ./shipments.db, so work in a scratch directory
+os.chdir(tempfile.mkdtemp(prefix="bench_ingest_"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+import main as app_module  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal  # noqa: E402
+
+CITIES = [("Delhi", "DL", "110001"), ("Mumbai", "MH", "400001"), ("Pune", "MH", "411001"),
+          ("Jaipur", "RJ", "302001"), ("Chennai", "TN", "600001")]
+
+
+def make_rows(n, seed=7):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        origin, destination = rng.sample(CITIES, 2)
+        rows.append({
+            "order_id": f"ORD-{i}",
+            "customer_id": f"CUST-{rng.randint(1, 500)}",
+            "origin_address": {"street": f"{i} Main Rd", "city": origin[0], "state": origin[1],
+                               "pincode": origin[2], "country": "India"},
+            "destination_address": {"street": f"{i} Ring Rd", "city": destination[0], "state": destination[1],
+                                    "pincode": destination[2], "country": "India"},
+            "value": round(rng.uniform(100, 10000), 2),
+            "weight": round(rng.uniform(1, 500), 2),
+            "volume": round(rng.uniform(0.1, 5), 2),
+            "shelf_life_days": rng.randint(1, 60),
+            "delivery_date": (date.today() + timedelta(days=rng.randint(1, 30))).isoformat(),
+            "shipment_type": "normal",
+        })
+    return rows
+
+
+def reset():
+    db = SessionLocal()
+    db.execute(delete(models.Shipment))
+    db.execute(delete(models.ScoringStat))
+    db.commit()
+    db.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    response = fn()
+    assert response.status_code == 200, response.text
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with TestClient(app_module.app) as client:
+        print(f"{'rows':>7} {'json s':>8} {'json rows/s':>12} {'ndjson s':>9} {'ndjson rows/s':>14}")
+        for n in args.sizes:
+            rows = make_rows(n)
+
+            reset()
+            json_time = timed(lambda: client.post("/shipments/bulk/", json=rows))
+
+            reset()
+            body = "\n".join(json.dumps(r) for r in rows)
+            stream_time = timed(lambda: client.post(
+                f"/shipments/bulk/stream?batch_size={args.batch_size}",
+                content=body, headers={"content-type": "application/x-ndjson"},
+            ))
+
+            print(f"{n:>7} {json_time:>8.2f} {n / json_time:>12.0f} {stream_time:>9.2f} {n / stream_time:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
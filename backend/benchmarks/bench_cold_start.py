@@ -0,0 +1,97 @@
+# benchmarks/bench_cold_start.py
+#
+# Cold start cost: the time to `import main` in a fresh interpreter, and the
+# time from launching uvicorn to the first 200 from /weights/get. Every run
+# is a new process on a new scratch SQLite file, like a serverless cold start.
+# --backend points at another checkout to compare before/after.
+# Run from the backend directory:
+#   python benchmarks/bench_cold_start.py --runs 5
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def scratch_env(backend, workdir) -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": backend,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'cold.db')}",
+    }
+
+
+def time_import(backend) -> float:
+    with tempfile.TemporaryDirectory(prefix="bench_cold_") as workdir:
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=workdir, env=scratch_env(backend, workdir),
+                             capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_first_response(backend, path, timeout=120.0) -> float:
+    with tempfile.TemporaryDirectory(prefix="bench_cold_") as workdir:
+        return _first_response(backend, workdir, path, timeout)
+
+
+def _first_response(backend, workdir, path, timeout) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=scratch_env(backend, workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with {server.returncode}")
+            time.sleep(0.005)
+        raise RuntimeError("server did not answer")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def report(label, seconds):
+    ms = [s * 1000 for s in seconds]
+    print(f"{label:<28} median {statistics.median(ms):8.1f} ms  min {min(ms):8.1f} ms  max {max(ms):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/weights/get")
+    parser.add_argument("--backend", default=BACKEND, help="backend directory to measure")
+    args = parser.parse_args()
+    backend = os.path.abspath(args.backend)
+
+    # One untimed run so the first measurement does not pay for cold disk caches
+    time_import(backend)
+    print(f"{args.runs} runs of {backend}")
+    report("import main", [time_import(backend) for _ in range(args.runs)])
+    report(f"launch -> first {args.path}", [time_first_response(backend, args.path) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
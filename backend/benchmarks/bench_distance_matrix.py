@@ -0,0 +1,54 @@
+# benchmarks/bench_distance_matrix.py
+#
+# Cost of a cold distance matrix build versus a cache hit and versus
+# extending a cached matrix by a few new shipments.
+# Run from the backend directory:
+#   python benchmarks/bench_distance_matrix.py --sizes 1000 5000 10000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance_matrix import DistanceMatrixCache, haversine_matrix  # noqa: E402
+
+
+def points(n, rng):
+    return np.c_[rng.uniform(8, 35, n), rng.uniform(68, 97, n)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--new", type=int, default=50, help="shipments appended before the extension timing")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    print(f"{'n x n':>13} {'cold ms':>9} {'hit ms':>8} {'extend ms':>10} {'extend again':>13} {'max |err| km':>13}")
+    for n in args.sizes:
+        cache = DistanceMatrixCache()
+        pts = points(n + 2 * args.new, rng)
+        base, once = pts[:n], pts[:n + args.new]
+        _, cold = timed(lambda: cache.matrix(base, base))
+        _, hit = timed(lambda: cache.matrix(base, base))
+        # The first extension reallocates with spare room, the second fits in it
+        _, extend = timed(lambda: cache.matrix(once, once))
+        extended, again = timed(lambda: cache.matrix(pts, pts))
+        error = np.abs(extended[-args.new:] - haversine_matrix(pts[-args.new:], pts)).max()
+        print(f"{f'{n}x{n}':>13} {cold * 1000:>9.1f} {hit * 1000:>8.2f} {extend * 1000:>10.1f} "
+              f"{again * 1000:>13.1f} {error:>13.2e}")
+        cache.clear()
+
+
+if __name__ == "__main__":
+    main()
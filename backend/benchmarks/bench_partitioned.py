@@ -0,0 +1,65 @@
+# benchmarks/bench_partitioned.py
+#
+# Monolithic vs partitioned local route solving (route_partitions.py) on
+# synthetic data without a database. For each mode it reports the wall time
+# of partitioning, solving the parts in --workers processes and the repair
+# pass, next to the time the largest part takes on its own, plus shipments
+# assigned and trucks used. The solver processes are warmed up untimed.
+# Run from the backend directory:
+#   python benchmarks/bench_partitioned.py --shipments 5000 --trucks 250 --workers 8
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from route_partitions import partition_problem, solve_partitions_local  # noqa: E402
+from route_solver import repair_plan, solve_route_plan  # noqa: E402
+from synthetic_data import as_models  # noqa: E402
+
+
+def solve(trucks, shipments, mode, workers):
+    """Returns (plan, seconds, parts, largest part size, seconds for the largest part alone)."""
+    started = time.perf_counter()
+    if mode == "off":
+        plan = solve_route_plan(trucks, shipments)
+        return plan, time.perf_counter() - started, 1, len(shipments), time.perf_counter() - started
+    parts, _ = partition_problem(trucks, shipments, mode)
+    merged = solve_partitions_local(trucks, shipments, parts, workers)
+    plan, _, _ = repair_plan(trucks, shipments, merged)
+    elapsed = time.perf_counter() - started
+
+    truck_idx, shipment_idx = max(parts, key=lambda part: len(part[1]))
+    largest_started = time.perf_counter()
+    solve_route_plan([trucks[i] for i in truck_idx], [shipments[j] for j in shipment_idx])
+    return plan, elapsed, len(parts), len(shipment_idx), time.perf_counter() - largest_started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shipments", type=int, default=5000)
+    parser.add_argument("--trucks", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--modes", nargs="+", default=["off", "origin", "cluster"], choices=["off", "origin", "cluster"])
+    args = parser.parse_args()
+
+    trucks, shipments = as_models(args.shipments, args.trucks, args.seed)
+    # Start the solver processes before timing anything
+    warm_trucks, warm_shipments = as_models(200, 20, args.seed + 1)
+    solve(warm_trucks, warm_shipments, "origin", args.workers)
+
+    print(f"{args.shipments} shipments, {args.trucks} trucks, {args.workers} workers")
+    print(f"{'mode':<8} {'seconds':>8} {'parts':>5} {'largest':>7} {'largest s':>9} {'assigned':>8} {'trucks':>6}")
+    for mode in args.modes:
+        plan, seconds, n_parts, largest, largest_s = solve(trucks, shipments, mode, args.workers)
+        assigned = sum(len(entry["shipment_ids"]) for entry in plan)
+        print(f"{mode:<8} {seconds:>8.3f} {n_parts:>5} {largest:>7} {largest_s:>9.3f} {assigned:>8} {len(plan):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/bench_priority_scoring.py
+#
+# Compares the original pandas + MinMaxScaler scoring against the set-based
+# SQL UPDATE in priority_stats, and checks it against the O(1) insert-time
+# scorer on a sample of rows.
+# Run from the backend directory:
+#   python benchmarks/bench_priority_scoring.py --sizes 1000 100000 1000000
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models  # noqa: E402
+import priority_stats  # noqa: E402
+
+WEIGHTS = {"value": 0.1, "weight": 0.3, "volume": 0.2, "shelf_life_days": 0.25, "days_to_delivery": 0.15}
+
+
+def legacy_scores(shipments, weights):
+    """The pandas / scikit-learn implementation this engine replaced."""
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
+
+    for s in shipments:
+        if s["delivery_date"]:
+            s["days_to_delivery"] = max((s["delivery_date"] - date.today()).days, 0)
+        else:
+            s["days_to_delivery"] = 0
+    df = pd.DataFrame(shipments)
+    features = priority_stats.FEATURES
+    df[features] = df[features].fillna(0)
+    df_scaled = pd.DataFrame(MinMaxScaler().fit_transform(df[features]), columns=features)
+    df_scaled["shelf_life_days"] = 1 - df_scaled["shelf_life_days"]
+    df_scaled["days_to_delivery"] = 1 - df_scaled["days_to_delivery"]
+    return (df_scaled @ [weights.get(c, 0) for c in features]).tolist()
+
+
+def make_session(n, seed=7):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([models.WeightConfig(feature_name=k, weight_value=v) for k, v in WEIGHTS.items()])
+
+    rng = random.Random(seed)
+    today = date.today()
+    address = {"street": "1 MG Road", "city": "Jaipur", "state": "RJ", "pincode": "302001", "country": "India"}
+    rows = [
+        {
+            "shipment_id": f"s{i}", "order_id": f"o{i}", "customer_id": "c",
+            "origin_address": address, "destination_address": address,
+            "value": rng.uniform(100, 100000), "weight": rng.uniform(1, 5000),
+            "volume": rng.uniform(0.1, 40), "shelf_life_days": rng.randint(1, 365),
+            "delivery_date": today + timedelta(days=rng.randint(-10, 120)),
+            "shipment_type": "normal",
+        }
+        for i in range(n)
+    ]
+    session.execute(models.Shipment.__table__.insert(), rows)
+    session.commit()
+    return session, rows
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--skip-legacy", action="store_true", help="do not run the pandas/sklearn baseline")
+    parser.add_argument("--sample", type=int, default=1000, help="rows checked against score_shipment")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'legacy s':>9} {'sql s':>8} {'max |diff|':>11}")
+    for n in args.sizes:
+        session, rows = make_session(n)
+        inputs = [
+            {k: r[k] for k in ("value", "weight", "volume", "shelf_life_days", "delivery_date")}
+            for r in rows
+        ]
+
+        weights = priority_stats.load_weights(session)
+        fbounds = priority_stats.feature_bounds(priority_stats.recompute_bounds(session))
+        statement = priority_stats.score_update_statement(session, fbounds, weights)
+        _, sql_time = timed(lambda: session.execute(statement))
+        # Matched by id: without ORDER BY, SQLite may read priority_score off its index, in score order
+        table = models.Shipment.__table__
+        stored = dict(session.execute(table.select().with_only_columns(table.c.shipment_id, table.c.priority_score)).all())
+        sql_scores = [stored[r["shipment_id"]] for r in rows]
+
+        step = max(1, n // args.sample)
+        diff = max(
+            abs(priority_stats.score_shipment(SimpleNamespace(**inputs[i]), fbounds, weights) - sql_scores[i])
+            for i in range(0, n, step)
+        )
+        legacy_time = None
+        if not args.skip_legacy:
+            try:
+                baseline, legacy_time = timed(lambda: legacy_scores([dict(i) for i in inputs], weights))
+                diff = max(diff, max(abs(a - b) for a, b in zip(baseline, sql_scores)))
+            except ImportError:
+                pass
+
+        legacy = f"{legacy_time:>9.3f}" if legacy_time is not None else f"{'n/a':>9}"
+        print(f"{n:>9} {legacy} {sql_time:>8.3f} {diff:>11.2e}")
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
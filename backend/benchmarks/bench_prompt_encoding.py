@@ -0,0 +1,63 @@
+# benchmarks/bench_prompt_encoding.py
+#
+# Route planner prompt size, verbose JSON vs the compact encoding
+# (prompt_encoding.py), on synthetic data without a database. For each size
+# it reports estimated tokens, build time and how many parts the token
+# budget splits the problem into, and checks that the stub planner's
+# compact answer decodes to a plan the capacity validator accepts.
+# Run from the backend directory:
+#   python benchmarks/bench_prompt_encoding.py --sizes 500 2000 5000 --budget 30000
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_llm  # noqa: E402
+from capacity_validator import CapacityValidator  # noqa: E402
+from llm import format_input_for_llm  # noqa: E402
+from prompt_encoding import compact_payload, estimate_tokens, json_payload, serialize, split_for_budget  # noqa: E402
+from synthetic_data import as_models  # noqa: E402
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000], help="shipment counts")
+    parser.add_argument("--shipments-per-truck", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=30000, help="token budget per planner prompt")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'shipments':>9} {'trucks':>6} {'json tok':>9} {'compact tok':>11} {'saved':>6} "
+          f"{'build ms':>9} {'parts':>5} {'valid':>5}")
+    for n in args.sizes:
+        trucks, shipments = as_models(n, max(1, n // args.shipments_per_truck), args.seed)
+        data = format_input_for_llm(trucks, shipments)
+        json_tokens = estimate_tokens(json_payload(data), "json")
+        (payload, _), build_s = timed(compact_payload, data)
+        compact_tokens = estimate_tokens(payload, "compact")
+        parts = split_for_budget(data, args.budget, "compact")
+
+        valid = True
+        for truck_idx, shipment_idx in parts:
+            part_payload, aliases = compact_payload(data, truck_idx, shipment_idx)
+            plan = aliases.decode_plan(json.loads(stub_llm.plan_routes_compact(serialize(part_payload, "compact"))))
+            validator = CapacityValidator([trucks[i] for i in truck_idx], [shipments[j] for j in shipment_idx])
+            valid &= validator.validate(plan)["status"] == "validated"
+
+        print(f"{n:>9} {len(trucks):>6} {json_tokens:>9,} {compact_tokens:>11,} {1 - compact_tokens / json_tokens:>6.0%} "
+              f"{build_s * 1000:>9.1f} {len(parts):>5} {str(valid):>5}")
+
+
+if __name__ == "__main__":
+    main()
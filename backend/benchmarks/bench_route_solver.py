@@ -0,0 +1,63 @@
+# benchmarks/bench_route_solver.py
+#
+# Wall time of the local route solver against fleet size.
+# Run from the backend directory:  python benchmarks/bench_route_solver.py
+
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from route_solver import solve_route_plan  # noqa: E402
+
+CITIES = [
+    ("Jaipur", 26.91, 75.79), ("Delhi", 28.61, 77.21), ("Mumbai", 19.08, 72.88),
+    ("Pune", 18.52, 73.86), ("Ahmedabad", 23.02, 72.57), ("Bengaluru", 12.97, 77.59),
+    ("Chennai", 13.08, 80.27), ("Hyderabad", 17.39, 78.49), ("Kolkata", 22.57, 88.36),
+    ("Lucknow", 26.85, 80.95), ("Indore", 22.72, 75.86), ("Surat", 21.17, 72.83),
+]
+
+
+def make_fleet(n_trucks, shipments_per_truck=6, seed=42):
+    rng = random.Random(seed)
+    trucks = [
+        SimpleNamespace(
+            registration_number=f"RJ14AB{i:04d}",
+            capacity_kg=rng.choice([5000.0, 10000.0, 15000.0]),
+            available_volume_cubic_m=rng.choice([20.0, 40.0, 60.0]),
+        )
+        for i in range(n_trucks)
+    ]
+    shipments = []
+    for i in range(n_trucks * shipments_per_truck):
+        origin = rng.choice(CITIES[:4])
+        dest = rng.choice(CITIES)
+        shipments.append(SimpleNamespace(
+            shipment_id=f"s{i}",
+            origin_address={"city": origin[0]},
+            destination_address={"city": dest[0]},
+            origin_lat=origin[1], origin_lng=origin[2],
+            destination_lat=dest[1] + rng.uniform(-0.2, 0.2),
+            destination_lng=dest[2] + rng.uniform(-0.2, 0.2),
+            weight=rng.uniform(100.0, 2000.0),
+            volume=rng.uniform(0.5, 6.0),
+        ))
+    return trucks, shipments
+
+
+def main():
+    print(f"{'trucks':>8} {'shipments':>10} {'used':>6} {'assigned':>9} {'seconds':>9}")
+    for n_trucks in (10, 50, 100, 250, 500, 1000):
+        trucks, shipments = make_fleet(n_trucks)
+        start = time.perf_counter()
+        plan = solve_route_plan(trucks, shipments)
+        elapsed = time.perf_counter() - start
+        assigned = sum(len(p["shipment_ids"]) for p in plan)
+        print(f"{n_trucks:>8} {len(shipments):>10} {len(plan):>6} {assigned:>9} {elapsed:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_spatial.py
+#
+# Radius and k-nearest query cost against table size, grid index versus a
+# load-everything scan. With the grid, rows examined (and time) should stay
+# roughly flat as the table grows while the scan grows linearly.
+# Run from the backend directory:
+#   python benchmarks/bench_spatial.py --sizes 10000 100000 1000000
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import models  # noqa: E402
+import spatial  # noqa: E402
+
+# Points spread over India; queries are centred on Delhi
+BOX = (8.0, 35.0, 68.0, 97.0)
+CENTER = (28.61, 77.21)
+
+
+def make_session(n, seed=11):
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+    address = {"street": "s", "city": "c", "state": "st", "pincode": "1", "country": "India"}
+    rows = []
+    for i in range(n):
+        lat, lng = rng.uniform(BOX[0], BOX[1]), rng.uniform(BOX[2], BOX[3])
+        rows.append(spatial.index_shipment({
+            "shipment_id": f"S{i}", "order_id": f"O{i}", "customer_id": "C",
+            "origin_address": address, "destination_address": address,
+            "value": 1.0, "weight": 1.0, "volume": 1.0, "shelf_life_days": 1,
+            "delivery_date": date.today() + timedelta(days=1), "shipment_type": "normal",
+            "origin_lat": lat, "origin_lng": lng, "destination_lat": lat, "destination_lng": lng,
+        }))
+    session = sessionmaker(bind=engine)()
+    for start in range(0, n, 50000):
+        session.execute(insert(models.Shipment.__table__), rows[start:start + 50000])
+    session.commit()
+    return session
+
+
+def scan_within(session, lat, lng, radius_km):
+    """Baseline: pull every coordinate and filter with haversine."""
+    table = models.Shipment.__table__
+    rows = session.execute(select(table.c.shipment_id, table.c.origin_lat, table.c.origin_lng)).all()
+    distances = spatial.haversine_km(lat, lng, [r[1] for r in rows], [r[2] for r in rows])
+    return int((distances <= radius_km).sum()), len(rows)
+
+
+def examined(session, lat, lng, radius_km):
+    table = models.Shipment.__table__
+    condition = spatial.radius_prefilter(table.c.origin_cell, table.c.origin_lat, table.c.origin_lng, lat, lng, radius_km)
+    return session.execute(select(func.count()).where(condition)).scalar()
+
+
+def timed(fn, repeat=5):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--radius-km", type=float, default=25.0)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'examined':>9} {'hits':>6} {'grid ms':>9} {'knn ms':>8} {'scan ms':>9}")
+    for n in args.sizes:
+        session = make_session(n)
+        hits, grid_time = timed(lambda: spatial.shipments_within(session, *CENTER, args.radius_km))
+        _, knn_time = timed(lambda: spatial.nearest_shipments(session, *CENTER, args.k))
+        (scan_hits, _), scan_time = timed(lambda: scan_within(session, *CENTER, args.radius_km), repeat=1)
+        assert scan_hits == len(hits), (scan_hits, len(hits))
+        print(f"{n:>9} {examined(session, *CENTER, args.radius_km):>9} {len(hits):>6} "
+              f"{grid_time * 1000:>9.2f} {knn_time * 1000:>8.2f} {scan_time * 1000:>9.1f}")
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+# benchmarks/bench_suite.py
+#
+# Offline end-to-end benchmark: synthetic shipments and trucks
+# (synthetic_data.py), the stub geocoder (stub_geocoder.py) in place of
+# OpenCage and stub Gemini models (stub_llm.py), all against a scratch SQLite
+# file. Each scenario runs --repeat times through the app in-process; the
+# median, min and max wall time per scenario plus the pipeline stage timings
+# from metrics.py are written to a JSON results file. Passing --baseline
+# compares against an earlier results file and exits 1 if any scenario got
+# slower by more than --threshold.
+# The LLM response cache is off unless --llm-cache on. --record writes the
+# stubs' answers to a cassette; --replay answers every model call from a
+# cassette (from --record, or from the app under LLM_CACHE_MODE=record, see
+# llm_cache.py) without the stubs. Shipment and truck ids are derived from
+# the synthetic data, so prompts repeat across runs with the same --seed.
+# --prompt-encoding picks the route planner prompt (see prompt_encoding.py);
+# with --llm-ms-per-1k-tokens the stub models also get slower as prompts grow.
+# optimize_insert adds --new-orders shipments to a committed plan before each
+# run and times only the incremental insert (see route_insertion.py).
+# Run from the backend directory:
+#   python benchmarks/bench_suite.py --shipments 5000 --trucks 200 --out baseline.json
+#   python benchmarks/bench_suite.py --shipments 5000 --trucks 200 --out new.json --baseline baseline.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_geocoder import StubGeocoderServer  # noqa: E402
+from synthetic_data import make_shipments, make_trucks  # noqa: E402
+
+WEIGHTS = {"value": 0.2, "weight": 0.25, "volume": 0.15, "shelf_life_days": 0.2, "days_to_delivery": 0.2}
+
+
+# ===================== SCENARIOS ===================== #
+class Suite:
+    """Holds the client and data; a scenario is (setup, run, rows) plus an optional untimed `after`."""
+
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.shipments = make_shipments(args.shipments, args.seed)
+        self.trucks = make_trucks(args.trucks, args.seed)
+        self.new_batches = 0
+
+    def _ok(self, response):
+        assert response.status_code in (200, 202), f"{response.request.url}: {response.status_code} {response.text[:300]}"
+        return response
+
+    # ---- setup helpers (not timed) ----
+    def wipe(self):
+        import models
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            for table in reversed(models.Base.metadata.sorted_tables):
+                if table.name != models.WeightConfig.__tablename__:
+                    db.execute(table.delete())
+            db.commit()
+
+    def seed(self):
+        self.wipe()
+        self.ingest_bulk()
+        self.stable_ids()
+
+    def stable_ids(self):
+        """Replaces the random UUID keys with order_id / registration_number so prompts are reproducible."""
+        import models
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            db.query(models.Shipment).update({models.Shipment.shipment_id: models.Shipment.order_id},
+                                             synchronize_session=False)
+            db.query(models.Truck).update({models.Truck.truck_id: models.Truck.registration_number},
+                                          synchronize_session=False)
+            db.commit()
+
+    def clear_coordinates(self, clear_cache: bool):
+        import models
+        from database import SessionLocal
+        from geocode_cache import clear_geocode_cache
+
+        with SessionLocal() as db:
+            db.query(models.Shipment).update({
+                models.Shipment.origin_lat: None, models.Shipment.origin_lng: None,
+                models.Shipment.destination_lat: None, models.Shipment.destination_lng: None,
+            }, synchronize_session=False)
+            db.commit()
+            if clear_cache:
+                clear_geocode_cache(db)
+
+    def add_new_orders(self):
+        """Commits a full plan if there is none, then adds and geocodes --new-orders shipments."""
+        import models
+        from database import SessionLocal
+
+        with SessionLocal() as db:
+            planned = db.query(models.TruckAssignment).first() is not None
+        if not planned:
+            self._ok(self.client.post("/optimize-routes/?solver=local"))
+        self.new_batches += 1
+        rows = make_shipments(self.args.new_orders, seed=self.args.seed * 1000 + self.new_batches)
+        self._ok(self.client.post("/shipments/bulk/", json=rows))
+        self._ok(self.client.post("/shipments/fill"))
+
+    # ---- timed bodies ----
+    def ingest_bulk(self):
+        size = self.args.batch_size
+        for start in range(0, len(self.shipments), size):
+            self._ok(self.client.post("/shipments/bulk/", json=self.shipments[start:start + size]))
+        self._ok(self.client.post("/shipments/bulktruck/", json=self.trucks))
+
+    def ingest_stream(self):
+        body = "".join(json.dumps(row) + "\n" for row in self.shipments)
+        self._ok(self.client.post(f"/shipments/bulk/stream?batch_size={self.args.batch_size}", content=body,
+                                  headers={"Content-Type": "application/x-ndjson"}))
+        body = "".join(json.dumps(row) + "\n" for row in self.trucks)
+        self._ok(self.client.post("/shipments/bulktruck/stream", content=body,
+                                  headers={"Content-Type": "application/x-ndjson"}))
+
+    def walk_pages(self, path):
+        cursor = None
+        while True:
+            page = self._ok(self.client.get(path, params={"limit": 500, **({"cursor": cursor} if cursor else {})})).json()
+            cursor = page["next_cursor"]
+            if not cursor:
+                return
+
+    def get_many(self, path):
+        for _ in range(self.args.requests):
+            self._ok(self.client.get(path))
+
+    def scenarios(self) -> dict:
+        n, m, k = len(self.shipments), len(self.trucks), self.args.requests
+        nothing = lambda: None  # noqa: E731
+        return {
+            "ingest_bulk": (self.wipe, self.ingest_bulk, n + m, self.stable_ids),
+            "ingest_stream": (self.wipe, self.ingest_stream, n + m, self.stable_ids),
+            "list_shipments_pages": (nothing, lambda: self.walk_pages("/shipments/page"), n),
+            "list_trucks_pages": (nothing, lambda: self.walk_pages("/Trucks/page"), m),
+            "list_shipments_all": (nothing, lambda: self._ok(self.client.get("/shipments/")), n),
+            "weights_get": (nothing, lambda: self.get_many("/weights/get"), k),
+            "score_full": (nothing, lambda: self._ok(self.client.post("/shipments/score/?full=true")), n),
+            "fill_cold": (lambda: self.clear_coordinates(True), lambda: self._ok(self.client.post("/shipments/fill")), n),
+            "fill_cached": (lambda: self.clear_coordinates(False), lambda: self._ok(self.client.post("/shipments/fill")), n),
+            "utilization": (nothing, lambda: self.get_many("/trucks/utilization"), k),
+            "delay": (nothing, lambda: self._ok(self.client.post("/delay/")), n),
+            "optimize_llm": (nothing, lambda: self._ok(self.client.post("/optimize-routes/?solver=llm")), n),
+            "optimize_local": (nothing, lambda: self._ok(self.client.post("/optimize-routes/?solver=local")), n),
+            "optimize_insert": (
+                self.add_new_orders, lambda: self._ok(self.client.post("/optimize-routes/?incremental=true")),
+                self.args.new_orders,
+            ),
+            "optimize_llm_parts": (
+                nothing, lambda: self._ok(self.client.post("/optimize-routes/?solver=llm&partition=cluster")), n,
+            ),
+            "optimize_local_parts": (
+                nothing, lambda: self._ok(self.client.post("/optimize-routes/?solver=local&partition=cluster")), n,
+            ),
+        }
+
+
+def run_scenario(setup, body, rows, repeat, quiet=True, after=None) -> dict:
+    import metrics
+
+    runs = []
+    metrics.reset()
+    # The pipelines print progress per shipment / lane; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        for _ in range(repeat):
+            setup()
+            started = time.perf_counter()
+            body()
+            runs.append(time.perf_counter() - started)
+            if after:
+                after()
+    median = statistics.median(runs)
+    stages = {}
+    for (pipeline, stage), (_, total, count) in metrics.STAGE_SECONDS.series().items():
+        stages[f"{pipeline}.{stage}"] = total / count
+    for (agent,), (_, total, count) in metrics.LLM_SECONDS.series().items():
+        stages[f"llm.{agent}"] = total / count
+    return {
+        "runs_s": [round(r, 6) for r in runs],
+        "median_s": round(median, 6),
+        "min_s": round(min(runs), 6),
+        "max_s": round(max(runs), 6),
+        "rows": rows,
+        "rows_per_s": round(rows / median, 2) if median > 0 else None,
+        "stage_mean_s": {name: round(value, 6) for name, value in sorted(stages.items())},
+    }
+
+
+# ===================== RESULTS ===================== #
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_s: float) -> list:
+    """
+    Prints current vs baseline medians; returns the names of regressed
+    scenarios. A slowdown below min_delta_s is treated as noise.
+    """
+    ignored = {"out", "baseline", "threshold", "min_delta_ms", "scenarios", "verbose", "record", "replay"}
+    current_params = {k: v for k, v in results["meta"]["params"].items() if k not in ignored}
+    baseline_params = {k: v for k, v in baseline["meta"]["params"].items() if k not in ignored}
+    if current_params != baseline_params:
+        print(f"⚠️ Parameters differ from the baseline: {baseline_params} -> {current_params}")
+
+    regressions = []
+    print(f"\n{'scenario':<22} {'baseline s':>11} {'current s':>10} {'ratio':>7}  status")
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None or not before["median_s"]:
+            print(f"{name:<22} {'-':>11} {current['median_s']:>10.4f} {'-':>7}  new")
+            continue
+        ratio = current["median_s"] / before["median_s"]
+        if ratio > 1 + threshold and current["median_s"] - before["median_s"] >= min_delta_s:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        print(f"{name:<22} {before['median_s']:>11.4f} {current['median_s']:>10.4f} {ratio:>7.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with stub geocoder and LLM.")
+    parser.add_argument("--shipments", type=int, default=2000)
+    parser.add_argument("--trucks", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario")
+    parser.add_argument("--requests", type=int, default=50, help="requests per run of the small GET scenarios")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--new-orders", type=int, default=20, help="shipments added before each optimize_insert run")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-ms-per-1k-tokens", type=float, default=0.0, help="extra stub latency per 1k prompt tokens")
+    parser.add_argument("--prompt-encoding", choices=["compact", "json"], default="json")
+    parser.add_argument("--geocoder-latency-ms", type=float, default=20.0)
+    parser.add_argument("--geocode-rate", type=float, default=500.0, help="provider requests per second")
+    parser.add_argument("--llm-cache", choices=["off", "on"], default="off", help="LLM_CACHE_MODE for the stub models")
+    parser.add_argument("--record", metavar="CASSETTE", help="record the stub models' responses to a cassette")
+    parser.add_argument("--replay", metavar="CASSETTE", help="replay recorded model responses instead of the stubs")
+    parser.add_argument("--scenarios", nargs="+", help="run only these scenarios")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own output")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+    out_path = os.path.abspath(args.out)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    geocoder = StubGeocoderServer(latency_ms=args.geocoder_latency_ms).start()
+
+    # Everything below reads its settings at import time
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "OPENCAGE_URL": geocoder.url,
+        "OPENCAGE_API_KEY": "stub",
+        "GEOCODE_RATE_PER_SEC": str(args.geocode_rate),
+        # Every /delay/ run must reach the (stub) LLM
+        "DELAY_LANE_CACHE_TTL_MINUTES": "0",
+        "JOB_WORKERS": "0",
+        "LLM_PROMPT_ENCODING": args.prompt_encoding,
+        "LLM_CACHE_MODE": "replay" if args.replay else "record" if args.record else args.llm_cache,
+    })
+    if args.replay or args.record:
+        os.environ["LLM_CASSETTE"] = os.path.abspath(args.replay or args.record)
+    os.chdir(workdir)
+
+    from fastapi.testclient import TestClient
+
+    import main as app_module
+    import stub_llm
+
+    if not args.replay:
+        stub_llm.install(latency_s=args.llm_latency_ms / 1000.0, ms_per_1k_tokens=args.llm_ms_per_1k_tokens)
+
+    results = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": vars(args),
+        },
+        "scenarios": {},
+    }
+    try:
+        with TestClient(app_module.app) as client:
+            suite = Suite(client, args)
+            with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+                suite._ok(client.post("/weights/fixed/", json=WEIGHTS))
+                suite.seed()
+            scenarios = suite.scenarios()
+            unknown = set(args.scenarios or []) - set(scenarios)
+            if unknown:
+                parser.error(f"unknown scenarios {sorted(unknown)}; choose from {list(scenarios)}")
+
+            print(f"{args.shipments} shipments, {args.trucks} trucks, {args.repeat} runs per scenario")
+            print(f"{'scenario':<22} {'median s':>9} {'min s':>9} {'max s':>9} {'rows/s':>11}")
+            for name, (setup, body, rows, *after) in scenarios.items():
+                if args.scenarios and name not in args.scenarios:
+                    continue
+                result = results["scenarios"][name] = run_scenario(setup, body, rows, args.repeat,
+                                                                   quiet=not args.verbose, after=after[0] if after else None)
+                print(f"{name:<22} {result['median_s']:>9.4f} {result['min_s']:>9.4f} "
+                      f"{result['max_s']:>9.4f} {result['rows_per_s'] or 0:>11.1f}")
+    finally:
+        geocoder.shutdown()
+        os.chdir(BACKEND)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"📝 Results written to {out_path}")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000.0)
+        if regressions:
+            print(f"❌ {len(regressions)} scenarios regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/stub_geocoder.py
+#
+# Local stand-in for the OpenCage forward-geocoding endpoint.
+# Answers are derived from a hash of the query so they are deterministic.
+#
+#   python benchmarks/stub_geocoder.py --port 8090 --latency-ms 50
+#   OPENCAGE_URL=http://127.0.0.1:8090/geocode/v1/json OPENCAGE_API_KEY=stub uvicorn main:app
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def stub_coordinates(query: str):
+    """Deterministic point inside India's bounding box, or None for 'unknown' addresses."""
+    if "unknown" in query.lower():
+        return None
+    digest = hashlib.sha256(query.encode("utf-8")).digest()
+    lat = 8.0 + (int.from_bytes(digest[:4], "big") / 2**32) * 29.0
+    lng = 68.0 + (int.from_bytes(digest[4:8], "big") / 2**32) * 29.0
+    return {"lat": round(lat, 6), "lng": round(lng, 6)}
+
+
+class StubGeocoderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency_ms: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency_ms = latency_ms
+        self.requests_served = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/geocode/v1/json"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000.0)
+        with self.server._lock:
+            self.server.requests_served += 1
+
+        coords = stub_coordinates(query)
+        results = [{"geometry": coords, "formatted": query}] if coords else []
+        body = json.dumps({"results": results, "status": {"code": 200, "message": "OK"}}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenCage stand-in.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubGeocoderServer(("127.0.0.1", args.port), latency_ms=args.latency_ms)
+    print(f"Stub geocoder listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,142 @@
+# benchmarks/stub_llm.py
+#
+# Local stand-in for genai.GenerativeModel. Answers are computed from the
+# prompt, so they are deterministic, and every call sleeps latency_s plus
+# ms_per_1k_tokens for every thousand (estimated) prompt and response
+# tokens before answering, as model latency grows with both. install() swaps the stubs in for the
+# route planner (verbose and compact prompts), plan finalizer and delay
+# checker models:
+#   import stub_llm; stub_llm.install(latency_s=2.0, ms_per_1k_tokens=50)
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+
+from prompt_encoding import CHARS_PER_TOKEN
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """`respond(prompt) -> str` behind the generate_content / generate_content_async API."""
+
+    def __init__(self, respond, latency_s: float = 0.0, ms_per_1k_tokens: float = 0.0):
+        self.respond = respond
+        self.latency_s = latency_s
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def _latency(self, prompt: str, text: str) -> float:
+        return self.latency_s + (len(prompt) + len(text)) / CHARS_PER_TOKEN / 1000.0 * self.ms_per_1k_tokens / 1000.0
+
+    def generate_content(self, prompt):
+        self._count()
+        text = self.respond(str(prompt))
+        latency = self._latency(str(prompt), text)
+        if latency:
+            time.sleep(latency)
+        return StubResponse(text)
+
+    async def generate_content_async(self, prompt):
+        self._count()
+        text = self.respond(str(prompt))
+        latency = self._latency(str(prompt), text)
+        if latency:
+            await asyncio.sleep(latency)
+        return StubResponse(text)
+
+
+# ===================== RESPONDERS ===================== #
+def plan_routes(prompt: str) -> str:
+    """
+    Route planner: first-fit by origin city, heaviest shipment first, into
+    trucks in prompt order. The plan always passes the capacity validator.
+    """
+    data = json.loads(prompt)
+    remaining = {
+        t["truck_number"]: [t["capacity_weight"] or 0.0,
+                            float("inf") if t["capacity_volume"] is None else t["capacity_volume"]]
+        for t in data["trucks"]
+    }
+    plan = {}
+    shipments = sorted(data["shipments"], key=lambda s: (str(s["origin_address_city"]), -(s["weight"] or 0.0), s["id"]))
+    for s in shipments:
+        weight, volume = s["weight"] or 0.0, s["volume"] or 0.0
+        for number, (free_weight, free_volume) in remaining.items():
+            if weight <= free_weight and volume <= free_volume:
+                remaining[number][0] -= weight
+                remaining[number][1] -= volume
+                plan.setdefault(number, []).append(s["id"])
+                break
+    return json.dumps([{"truck_number": number, "shipment_ids": ids} for number, ids in plan.items()])
+
+
+def plan_routes_compact(prompt: str) -> str:
+    """plan_routes for prompt_encoding's compact prompt: the same packing, answered in aliases."""
+    data = json.loads(prompt)
+    cities = data["cities"]
+    trucks = [
+        {"truck_number": row[0], "capacity_weight": row[1], "capacity_volume": row[2]}
+        for row in data["trucks"]["rows"]
+    ]
+    shipments = [
+        {"id": s, "origin_address_city": cities[lane[0]], "weight": kg, "volume": m3}
+        for lane in data["lanes"]["rows"] for s, kg, m3 in lane[5]
+    ]
+    plan = json.loads(plan_routes(json.dumps({"trucks": trucks, "shipments": shipments})))
+    return json.dumps([{"t": p["truck_number"], "s": p["shipment_ids"]} for p in plan])
+
+
+def finalize_plan(prompt: str) -> str:
+    """Plan finalizer: returns the validated plan unchanged."""
+    return prompt
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "big")
+
+
+def assess_lanes(prompt: str) -> str:
+    """Delay checker: one assessment per lane_id, derived from the lane and its distance."""
+    match = re.search(r"(\[.*\])", prompt, re.DOTALL)
+    lanes = json.loads(match.group(1)) if match else []
+    results = []
+    for lane in lanes:
+        h = _hash(f"{lane.get('source')}|{lane.get('destination')}")
+        normal = round((lane.get("straight_line_km") or 500) / 45.0 + 2, 1)
+        delay = h % 13 if h % 4 == 0 else 0
+        results.append({
+            "lane_id": lane["lane_id"],
+            "possible_delay_reason": "Highway maintenance" if delay else "No disruption reported",
+            "estimated_delay_hours": delay,
+            "normal_duration_hours": normal,
+            "expected_duration_hours": normal + delay,
+        })
+    return json.dumps(results)
+
+
+def install(latency_s: float = 0.0, ms_per_1k_tokens: float = 0.0) -> dict:
+    """Replaces the app's Gemini models with stubs; returns them by agent."""
+    import llm
+    import shipment_delay_checker
+
+    stubs = {
+        "planner": StubGenerativeModel(plan_routes, latency_s, ms_per_1k_tokens),
+        "planner_compact": StubGenerativeModel(plan_routes_compact, latency_s, ms_per_1k_tokens),
+        "finalizer": StubGenerativeModel(finalize_plan, latency_s, ms_per_1k_tokens),
+        "delay": StubGenerativeModel(assess_lanes, latency_s, ms_per_1k_tokens),
+    }
+    llm.get_agent = stubs.__getitem__
+    shipment_delay_checker.get_model = lambda: stubs["delay"]
+    return stubs
@@ -0,0 +1,160 @@
+# benchmarks/synthetic_data.py
+#
+# Deterministic synthetic shipments and trucks for benchmarks. Cities are
+# real Indian cities with their state code, a real pincode and coordinates;
+# lanes are drawn from a few freight hubs towards destinations weighted by
+# city size, and trucks follow common Indian truck classes.
+# Rows match the /shipments/bulk/ and /shipments/bulktruck/ payloads.
+#   python benchmarks/synthetic_data.py --shipments 10000 --trucks 500 --out data
+# writes data/shipments.ndjson and data/trucks.ndjson.
+
+import argparse
+import json
+import os
+import random
+import uuid
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+# (city, state code, pincode, lat, lng, relative size)
+CITIES = [
+    ("Delhi", "DL", "110001", 28.6139, 77.2090, 10),
+    ("Mumbai", "MH", "400001", 19.0760, 72.8777, 10),
+    ("Bengaluru", "KA", "560001", 12.9716, 77.5946, 8),
+    ("Chennai", "TN", "600001", 13.0827, 80.2707, 7),
+    ("Kolkata", "WB", "700001", 22.5726, 88.3639, 7),
+    ("Hyderabad", "TS", "500001", 17.3850, 78.4867, 7),
+    ("Ahmedabad", "GJ", "380001", 23.0225, 72.5714, 6),
+    ("Pune", "MH", "411001", 18.5204, 73.8567, 6),
+    ("Surat", "GJ", "395003", 21.1702, 72.8311, 4),
+    ("Jaipur", "RJ", "302001", 26.9124, 75.7873, 4),
+    ("Lucknow", "UP", "226001", 26.8467, 80.9462, 4),
+    ("Kanpur", "UP", "208001", 26.4499, 80.3319, 3),
+    ("Nagpur", "MH", "440001", 21.1458, 79.0882, 3),
+    ("Indore", "MP", "452001", 22.7196, 75.8577, 3),
+    ("Bhopal", "MP", "462001", 23.2599, 77.4126, 2),
+    ("Ludhiana", "PB", "141001", 30.9010, 75.8573, 2),
+    ("Coimbatore", "TN", "641001", 11.0168, 76.9558, 2),
+    ("Kochi", "KL", "682001", 9.9312, 76.2673, 2),
+    ("Visakhapatnam", "AP", "530001", 17.6868, 83.2185, 2),
+    ("Guwahati", "AS", "781001", 26.1445, 91.7362, 2),
+    ("Patna", "BR", "800001", 25.5941, 85.1376, 2),
+    ("Bhubaneswar", "OD", "751001", 20.2961, 85.8245, 1),
+    ("Raipur", "CG", "492001", 21.2514, 81.6296, 1),
+    ("Dehradun", "UK", "248001", 30.3165, 78.0322, 1),
+]
+# Freight hubs originate most shipments
+HUBS = ["Delhi", "Mumbai", "Chennai", "Kolkata", "Bengaluru", "Ahmedabad", "Hyderabad", "Pune"]
+STREETS = ["MG Road", "Station Road", "Ring Road", "Industrial Area Phase 2", "Transport Nagar",
+           "GT Road", "Nehru Nagar", "Gandhi Chowk", "MIDC Estate", "Sector 18", "Market Yard", "NH 48 Bypass"]
+# (class, capacity kg, volume m3, relative frequency)
+TRUCK_CLASSES = [
+    ("LCV", 3500.0, 18.0, 4),
+    ("MCV", 9000.0, 32.0, 3),
+    ("HCV", 16000.0, 45.0, 2),
+    ("Trailer", 25000.0, 70.0, 1),
+]
+
+_BY_NAME = {c[0]: c for c in CITIES}
+
+
+def _address(rng, city) -> dict:
+    name, state, pincode = city[:3]
+    return {"street": f"{rng.randint(1, 400)}, {rng.choice(STREETS)}", "city": name, "state": state,
+            "pincode": pincode, "country": "India"}
+
+
+def make_shipments(n: int, seed: int = 7, today: date = None) -> list:
+    """n /shipments/bulk/ rows, always the same for a given seed and day."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    sizes = [c[5] for c in CITIES]
+    hubs = [_BY_NAME[h] for h in HUBS]
+    rows = []
+    for i in range(n):
+        origin = rng.choice(hubs) if rng.random() < 0.8 else rng.choices(CITIES, sizes)[0]
+        destination = origin
+        while destination is origin:
+            destination = rng.choices(CITIES, sizes)[0]
+        frozen = rng.random() < 0.15
+        # Parcels through part loads: mostly small, a long tail of heavy consignments
+        weight = round(min(rng.lognormvariate(5.0, 1.1), 8000.0), 2)
+        rows.append({
+            "order_id": f"ORD-{seed}-{i:07d}",
+            "customer_id": f"CUST-{rng.randint(1, max(10, n // 20)):05d}",
+            "origin_address": _address(rng, origin),
+            "destination_address": _address(rng, destination),
+            "value": round(weight * rng.uniform(40, 900), 2),
+            "weight": weight,
+            "volume": round(max(0.05, weight / rng.uniform(150, 400)), 3),
+            "shelf_life_days": rng.randint(2, 10) if frozen else rng.randint(15, 180),
+            "delivery_date": (today + timedelta(days=rng.randint(1, 21))).isoformat(),
+            "shipment_type": "frozen" if frozen else "normal",
+        })
+    return rows
+
+
+def make_trucks(m: int, seed: int = 7) -> list:
+    """m /shipments/bulktruck/ rows parked near the hubs."""
+    rng = random.Random(seed + 1)
+    frequencies = [c[3] for c in TRUCK_CLASSES]
+    trucks = []
+    for i in range(m):
+        kind, capacity_kg, volume, _ = rng.choices(TRUCK_CLASSES, frequencies)[0]
+        city = _BY_NAME[rng.choice(HUBS)]
+        trucks.append({
+            "registration_number": f"{city[1]}{rng.randint(1, 99):02d}{chr(65 + i // 10000 % 26)}{chr(65 + i % 26)}{i % 10000:04d}",
+            "current_location_lat": round(city[3] + rng.uniform(-0.15, 0.15), 5),
+            "current_location_lng": round(city[4] + rng.uniform(-0.15, 0.15), 5),
+            "capacity_kg": capacity_kg,
+            "available_volume_cubic_m": volume,
+            "truck_type": kind,
+            "driver_contact": f"+91 9{rng.randint(100000000, 999999999)}",
+            "status": "available",
+        })
+    return trucks
+
+
+def as_models(n_shipments: int, n_trucks: int, seed: int = 7) -> tuple:
+    """
+    (trucks, shipments) shaped like the Truck and Shipment models, geocoded
+    to the city coordinates, for benchmarks that skip the database.
+    """
+    namespace = uuid.UUID(int=seed)
+    shipments = []
+    for row in make_shipments(n_shipments, seed):
+        origin = _BY_NAME[row["origin_address"]["city"]]
+        destination = _BY_NAME[row["destination_address"]["city"]]
+        shipments.append(SimpleNamespace(
+            shipment_id=uuid.uuid5(namespace, row["order_id"]), origin_address=row["origin_address"],
+            destination_address=row["destination_address"], origin_lat=origin[3], origin_lng=origin[4],
+            destination_lat=destination[3], destination_lng=destination[4], weight=row["weight"], volume=row["volume"],
+        ))
+    trucks = [
+        SimpleNamespace(truck_id=uuid.uuid5(namespace, row["registration_number"]), **{
+            key: row[key] for key in ("registration_number", "capacity_kg", "available_volume_cubic_m",
+                                      "current_location_lat", "current_location_lng")
+        })
+        for row in make_trucks(n_trucks, seed)
+    ]
+    return trucks, shipments
+
+
+def write_ndjson(path: str, rows: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic shipments and trucks as NDJSON.")
+    parser.add_argument("--shipments", type=int, default=1000)
+    parser.add_argument("--trucks", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=".")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    write_ndjson(os.path.join(args.out, "shipments.ndjson"), make_shipments(args.shipments, args.seed))
+    write_ndjson(os.path.join(args.out, "trucks.ndjson"), make_trucks(args.trucks, args.seed))
+    print(f"Wrote {args.shipments} shipments and {args.trucks} trucks to {args.out}")
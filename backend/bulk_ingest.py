@@ -0,0 +1,214 @@
+# bulk_ingest.py
+
+import csv
+import json
+import os
+from types import SimpleNamespace
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+import models
+from models import generate_uuid
+from priority_stats import score_new_shipments
+from schemas import ShipmentCreate, Truckcreate
+from shipment_upsert import content_hash, upsert_shipments
+from spatial import index_shipment, index_truck
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+MAX_INGEST_BATCH_SIZE = 50000
+
+_ADDRESS_FIELDS = ("street", "city", "state", "pincode", "country")
+
+
+# ===================== LINE PARSING ===================== #
+async def iter_request_lines(request):
+    """Yields decoded lines from a streamed request body without buffering it whole."""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+def _csv_record(header, line):
+    """
+    Flat CSV row -> nested record. origin_<field>/destination_<field> columns
+    become address dicts; regulatory_flags is ';'-separated; blanks are None.
+    """
+    values = next(csv.reader([line]))
+    row = {k: (v if v != "" else None) for k, v in zip(header, values)}
+    for prefix in ("origin", "destination"):
+        if any(f"{prefix}_{f}" in row for f in _ADDRESS_FIELDS):
+            row[f"{prefix}_address"] = {f: row.pop(f"{prefix}_{f}", None) for f in _ADDRESS_FIELDS}
+    flags = row.get("regulatory_flags")
+    if flags is not None:
+        row["regulatory_flags"] = [f for f in flags.split(";") if f]
+    elif "regulatory_flags" in row:
+        del row["regulatory_flags"]
+    return row
+
+
+async def iter_records(request, content_type: str):
+    """Yields (line_number, record_or_error) for NDJSON or CSV bodies."""
+    is_csv = "csv" in (content_type or "")
+    header = None
+    line_number = 0
+    async for line in iter_request_lines(request):
+        line_number += 1
+        if not line.strip():
+            continue
+        if is_csv and header is None:
+            header = next(csv.reader([line]))
+            continue
+        try:
+            record = _csv_record(header, line) if is_csv else json.loads(line)
+        except (ValueError, StopIteration) as e:
+            record = ValueError(f"Unparseable line: {e}")
+        yield line_number, record
+
+
+# ===================== CHUNK INGESTION ===================== #
+class _Kind:
+    def __init__(self, table, schema, id_column, prepare, upsert=None):
+        self.table = table
+        self.schema = schema
+        self.id_column = id_column
+        self.prepare = prepare
+        self.upsert = upsert
+
+
+def _prepare_shipments(db: Session, rows):
+    # Score at insert time, same as /shipments/bulk/
+    shipments = [SimpleNamespace(**row) for row in rows]
+    score_new_shipments(db, shipments)
+    for row, shipment in zip(rows, shipments):
+        row["priority_score"] = shipment.priority_score
+        row["content_hash"] = content_hash(row)
+        index_shipment(row)
+
+
+def _prepare_trucks(db: Session, rows):
+    # Assignments live in truck_assignments and are made by the route optimizer
+    for row in rows:
+        row.pop("shipment_ids", None)
+        index_truck(row)
+
+
+SHIPMENTS = _Kind(models.Shipment.__table__, ShipmentCreate, "shipment_id", _prepare_shipments, upsert_shipments)
+TRUCKS = _Kind(models.Truck.__table__, Truckcreate, "truck_id", _prepare_trucks)
+
+
+class BulkIngestor:
+    """
+    Validates records a chunk at a time and inserts each chunk with a single
+    Core executemany in its own transaction. A chunk that fails to insert is
+    retried row by row so only the offending rows are rejected. With `upsert`
+    rows are matched on the kind's natural key instead of always inserted.
+    """
+
+    def __init__(self, db: Session, kind: _Kind, batch_size: int = INGEST_BATCH_SIZE, upsert: bool = False):
+        if upsert and kind.upsert is None:
+            raise ValueError("Upsert is not supported for this kind of record")
+        self.db = db
+        self.kind = kind
+        self.upsert = upsert
+        self.batch_size = max(1, min(batch_size, MAX_INGEST_BATCH_SIZE))
+        self.chunks = []
+
+    def ingest_chunk(self, records) -> dict:
+        """`records` is a list of (line_number, record_or_error)."""
+        errors = []
+        rows = []
+        lines = []
+        for line_number, record in records:
+            if isinstance(record, Exception):
+                errors.append({"line": line_number, "error": str(record)})
+                continue
+            try:
+                row = self.kind.schema(**record).dict()
+            except (ValidationError, TypeError) as e:
+                errors.append({"line": line_number, "error": str(e)})
+                continue
+            rows.append(row)
+            lines.append(line_number)
+
+        written = {"inserted": [], "updated": [], "skipped": []}
+        if rows:
+            try:
+                written = self._write(rows)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                written = self._write_one_by_one(rows, lines, errors)
+
+        result = {
+            "chunk": len(self.chunks),
+            "received": len(records),
+            "inserted": len(written["inserted"]),
+            "updated": len(written["updated"]),
+            "skipped": len(written["skipped"]),
+            "ids": written["inserted"] + written["updated"],
+            "errors": errors,
+        }
+        self.chunks.append(result)
+        return result
+
+    def _write(self, rows) -> dict:
+        if self.upsert:
+            return self.kind.upsert(self.db, rows)
+        rows = [dict(row, **{self.kind.id_column: generate_uuid()}) for row in rows]
+        self.kind.prepare(self.db, rows)
+        self.db.execute(insert(self.kind.table), rows)
+        return {"inserted": [row[self.kind.id_column] for row in rows], "updated": [], "skipped": []}
+
+    def _write_one_by_one(self, rows, lines, errors):
+        written = {"inserted": [], "updated": [], "skipped": []}
+        for row, line_number in zip(rows, lines):
+            try:
+                outcome = self._write([row])
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                errors.append({"line": line_number, "error": str(getattr(e, "orig", e))})
+                continue
+            for key in written:
+                written[key] += outcome[key]
+        return written
+
+    def summary(self) -> dict:
+        return {
+            "inserted": sum(c["inserted"] for c in self.chunks),
+            "updated": sum(c["updated"] for c in self.chunks),
+            "skipped": sum(c["skipped"] for c in self.chunks),
+            "rejected": sum(len(c["errors"]) for c in self.chunks),
+            "chunks": self.chunks,
+        }
+
+
+# ===================== REQUEST DRIVER ===================== #
+async def ingest_request(request, kind: _Kind, batch_size: int = INGEST_BATCH_SIZE, upsert: bool = False) -> dict:
+    """
+    Reads an NDJSON or CSV body line by line and hands each full chunk to a
+    BulkIngestor on the threadpool, so at most one chunk is held in memory.
+    """
+    db = SessionLocal()
+    try:
+        ingestor = await run_in_threadpool(BulkIngestor, db, kind, batch_size, upsert)
+        chunk = []
+        async for record in iter_records(request, request.headers.get("content-type")):
+            chunk.append(record)
+            if len(chunk) >= ingestor.batch_size:
+                await run_in_threadpool(ingestor.ingest_chunk, chunk)
+                chunk = []
+        if chunk:
+            await run_in_threadpool(ingestor.ingest_chunk, chunk)
+        return ingestor.summary()
+    finally:
+        db.close()
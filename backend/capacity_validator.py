@@ -0,0 +1,139 @@
+# capacity_validator.py
+
+import numpy as np
+
+
+# ===================== CAPACITY VALIDATOR ===================== #
+class CapacityValidator:
+    """
+    Checks route plans against truck capacity with plain arithmetic.
+
+    Shipment weights/volumes and truck capacities are packed into arrays once,
+    so validating each proposed plan is a single scatter-add per dimension.
+    """
+
+    # Absolute slack for float summation noise, in kg / cubic metres
+    tolerance = 1e-6
+
+    def __init__(self, trucks, shipments):
+        self.truck_numbers = [t.registration_number for t in trucks]
+        self.truck_index = {number: i for i, number in enumerate(self.truck_numbers)}
+        self.shipment_index = {str(s.shipment_id): i for i, s in enumerate(shipments)}
+
+        self.weights = np.array([s.weight or 0.0 for s in shipments], dtype=np.float64)
+        self.volumes = np.array([s.volume or 0.0 for s in shipments], dtype=np.float64)
+        self.capacity_weight = np.array([t.capacity_kg or 0.0 for t in trucks], dtype=np.float64)
+        # A truck without a declared volume is only constrained by weight
+        self.capacity_volume = np.array(
+            [np.inf if t.available_volume_cubic_m is None else t.available_volume_cubic_m for t in trucks],
+            dtype=np.float64,
+        )
+
+    def validate(self, route_plan) -> dict:
+        """
+        Validates a [{"truck_number", "shipment_ids"}] plan in one pass.
+        Reports every overloaded truck, duplicated assignment and unknown ID.
+        """
+        truck_idx = []
+        shipment_idx = []
+        unknown_trucks = []
+        unknown_shipments = []
+        malformed = []
+
+        for position, plan in enumerate(route_plan):
+            if not isinstance(plan, dict) or not isinstance(plan.get("shipment_ids", []), list):
+                malformed.append(position)
+                continue
+            truck_number = plan.get("truck_number")
+            # Registration numbers are strings; anything else (even unhashable) is unknown
+            t = self.truck_index.get(truck_number) if isinstance(truck_number, str) else None
+            if t is None:
+                unknown_trucks.append(truck_number)
+                continue
+            for sid in plan.get("shipment_ids", []):
+                s = self.shipment_index.get(str(sid))
+                if s is None:
+                    unknown_shipments.append(sid)
+                    continue
+                truck_idx.append(t)
+                shipment_idx.append(s)
+
+        truck_idx = np.asarray(truck_idx, dtype=np.intp)
+        shipment_idx = np.asarray(shipment_idx, dtype=np.intp)
+        n_trucks = len(self.truck_numbers)
+
+        # Scatter-add shipment loads onto their trucks
+        weight_load = np.bincount(truck_idx, weights=self.weights[shipment_idx], minlength=n_trucks)
+        volume_load = np.bincount(truck_idx, weights=self.volumes[shipment_idx], minlength=n_trucks)
+
+        over_weight = weight_load > self.capacity_weight + self.tolerance
+        over_volume = volume_load > self.capacity_volume + self.tolerance
+
+        violations = []
+        for t in np.flatnonzero(over_weight | over_volume):
+            if over_weight[t]:
+                violations.append({
+                    "truck_number": self.truck_numbers[t],
+                    "exceeded_type": "weight",
+                    "load": round(float(weight_load[t]), 3),
+                    "capacity": float(self.capacity_weight[t]),
+                })
+            if over_volume[t]:
+                violations.append({
+                    "truck_number": self.truck_numbers[t],
+                    "exceeded_type": "volume",
+                    "load": round(float(volume_load[t]), 3),
+                    "capacity": float(self.capacity_volume[t]),
+                })
+
+        counts = np.bincount(shipment_idx, minlength=len(self.shipment_index))
+        shipment_ids = list(self.shipment_index)
+        duplicates = [shipment_ids[s] for s in np.flatnonzero(counts > 1)]
+
+        if violations:
+            status = "capacity_exceeded"
+        elif duplicates or unknown_shipments or unknown_trucks or malformed:
+            status = "invalid_plan"
+        else:
+            return {"status": "validated"}
+
+        return {
+            "status": status,
+            "violations": violations,
+            "duplicate_shipments": duplicates,
+            "unknown_shipments": unknown_shipments,
+            "unknown_trucks": unknown_trucks,
+            "malformed_entries": malformed,
+        }
+
+
+# ===================== FAILURE FEEDBACK ===================== #
+def format_failure_message(validation_result: dict) -> str:
+    """Turns a failed validation into feedback for the next planner attempt."""
+    parts = []
+    for v in validation_result.get("violations", []):
+        parts.append(
+            f"Truck {v['truck_number']} exceeds {v['exceeded_type']} capacity "
+            f"({v['load']} > {v['capacity']})."
+        )
+    if validation_result.get("duplicate_shipments"):
+        parts.append(
+            "Shipments assigned to more than one truck: "
+            + ", ".join(str(s) for s in validation_result["duplicate_shipments"]) + "."
+        )
+    if validation_result.get("unknown_shipments"):
+        parts.append(
+            "Unknown shipment IDs: "
+            + ", ".join(str(s) for s in validation_result["unknown_shipments"]) + "."
+        )
+    if validation_result.get("unknown_trucks"):
+        parts.append(
+            "Unknown truck numbers: "
+            + ", ".join(str(t) for t in validation_result["unknown_trucks"]) + "."
+        )
+    if validation_result.get("malformed_entries"):
+        parts.append(
+            "Malformed plan entries at positions: "
+            + ", ".join(str(p) for p in validation_result["malformed_entries"]) + "."
+        )
+    return "Capacity validation failed. " + " ".join(parts)
@@ -1,9 +1,136 @@
-from sqlalchemy import create_engine
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./shipments.db"
+# Read .env here: this module is imported (and the engine built) before main.py loads it
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./shipments.db")
+
+# ===================== POOL SETTINGS ===================== #
+# Per process: with N uvicorn workers a server database sees up to N * (size + overflow) connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before typical server/proxy idle timeouts drop the connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+# ===================== SQLITE PRAGMAS ===================== #
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL is durable in WAL mode except for the last commits on power loss; no fsync per commit
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative means KiB, so -65536 is a 64 MiB page cache per connection
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+# How long a writer waits for another process's lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+}
+
+
+def _is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory_sqlite(url) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or database.startswith("file::memory:")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Runs on every new DBAPI connection, sync (sqlite3) or async (aiosqlite adapter)."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def engine_options(url) -> dict:
+    """create_engine keyword arguments for `url`, shared by the sync and async engines."""
+    options = {"echo": DB_ECHO}
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if _is_memory_sqlite(url):
+            # In-memory databases use a single-connection pool; sizing does not apply
+            return options
+        # A local file: a dead connection is not a concern, so skip the pre-ping round trip
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        # Reuse the most recent connection so surplus ones go idle and can be recycled
+        pool_use_lifo=True,
+    )
+    return options
+
+
+ENGINE_OPTIONS = engine_options(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+# Same database through an asyncio driver, for handlers that must not hold a threadpool worker
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def async_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql[+psycopg2]://... -> postgresql+asyncpg://..."""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+ASYNC_DATABASE_URL = async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+# expire_on_commit=False: ORM objects stay readable after commit without another (awaited) load
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if _is_sqlite(DATABASE_URL):
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
 Base = declarative_base()
+
+
+# ===================== STARTUP REPORT ===================== #
+def database_report() -> dict:
+    """Effective settings: URLs (password hidden), pool options, and the pragmas SQLite actually applied."""
+    report = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "async_url": async_engine.url.render_as_string(hide_password=True),
+        "dialect": engine.dialect.name,
+        "pool": {
+            "class": type(engine.pool).__name__,
+            **{k: v for k, v in ENGINE_OPTIONS.items() if k not in ("connect_args", "echo")},
+        },
+    }
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            report["pragmas"] = {
+                name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in SQLITE_PRAGMAS
+            }
+    return report
+
+
+def log_database_config():
+    report = database_report()
+    print(f"🗄️ Database: {report['url']} (async: {report['async_url']})")
+    print("   Pool: " + ", ".join(f"{k}={v}" for k, v in report["pool"].items()))
+    if "pragmas" in report:
+        print("   SQLite: " + ", ".join(f"{k}={v}" for k, v in report["pragmas"].items()))
@@ -0,0 +1,209 @@
+# distance_matrix.py
+#
+# Shared great-circle distance matrices (km, float32) for the route solver,
+# the LLM route prompt and the delay checker's lane durations. Matrices are
+# cached by a fingerprint of their row and column coordinates; when a request
+# only appends points to a cached matrix (new shipments arriving), just the
+# new rows/columns are computed. Large matrices are backed by np.memmap.
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+DISTANCE_CACHE_SIZE = int(os.getenv("DISTANCE_CACHE_SIZE", "8"))
+# Matrices larger than this many bytes live in a memory-mapped file
+DISTANCE_MEMMAP_BYTES = int(os.getenv("DISTANCE_MEMMAP_BYTES", str(256 * 1024 * 1024)))
+DISTANCE_MATRIX_DIR = os.getenv("DISTANCE_MATRIX_DIR") or tempfile.gettempdir()
+# Spare capacity added on each axis when a matrix has to be reallocated
+GROWTH = 1.25
+
+
+# ===================== KERNELS ===================== #
+def as_points(points) -> np.ndarray:
+    """(n, 2) float64 array of (lat, lng); rows with a missing coordinate become NaN."""
+    if isinstance(points, np.ndarray):
+        return points.astype(np.float64, copy=False).reshape(-1, 2)
+    return np.array(
+        [(np.nan, np.nan) if p is None or p[0] is None or p[1] is None else (p[0], p[1]) for p in points],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+
+
+def haversine_matrix(rows, cols, out=None) -> np.ndarray:
+    """All-pairs distances by broadcasting (n, 1) against (1, m), in float32."""
+    rows, cols = np.radians(as_points(rows)).astype(np.float32), np.radians(as_points(cols)).astype(np.float32)
+    lat1, lng1 = rows[:, 0:1], rows[:, 1:2]
+    lat2, lng2 = cols[None, :, 0], cols[None, :, 1]
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) * 0.5) ** 2
+    np.clip(a, 0.0, 1.0, out=a)
+    result = np.arcsin(np.sqrt(a, out=a), out=a)
+    result *= np.float32(2 * EARTH_RADIUS_KM)
+    if out is not None:
+        out[...] = result
+        return out
+    return result
+
+
+def pairwise_km(a, b) -> np.ndarray:
+    """Element-wise distance between a[i] and b[i] (e.g. origin -> destination), float32."""
+    a, b = np.radians(as_points(a)), np.radians(as_points(b))
+    h = np.sin((b[:, 0] - a[:, 0]) / 2) ** 2 + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin((b[:, 1] - a[:, 1]) / 2) ** 2
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))).astype(np.float32)
+
+
+def fingerprint(points: np.ndarray) -> str:
+    return hashlib.sha1(np.ascontiguousarray(points).tobytes()).hexdigest()
+
+
+# ===================== MATRIX ===================== #
+class DistanceMatrix:
+    """
+    A rows x cols distance matrix with spare capacity on both axes, so
+    appending points only computes the new strips.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = as_points(rows)
+        self.cols = as_points(cols)
+        self._buffer, self._path = self._allocate(len(self.rows), len(self.cols))
+        haversine_matrix(self.rows, self.cols, out=self._buffer)
+
+    @property
+    def values(self) -> np.ndarray:
+        """Read-only view of the filled part."""
+        view = self._buffer[:len(self.rows), :len(self.cols)]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+    @staticmethod
+    def _allocate(n, m):
+        """Returns (buffer, memmap path or None)."""
+        if n * m * 4 <= DISTANCE_MEMMAP_BYTES:
+            return np.empty((n, m), dtype=np.float32), None
+        fd, path = tempfile.mkstemp(prefix="distance_", suffix=".f32", dir=DISTANCE_MATRIX_DIR)
+        os.close(fd)
+        return np.memmap(path, dtype=np.float32, mode="w+", shape=(n, m)), path
+
+    def extend(self, new_rows=None, new_cols=None):
+        """Appends points on either axis and fills only the new strips."""
+        new_rows = as_points(new_rows if new_rows is not None else [])
+        new_cols = as_points(new_cols if new_cols is not None else [])
+        n, m = len(self.rows), len(self.cols)
+        n2, m2 = n + len(new_rows), m + len(new_cols)
+        if n2 > self._buffer.shape[0] or m2 > self._buffer.shape[1]:
+            # Grow geometrically so repeated small appends stay amortized O(new cells)
+            grown_n = max(n2, int(self._buffer.shape[0] * GROWTH)) if n2 > self._buffer.shape[0] else self._buffer.shape[0]
+            grown_m = max(m2, int(self._buffer.shape[1] * GROWTH)) if m2 > self._buffer.shape[1] else self._buffer.shape[1]
+            buffer, path = self._allocate(grown_n, grown_m)
+            buffer[:n, :m] = self._buffer[:n, :m]
+            self.release()
+            self._buffer, self._path = buffer, path
+
+        self.rows = np.concatenate([self.rows, new_rows])
+        self.cols = np.concatenate([self.cols, new_cols])
+        if len(new_cols):
+            haversine_matrix(self.rows[:n], new_cols, out=self._buffer[:n, m:m2])
+        if len(new_rows):
+            haversine_matrix(new_rows, self.cols, out=self._buffer[n:n2, :m2])
+        return self
+
+    def release(self):
+        """Deletes the backing file of a memory-mapped matrix (open views stay valid)."""
+        if self._path:
+            os.remove(self._path)
+            self._path = None
+
+
+# ===================== CACHE ===================== #
+class DistanceMatrixCache:
+    """
+    LRU of DistanceMatrix keyed by (row fingerprint, col fingerprint). A miss
+    whose points extend a cached entry's points reuses and extends that entry.
+    """
+
+    def __init__(self, max_entries: int = DISTANCE_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.extensions = self.misses = 0
+
+    def matrix(self, rows, cols) -> np.ndarray:
+        """float32 (len(rows), len(cols)) distances in km; NaN where a point is missing."""
+        rows, cols = as_points(rows), as_points(cols)
+        key = (fingerprint(rows), fingerprint(cols))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.values
+
+            base_key = self._prefix_entry(rows, cols)
+            if base_key is not None:
+                entry = self._entries.pop(base_key)
+                entry.extend(rows[len(entry.rows):], cols[len(entry.cols):])
+                self.extensions += 1
+            else:
+                entry = DistanceMatrix(rows, cols)
+                self.misses += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.release()
+            return entry.values
+
+    def _prefix_entry(self, rows, cols):
+        for key, entry in reversed(self._entries.items()):
+            n, m = len(entry.rows), len(entry.cols)
+            if n <= len(rows) and m <= len(cols) and (n, m) != (len(rows), len(cols)) \
+                    and np.array_equal(entry.rows, rows[:n], equal_nan=True) \
+                    and np.array_equal(entry.cols, cols[:m], equal_nan=True):
+                return key
+        return None
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                entry.release()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.nbytes for e in self._entries.values()),
+                "hits": self.hits,
+                "extensions": self.extensions,
+                "misses": self.misses,
+            }
+
+
+distance_cache = DistanceMatrixCache()
+
+
+def distance_matrix(rows, cols) -> np.ndarray:
+    """Module-level entry point; every caller shares `distance_cache`."""
+    return distance_cache.matrix(rows, cols)
+
+
+def centroids(groups) -> tuple:
+    """
+    `groups` maps a key (e.g. a city) to (lat, lng) pairs. Returns (keys, points)
+    with each key's mean position, NaN for keys without any coordinates.
+    """
+    keys = sorted(groups, key=str)
+    points = []
+    for key in keys:
+        known = as_points(groups[key])
+        known = known[~np.isnan(known).any(axis=1)]
+        points.append(known.mean(axis=0) if len(known) else (np.nan, np.nan))
+    return keys, as_points(np.array(points, dtype=np.float64).reshape(-1, 2))
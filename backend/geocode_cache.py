@@ -0,0 +1,228 @@
+# geocode_cache.py
+
+import argparse
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine
+from metrics import GEOCODE_LOOKUPS
+from models import GeocodeCacheEntry
+
+# ===================== SETTINGS ===================== #
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv("GEOCODE_CACHE_TTL_DAYS", "90"))
+GEOCODE_NEGATIVE_TTL_DAYS = float(os.getenv("GEOCODE_NEGATIVE_TTL_DAYS", "7"))
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "4096"))
+
+_PINCODE_RE = re.compile(r"\b(\d{3})\s?(\d{3})\b")
+_ADDRESS_FIELDS = ("street", "city", "state", "pincode", "country")
+
+
+# ===================== ADDRESS NORMALIZATION ===================== #
+def _address_text(address) -> str:
+    if isinstance(address, dict):
+        return ", ".join(str(address.get(field) or "") for field in _ADDRESS_FIELDS)
+    return str(address)
+
+
+def normalize_address(address) -> str:
+    """
+    Builds the cache key for an address string or address dict.
+    The key is case-folded and whitespace-collapsed, and a 6-digit pincode
+    (also written as "302 001") is pulled out in front so that spelling
+    differences in the rest of the address do not split cache entries.
+    """
+    text = " ".join(_address_text(address).split()).casefold()
+    match = _PINCODE_RE.search(text)
+    pincode = ""
+    if match:
+        pincode = match.group(1) + match.group(2)
+        text = text[:match.start()] + text[match.end():]
+
+    parts = [" ".join(p.split()) for p in text.split(",")]
+    text = ", ".join(p for p in parts if p)
+    return f"{pincode}|{text}"
+
+
+# ===================== LOOKUP STATS ===================== #
+class GeocodeStats:
+    """Counts which layer served each lookup during one request."""
+
+    def __init__(self):
+        self.memory = 0
+        self.database = 0
+        self.api = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict:
+        return {"memory": self.memory, "database": self.database, "api": self.api, "errors": self.errors}
+
+
+# ===================== IN-PROCESS LRU ===================== #
+class _MemoryLRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, coords, fetched_at):
+        with self._lock:
+            self._entries[key] = (coords, fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_memory = _MemoryLRU(GEOCODE_LRU_SIZE)
+
+
+def _is_fresh(found: bool, fetched_at: datetime, now: datetime) -> bool:
+    ttl_days = GEOCODE_CACHE_TTL_DAYS if found else GEOCODE_NEGATIVE_TTL_DAYS
+    return fetched_at is not None and now - fetched_at < timedelta(days=ttl_days)
+
+
+# ===================== CACHED LOOKUP ===================== #
+def lookup_cached_many(addresses, db: Session, stats: GeocodeStats = None) -> dict:
+    """
+    Resolves as many addresses as possible from the LRU and the geocode_cache
+    table without calling the provider. Returns {address: coords_or_None}
+    for the hits only; anything missing from the result needs a fetch.
+    """
+    now = datetime.utcnow()
+    hits = {}
+    pending = {}
+    for address in addresses:
+        key = normalize_address(address)
+        entry = _memory.get(key)
+        if entry is not None and _is_fresh(entry[0] is not None, entry[1], now):
+            hits[address] = entry[0]
+            GEOCODE_LOOKUPS.inc(layer="memory")
+            if stats:
+                stats.memory += 1
+        else:
+            pending.setdefault(key, []).append(address)
+
+    keys = list(pending)
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = db.query(GeocodeCacheEntry).filter(GeocodeCacheEntry.address_key.in_(chunk)).all()
+        for row in rows:
+            if not _is_fresh(row.found, row.fetched_at, now):
+                continue
+            coords = {"lat": row.lat, "lng": row.lng} if row.found else None
+            _memory.put(row.address_key, coords, row.fetched_at)
+            for address in pending[row.address_key]:
+                hits[address] = coords
+                GEOCODE_LOOKUPS.inc(layer="database")
+                if stats:
+                    stats.database += 1
+    return hits
+
+
+def store_geocode(address, coords, db: Session):
+    """Writes a provider answer (or a "no result" marker) to both cache layers."""
+    key = normalize_address(address)
+    now = datetime.utcnow()
+    row = db.get(GeocodeCacheEntry, key)
+    if row is None:
+        row = GeocodeCacheEntry(address_key=key)
+        db.add(row)
+    row.address = _address_text(address)
+    row.lat = coords["lat"] if coords else None
+    row.lng = coords["lng"] if coords else None
+    row.found = coords is not None
+    row.fetched_at = now
+    _memory.put(key, coords, now)
+
+
+def cached_geocode(address, fetch, db: Session = None, stats: GeocodeStats = None):
+    """
+    Resolves an address through the in-process LRU, then the geocode_cache
+    table, then `fetch(address)`. Returns {"lat", "lng"} or None when the
+    provider has no result; "no result" answers are cached too, with their
+    own shorter TTL. Exceptions raised by `fetch` are not cached.
+    """
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        hits = lookup_cached_many([address], db, stats)
+        if address in hits:
+            return hits[address]
+
+        coords = fetch(address) or None
+        GEOCODE_LOOKUPS.inc(layer="api")
+        if stats:
+            stats.api += 1
+
+        store_geocode(address, coords, db)
+        if own_session:
+            db.commit()
+        else:
+            db.flush()
+        return coords
+    finally:
+        if own_session:
+            db.close()
+
+
+# ===================== EVICTION / COMPACTION ===================== #
+def compact_geocode_cache(db: Session, vacuum: bool = False) -> dict:
+    """Deletes expired positive and negative entries and clears the LRU."""
+    now = datetime.utcnow()
+    expired_found = db.query(GeocodeCacheEntry).filter(
+        GeocodeCacheEntry.found.is_(True),
+        GeocodeCacheEntry.fetched_at < now - timedelta(days=GEOCODE_CACHE_TTL_DAYS),
+    ).delete(synchronize_session=False)
+    expired_missing = db.query(GeocodeCacheEntry).filter(
+        GeocodeCacheEntry.found.is_(False),
+        GeocodeCacheEntry.fetched_at < now - timedelta(days=GEOCODE_NEGATIVE_TTL_DAYS),
+    ).delete(synchronize_session=False)
+    db.commit()
+    _memory.clear()
+
+    if vacuum and db.get_bind().dialect.name == "sqlite":
+        with db.get_bind().connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+
+    remaining = db.query(GeocodeCacheEntry).count()
+    return {"expired": expired_found, "expired_negative": expired_missing, "remaining": remaining}
+
+
+def clear_geocode_cache(db: Session) -> int:
+    deleted = db.query(GeocodeCacheEntry).delete(synchronize_session=False)
+    db.commit()
+    _memory.clear()
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the geocode_cache table.")
+    parser.add_argument("command", choices=["compact", "clear"])
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite file after compacting")
+    args = parser.parse_args()
+
+    GeocodeCacheEntry.__table__.create(bind=engine, checkfirst=True)
+    session = SessionLocal()
+    try:
+        if args.command == "compact":
+            print(compact_geocode_cache(session, vacuum=args.vacuum))
+        else:
+            print({"deleted": clear_geocode_cache(session)})
+    finally:
+        session.close()
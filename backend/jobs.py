@@ -0,0 +1,261 @@
+# jobs.py
+#
+# Background jobs without a broker: the jobs table is the queue. Every app
+# process runs JOB_WORKERS worker tasks on its event loop; a worker claims
+# the oldest queued job with a conditional UPDATE, so several uvicorn
+# processes can share one queue. Handlers are the same async functions the
+# in-request endpoints await, and their CPU-bound parts already run in the
+# threadpool. A partial unique index keeps one queued/running job per kind,
+# so a second submit of the same kind coalesces onto the first.
+
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from batch_geocoder import fill_pending_shipments
+from database import AsyncSessionLocal, SessionLocal
+from geocode_cache import GeocodeStats
+from llm import get_optimal_route_plan
+from models import Job, JobStatus
+from priority_stats import rescore
+from shipment_delay_checker import DELAY_WORKERS, assess_shipment_delays
+
+# ===================== SETTINGS ===================== #
+# Worker tasks per process; 0 makes a process submit-only
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Idle workers also poll, to pick up jobs submitted to another process
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "2"))
+# A running job without a heartbeat for this long lost its worker and is failed
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+ACTIVE = (JobStatus.queued, JobStatus.running)
+
+_jobs = Job.__table__
+
+
+# ===================== PROGRESS ===================== #
+class JobProgress:
+    """Latest progress of a running job; the heartbeat persists it."""
+
+    def __init__(self):
+        self.fraction = 0.0
+        self.message = None
+
+    def __call__(self, fraction: float, message: str = None):
+        self.fraction = max(0.0, min(1.0, float(fraction)))
+        if message is not None:
+            self.message = message
+
+
+# ===================== HANDLERS ===================== #
+JOB_HANDLERS = {}
+
+
+def job_handler(kind: str):
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+@job_handler("optimize_routes")
+async def _optimize_routes(db: AsyncSession, params: dict, progress: JobProgress):
+    plan = await get_optimal_route_plan(db, solver=params.get("solver", "llm"), progress=progress,
+                                        refresh=params.get("refresh", False), partition=params.get("partition"),
+                                        incremental=params.get("incremental", False),
+                                        neighbourhood=params.get("neighbourhood", 0))
+    if plan is None:
+        raise RuntimeError("Failed to find a valid route plan after multiple attempts.")
+    if isinstance(plan, dict) and "error" in plan:
+        raise RuntimeError(plan["error"])
+    return {"optimized_routes": plan}
+
+
+@job_handler("delay")
+async def _delay(db: AsyncSession, params: dict, progress: JobProgress):
+    results = await assess_shipment_delays(db, workers=params.get("workers", DELAY_WORKERS), progress=progress,
+                                           refresh=params.get("refresh", False))
+    return {"shipment_delays": results}
+
+
+@job_handler("fill")
+async def _fill(db: AsyncSession, params: dict, progress: JobProgress):
+    stats = GeocodeStats()
+    result = await fill_pending_shipments(db, stats=stats, progress=progress)
+    return {**result, "geocode_lookups": stats.as_dict()}
+
+
+@job_handler("score")
+async def _score(db: AsyncSession, params: dict, progress: JobProgress):
+    def run():
+        with SessionLocal() as session:
+            return rescore(session, force_full=params.get("full", False))
+    # Set-based UPDATE plus numpy work: keep it off the event loop
+    return await run_in_threadpool(run)
+
+
+# ===================== SUBMIT / READ ===================== #
+async def _active_job(db: AsyncSession, kind: str):
+    return (await db.scalars(select(Job).where(Job.kind == kind, Job.status.in_(ACTIVE)))).first()
+
+
+async def submit_job(db: AsyncSession, kind: str, params: dict = None) -> tuple:
+    """
+    Queues a job unless one of the same kind is already queued or running.
+    Returns (job, deduplicated); a deduplicated submit returns the existing
+    job and its params win.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    existing = await _active_job(db, kind)
+    if existing is not None:
+        return existing, True
+
+    job = Job(kind=kind, params=params or {}, status=JobStatus.queued, progress=0.0, created_at=datetime.utcnow())
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request (or process) queued the same kind first
+        await db.rollback()
+        existing = await _active_job(db, kind)
+        if existing is None:
+            raise
+        return existing, True
+    if _wakeup is not None:
+        _wakeup.set()
+    return job, False
+
+
+async def get_job(db: AsyncSession, job_id: str):
+    return await db.get(Job, job_id, populate_existing=True)
+
+
+async def list_jobs(db: AsyncSession, kind: str = None, status: JobStatus = None, limit: int = 50) -> list:
+    statement = select(Job).order_by(Job.created_at.desc()).limit(limit)
+    if kind is not None:
+        statement = statement.where(Job.kind == kind)
+    if status is not None:
+        statement = statement.where(Job.status == status)
+    return (await db.scalars(statement)).all()
+
+
+# ===================== WORKERS ===================== #
+async def _update(job_id: str, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(_jobs).where(_jobs.c.job_id == job_id).values(**values))
+        await db.commit()
+
+
+async def _fail_stale(db: AsyncSession):
+    """Fails running jobs whose worker stopped heartbeating (crash, restart, deploy)."""
+    now = datetime.utcnow()
+    stale = await db.execute(
+        update(_jobs)
+        .where(_jobs.c.status == JobStatus.running, _jobs.c.heartbeat_at < now - timedelta(seconds=JOB_STALE_SECONDS))
+        .values(status=JobStatus.failed, error="Worker stopped responding", finished_at=now)
+    )
+    await db.commit()
+    if stale.rowcount:
+        print(f"⚠️ Failed {stale.rowcount} stale jobs")
+
+
+async def _claim(db: AsyncSession):
+    """Marks the oldest queued job as running for this worker; None if the queue is empty."""
+    candidates = select(_jobs.c.job_id).where(_jobs.c.status == JobStatus.queued).order_by(_jobs.c.created_at).limit(5)
+    for job_id in (await db.scalars(candidates)).all():
+        now = datetime.utcnow()
+        claimed = await db.execute(
+            update(_jobs)
+            .where(_jobs.c.job_id == job_id, _jobs.c.status == JobStatus.queued)
+            .values(status=JobStatus.running, worker=WORKER_ID, started_at=now, heartbeat_at=now)
+        )
+        await db.commit()
+        if claimed.rowcount == 1:
+            return await db.get(Job, job_id, populate_existing=True)
+    return None
+
+
+async def _heartbeat(job_id: str, progress: JobProgress):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        await _update(job_id, heartbeat_at=datetime.utcnow(), progress=progress.fraction, message=progress.message)
+
+
+async def _run(job: Job):
+    print(f"🛠️ Job {job.job_id} ({job.kind}) started")
+    progress = JobProgress()
+    beat = asyncio.create_task(_heartbeat(job.job_id, progress))
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await JOB_HANDLERS[job.kind](db, job.params or {}, progress)
+        status, error = JobStatus.succeeded, None
+        progress(1.0)
+    except Exception as e:
+        print(f"❌ Job {job.job_id} ({job.kind}) failed: {e}")
+        result, status, error = None, JobStatus.failed, f"{type(e).__name__}: {e}"
+    finally:
+        beat.cancel()
+    await _update(
+        job.job_id, status=status, result=jsonable_encoder(result), error=error,
+        progress=progress.fraction, message=progress.message, finished_at=datetime.utcnow(),
+    )
+    print(f"✅ Job {job.job_id} ({job.kind}) {status.value}")
+
+
+async def _worker(index: int):
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await _fail_stale(db)
+                job = await _claim(db)
+            if job is not None:
+                await _run(job)
+                continue
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Job worker {index} error: {e}")
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+_wakeup = None
+_tasks = []
+
+
+async def start_workers(count: int = JOB_WORKERS):
+    """Call from the app's startup; the workers live on its event loop."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    _tasks.extend(asyncio.create_task(_worker(i)) for i in range(count))
+    if count:
+        print(f"🛠️ Started {count} job workers ({WORKER_ID})")
+
+
+async def stop_workers():
+    """Cancels the workers and fails the jobs they were running."""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(_jobs)
+            .where(_jobs.c.status == JobStatus.running, _jobs.c.worker == WORKER_ID)
+            .values(status=JobStatus.failed, error="Worker shut down", finished_at=datetime.utcnow())
+        )
+        await db.commit()
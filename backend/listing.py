@@ -0,0 +1,157 @@
+# listing.py
+
+import base64
+import enum
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select, tuple_
+
+from assignments import _chunks
+from database import SessionLocal
+import models
+import schemas
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_ROWS = 1000
+
+
+# ===================== CURSORS ===================== #
+def encode_cursor(*values) -> str:
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """
+    The `size` values of a cursor we issued, all strings. Raises ValueError
+    for anything else, so a crafted cursor is a 400 and never a 500.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+# ===================== FILTERED QUERIES ===================== #
+def shipment_filters(status=None, vehicle_id=None, delivery_from: date = None, delivery_to: date = None):
+    table = models.Shipment.__table__
+    conditions = []
+    if status is not None:
+        conditions.append(table.c.shipment_status == status)
+    if vehicle_id is not None:
+        conditions.append(table.c.vehicle_id == vehicle_id)
+    if delivery_from is not None:
+        conditions.append(table.c.delivery_date >= delivery_from)
+    if delivery_to is not None:
+        conditions.append(table.c.delivery_date <= delivery_to)
+    return conditions
+
+
+def truck_filters(status=None):
+    table = models.Truck.__table__
+    return [table.c.status == status] if status is not None else []
+
+
+def shipment_page(db, limit: int, cursor: str = None, **filters):
+    """
+    One page of shipments ordered by (created_at, shipment_id), resuming
+    strictly after `cursor`. Returns (shipments, next_cursor).
+    """
+    query = db.query(models.Shipment).filter(*shipment_filters(**filters))
+    if cursor:
+        created_at, shipment_id = decode_cursor(cursor, 2)
+        query = query.filter(
+            tuple_(models.Shipment.created_at, models.Shipment.shipment_id)
+            > tuple_(datetime.fromisoformat(created_at), shipment_id)
+        )
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(models.Shipment.created_at, models.Shipment.shipment_id).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].shipment_id)
+
+
+def truck_page(db, limit: int, cursor: str = None, **filters):
+    """One page of trucks ordered by truck_id. Returns (trucks, next_cursor)."""
+    query = db.query(models.Truck).filter(*truck_filters(**filters))
+    if cursor:
+        (truck_id,) = decode_cursor(cursor, 1)
+        query = query.filter(models.Truck.truck_id > truck_id)
+    rows = query.order_by(models.Truck.truck_id).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].truck_id)
+
+
+# ===================== NDJSON STREAMING ===================== #
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _public_columns(table, schema):
+    """The columns of `table` that `schema` (the paged response item) exposes, in schema order."""
+    return [table.c[name] for name in schema.__fields__ if name in table.c]
+
+
+def _stream_rows(statement, extend=None):
+    """
+    Yields one JSON line per row from a server-side cursor, STREAM_CHUNK_ROWS
+    at a time, so memory stays flat regardless of table size. Uses its own
+    session because the response outlives the request's dependency scope.
+    `extend(db, records)` may add fields to each chunk's records in place.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=STREAM_CHUNK_ROWS))
+        for partition in result.partitions():
+            records = [dict(row._mapping) for row in partition]
+            if extend:
+                extend(db, records)
+            yield "".join(json.dumps(record, default=_json_default) + "\n" for record in records)
+    finally:
+        db.close()
+
+
+def _add_shipment_ids(db, records):
+    """Truck records get shipment_ids as on /Trucks/page, a JSON string."""
+    assignments = models.TruckAssignment.__table__
+    on_truck = {record["truck_id"]: [] for record in records}
+    for chunk in _chunks(on_truck):
+        rows = db.execute(
+            select(assignments.c.truck_id, assignments.c.shipment_id).where(assignments.c.truck_id.in_(chunk))
+        )
+        for truck_id, shipment_id in rows:
+            on_truck[truck_id].append(shipment_id)
+    for record in records:
+        record["shipment_ids"] = json.dumps(on_truck[record["truck_id"]])
+
+
+def stream_shipments(**filters):
+    table = models.Shipment.__table__
+    statement = (
+        select(*_public_columns(table, schemas.Shipment))
+        .where(*shipment_filters(**filters))
+        .order_by(table.c.created_at, table.c.shipment_id)
+    )
+    return _stream_rows(statement)
+
+
+def stream_trucks(**filters):
+    table = models.Truck.__table__
+    statement = (
+        select(*_public_columns(table, schemas.Truckshow))
+        .where(*truck_filters(**filters))
+        .order_by(table.c.truck_id)
+    )
+    return _stream_rows(statement, extend=_add_shipment_ids)
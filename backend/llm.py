@@ -1,62 +1,101 @@
+import asyncio
 import json
-import requests
 import os
 import re
+import time
+from functools import lru_cache
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from models import Truck, Shipment
-import google.generativeai as genai
-import random
+from route_solver import repair_plan, solve_route_plan
+from route_insertion import insert_new_shipments
+from route_partitions import (
+    ROUTE_PARTITION, ROUTE_PARTITION_LLM_CONCURRENCY, partition_problem, solve_partitions_local,
+)
+from capacity_validator import CapacityValidator, format_failure_message
+from assignments import assign_shipments
+from distance_matrix import centroids, distance_matrix, pairwise_km
+from metrics import LLM_PROMPT_TOKENS, LLM_SECONDS, stage
+from llm_cache import cached_generate
+from prompt_encoding import (
+    LLM_PROMPT_ENCODING, compact_payload, estimate_tokens, json_payload, serialize, split_for_budget,
+)
+import numpy as np
 
-# ===================== CONFIGURE GEMINI ===================== #
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+GEMINI_MODEL = "gemini-1.5-flash"
 
-# Define Agent Models
+# Origin cities listed per truck in the prompt, nearest first
+LLM_NEAREST_ORIGINS = int(os.getenv("LLM_NEAREST_ORIGINS", "5"))
+
+# ===================== AGENT MODELS ===================== #
 # Agent 1: The Route Planner Agent
-route_planner_model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    system_instruction=(
-        "You are a logistics agent with a single, unyielding mission: create optimal route plans that **NEVER** exceed truck capacity. "
-        "Think of a truck's capacity as an unmovable wall—you cannot go over it, under it, or around it. "
-        "Your plan is invalid and worthless if any truck's total weight or volume utilization is over 100%. "
-        "The plan must adhere to the following rules: "
-        "1. Each shipment must be assigned to at most one truck. "
-        "2. Prioritize combining shipments with the same origin. "
-        "3. Group shipments with geographically near destinations for efficient multi-stop routes. "
-        "4. **CRITICALLY IMPORTANT:** The sum of the 'weight' for all assigned shipments MUST be less than or equal to the truck's 'capacity_kg'. "
-        "5. **CRITICALLY IMPORTANT:** The sum of the 'volume' for all assigned shipments MUST be less than or equal to the truck's 'capacity_volume'. "
-        "6. Do not assign shipments to a truck if it will cause any of its capacity limits to be exceeded. "
-        "7. Only return a plain JSON array of route plans. Do not include any explanation, notes, or markdown. "
-        "The format must be: [{\"truck_number\": \"RJ14AB1234\", \"shipment_ids\": [\"shipment1\", \"shipment2\"]}]"
-    )
+ROUTE_PLANNER_INSTRUCTION = (
+    "You are a logistics agent with a single, unyielding mission: create optimal route plans that **NEVER** exceed truck capacity. "
+    "Think of a truck's capacity as an unmovable wall—you cannot go over it, under it, or around it. "
+    "Your plan is invalid and worthless if any truck's total weight or volume utilization is over 100%. "
+    "The plan must adhere to the following rules: "
+    "1. Each shipment must be assigned to at most one truck. "
+    "2. Prioritize combining shipments with the same origin. "
+    "3. Group shipments with geographically near destinations for efficient multi-stop routes. "
+    "4. **CRITICALLY IMPORTANT:** The sum of the 'weight' for all assigned shipments MUST be less than or equal to the truck's 'capacity_kg'. "
+    "5. **CRITICALLY IMPORTANT:** The sum of the 'volume' for all assigned shipments MUST be less than or equal to the truck's 'capacity_volume'. "
+    "6. Do not assign shipments to a truck if it will cause any of its capacity limits to be exceeded. "
+    "7. When known, prefer trucks whose 'km_to_origin_cities' is smallest for a shipment's origin, and use each shipment's 'distance_km' to keep similar trip lengths together. "
+    "8. Only return a plain JSON array of route plans. Do not include any explanation, notes, or markdown. "
+    "The format must be: [{\"truck_number\": \"RJ14AB1234\", \"shipment_ids\": [\"shipment1\", \"shipment2\"]}]"
 )
 
-# Agent 2: The Capacity Validator Agent
-capacity_validator_model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    system_instruction=(
-        "You are a logistics agent specializing in validating truck capacity. "
-        "Your task is to check a proposed route plan against truck capacity limits. "
-        "You will be given the full truck and shipment data, and a proposed route plan. "
-        "Check each truck's total assigned weight and volume. "
-        "If a truck's capacity is exceeded, return a plain JSON object with the truck number and the type of capacity exceeded and the shipment number (weight or volume). "
-        "If all trucks in the plan are within their capacity limits, return a plain JSON object with a single key 'status' and value 'validated'."
-        "Example of success: {\"status\": \"validated\"}"
-        "Example of failure: {\"status\": \"capacity_exceeded\", \"truck_number\": \"RJ14AB1234\", \"exceeded_type\": \"weight\"}"
-    )
+# Agent 1, compact prompts (see prompt_encoding): same rules, aliased ids and tables
+ROUTE_PLANNER_COMPACT_INSTRUCTION = (
+    "You are a logistics agent with a single, unyielding mission: create optimal route plans that **NEVER** exceed truck capacity. "
+    "Your plan is invalid and worthless if any truck's total weight or volume utilization is over 100%. "
+    "The input is compact JSON: 'cities' is a list of city names referenced by index. "
+    "'trucks' and 'lanes' are tables: 'cols' names the columns once and every entry of 'rows' is one record in that column order. "
+    "A truck row is its number 't', 'max_kg', 'max_m3' (null means unlimited) and [city, km] pairs to its nearest origin cities. "
+    "A lane row is every shipment from one origin city to one destination city: 'from', 'to', the trip 'km', the lane totals "
+    "and its shipments as [s, kg, m3] rows, where 's' is the shipment number. "
+    "The plan must adhere to the following rules: "
+    "1. Each shipment must be assigned to at most one truck. "
+    "2. Prioritize combining shipments with the same origin. "
+    "3. Group shipments with geographically near destinations for efficient multi-stop routes. "
+    "4. **CRITICALLY IMPORTANT:** The sum of 'kg' for all shipments assigned to a truck MUST be less than or equal to its 'max_kg'. "
+    "5. **CRITICALLY IMPORTANT:** The sum of 'm3' for all shipments assigned to a truck MUST be less than or equal to its 'max_m3'. "
+    "6. Do not assign shipments to a truck if it will cause any of its capacity limits to be exceeded. "
+    "7. When known, prefer trucks with the smallest km to a shipment's origin, and keep similar trip lengths together. "
+    "8. Only return a plain JSON array of route plans using the truck and shipment numbers. Do not include any explanation, notes, or markdown. "
+    "The format must be: [{\"t\": 1, \"s\": [4, 5]}]"
 )
 
+# Capacity validation runs locally, see capacity_validator.CapacityValidator
+
 # Agent 3: The Plan Finalizer Agent
-plan_finalizer_model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    system_instruction=(
-        "You are a logistics agent specializing in finalizing and confirming route plans. "
-        "Your task is to receive a validated route plan and prepare it for a database commit. "
-        "You will confirm that the plan is complete and correctly formatted. "
-        "Once confirmed, you will return a plain JSON array identical to the input, signaling that it is ready for database update. "
-        "Do not modify the input. Do not add any notes or markdown."
-    )
+PLAN_FINALIZER_INSTRUCTION = (
+    "You are a logistics agent specializing in finalizing and confirming route plans. "
+    "Your task is to receive a validated route plan and prepare it for a database commit. "
+    "You will confirm that the plan is complete and correctly formatted. "
+    "Once confirmed, you will return a plain JSON array identical to the input, signaling that it is ready for database update. "
+    "Do not modify the input. Do not add any notes or markdown."
 )
 
+AGENT_INSTRUCTIONS = {
+    "planner": ROUTE_PLANNER_INSTRUCTION,
+    "planner_compact": ROUTE_PLANNER_COMPACT_INSTRUCTION,
+    "finalizer": PLAN_FINALIZER_INSTRUCTION,
+}
+
+@lru_cache(maxsize=None)
+def get_agent(name: str):
+    """
+    Gemini model for an agent, built on first use and reused afterwards.
+    google.generativeai takes most of a second to import, so requests that
+    never reach an agent do not pay for it.
+    """
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(model_name=GEMINI_MODEL, system_instruction=AGENT_INSTRUCTIONS[name])
+
 # ===================== FETCH DB DATA ===================== #
 def fetch_truck_shipment_data(db: Session):
     trucks = db.query(Truck).all()
@@ -64,7 +103,28 @@ def fetch_truck_shipment_data(db: Session):
     return trucks, shipments
 
 # ===================== FORMAT LLM PROMPT ===================== #
+def _km(value):
+    return None if np.isnan(value) else round(float(value))
+
 def format_input_for_llm(trucks, shipments):
+    # Road-agnostic great-circle distances from the shared distance matrix cache
+    trip_km = pairwise_km(
+        [(s.origin_lat, s.origin_lng) for s in shipments],
+        [(s.destination_lat, s.destination_lng) for s in shipments],
+    )
+    by_origin = {}
+    for s in shipments:
+        by_origin.setdefault(s.origin_address.get("city"), []).append((s.origin_lat, s.origin_lng))
+    origin_cities, origin_points = centroids(by_origin)
+    deadhead = distance_matrix(
+        [(t.current_location_lat, t.current_location_lng) for t in trucks], origin_points
+    )
+
+    def nearest_origins(row):
+        # Only the closest few, so the prompt stays small on large fleets
+        known = [j for j in np.argsort(row, kind="stable") if not np.isnan(row[j])][:LLM_NEAREST_ORIGINS]
+        return {origin_cities[j]: _km(row[j]) for j in known}
+
     data = {
         "trucks": [
             {
@@ -72,7 +132,8 @@ def format_input_for_llm(trucks, shipments):
                 "truck_number": truck.registration_number,
                 "capacity_weight": truck.capacity_kg,
                 "capacity_volume": truck.available_volume_cubic_m,
-            } for truck in trucks
+                "km_to_origin_cities": nearest_origins(deadhead[i]),
+            } for i, truck in enumerate(trucks)
         ],
         "shipments": [
             {
@@ -81,129 +142,297 @@ def format_input_for_llm(trucks, shipments):
                 "destination_address_city": shipment.destination_address.get("city"),
                 "weight": shipment.weight,
                 "volume": shipment.volume,
-            } for shipment in shipments
+                "distance_km": _km(trip_km[i]),
+            } for i, shipment in enumerate(shipments)
         ]
     }
     return data
 
 # ===================== AGENT INTERACTION FUNCTIONS ===================== #
-def call_agent_api(agent_model, prompt_data) -> str:
-    try:
-        response = agent_model.generate_content(json.dumps(prompt_data))
+async def call_agent_api(agent: str, prompt_data, refresh: bool = False, encoding: str = "json",
+                         accept=None) -> str:
+    """
+    Sends prompt_data to an agent through the response cache, see llm_cache.
+    Only responses `accept` approves are cached, when given.
+    """
+    async def generate():
+        response = await get_agent(agent).generate_content_async(serialize(prompt_data, encoding))
         return response.text
+
+    try:
+        return await cached_generate(GEMINI_MODEL, AGENT_INSTRUCTIONS[agent], prompt_data, generate,
+                                     refresh=refresh, agent=agent, accept=accept)
     except Exception as e:
         raise RuntimeError(f"Agent API call failed: {e}")
 
-def get_optimal_route_plan(db: Session):
+# ===================== DB WRITE-BACK ===================== #
+def apply_route_plan(db: Session, route_plan, shipment_data_map, truck_data_map):
+    assignment_plan = {}
+    for plan in route_plan:
+        truck_number = plan.get("truck_number")
+        shipment_ids = plan.get("shipment_ids", [])
+
+        if truck_number not in truck_data_map:
+            print(f"Skipping update for unknown truck: {truck_number}")
+            continue
+
+        planned = assignment_plan.setdefault(str(truck_data_map[truck_number].truck_id), [])
+        for sid in shipment_ids:
+            if sid in shipment_data_map:
+                planned.append(sid)
+            else:
+                print(f"Shipment ID {sid} not found in DB data.")
+
+    # Writes truck_assignments, Shipment.vehicle_id and truck_loads in one go.
+    # Shipments the plan leaves out are released, not left on their old truck.
+    assign_shipments(db, assignment_plan, release=shipment_data_map)
+    db.commit()
+    print("Shipment records updated and committed to DB. 🥳")
+
+# ===================== PLANNER LOOP ===================== #
+def _extract_plan(raw_response: str) -> list:
+    cleaned_response = raw_response.strip()
+    json_match = re.search(r"(\[.*\])", cleaned_response, re.DOTALL)
+
+    if not json_match:
+        raise ValueError("No valid JSON array found in Route Planner's response.")
+
+    plan = json.loads(json_match.group(1))
+    if not isinstance(plan, list):
+        raise TypeError("Expected a JSON array from Route Planner.")
+    return plan
+
+async def _plan_part(formatted_data, trucks, shipments, part, encoding, report, progress=None,
+                     span=(0.1, 0.8), label="", refresh: bool = False):
+    """
+    Planner -> local capacity check -> finalizer for one part of the problem,
+    retrying with feedback. Returns the finalized plan in truck numbers and
+    shipment UUIDs, or None when no attempt validated.
+    """
+    truck_idx, shipment_idx = part
+    validator = CapacityValidator([trucks[i] for i in truck_idx], [shipments[j] for j in shipment_idx])
+    if encoding == "compact":
+        payload, aliases = compact_payload(formatted_data, truck_idx, shipment_idx)
+        planner = "planner_compact"
+    else:
+        payload, aliases = json_payload(formatted_data, truck_idx, shipment_idx), None
+        planner = "planner"
+
+    def decode(raw_plan_response):
+        planned = _extract_plan(raw_plan_response)
+        return planned, aliases.decode_plan(planned) if aliases else planned
+
+    def fits(raw_plan_response) -> bool:
+        # Rejected plans are not cached, so a retry asks the planner (or finalizer) again
+        try:
+            return validator.validate(decode(raw_plan_response)[1]).get("status") == "validated"
+        except (json.JSONDecodeError, TypeError, ValueError):
+            return False
+
+    max_attempts = 10 # Increased attempts for more chances to learn
+    previous_failure_message = "" # Initialize empty failure message
+
+    for attempt in range(max_attempts):
+        print(f"{label}Attempt {attempt + 1}: Generating new route plan...")
+        if progress:
+            progress(span[0] + span[1] * attempt / max_attempts, f"{label}Attempt {attempt + 1} of {max_attempts}")
+
+        # Step 2: Call Route Planner Agent
+        # The prompt now includes previous failure feedback
+        llm_prompt = {**payload, "previous_failure": previous_failure_message}
+        tokens = estimate_tokens(llm_prompt, encoding)
+        LLM_PROMPT_TOKENS.observe(tokens, encoding=encoding)
+        started = time.perf_counter()
+        with LLM_SECONDS.time(agent="planner"):
+            raw_plan_response = await call_agent_api(planner, llm_prompt, refresh=refresh, encoding=encoding,
+                                                      accept=fits)
+        report["planner_seconds"] += time.perf_counter() - started
+        report["planner_calls"] += 1
+        report["prompt_tokens"] += tokens
+        if attempt == 0:
+            report["first_prompt_tokens"] += tokens
+
+        try:
+            with stage("route_plan", "json_extract"):
+                planned, route_plan = decode(raw_plan_response)
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            print(f"Error parsing Route Planner response: {e}")
+            previous_failure_message = f"Failed to generate a valid JSON. Response was: {raw_plan_response}"
+            continue
+
+        # Step 3: Capacity Validator - Check the plan locally
+        with stage("route_plan", "validate"):
+            validation_result = validator.validate(route_plan)
+
+        if validation_result.get("status") == "validated":
+            print("Capacity Validator confirmed the plan is valid! ✅")
+
+            # Step 4: Plan Finalizer Agent - Confirm and prepare for DB update
+            # It echoes the plan as the planner wrote it, aliases included
+            print("Submitting validated plan to Plan Finalizer...")
+            if progress:
+                progress(span[0] + span[1] * 0.95, f"{label}Finalizing validated plan")
+            with LLM_SECONDS.time(agent="finalizer"):
+                finalizer_response_raw = await call_agent_api("finalizer", planned, refresh=refresh, encoding=encoding,
+                                                              accept=fits)
+
+            try:
+                with stage("route_plan", "json_extract"):
+                    _, final_route_plan = decode(finalizer_response_raw)
+            except (json.JSONDecodeError, TypeError, ValueError) as e:
+                print(f"Error parsing Finalizer response: {e}")
+                raise ValueError("Final plan could not be processed.")
+            with stage("route_plan", "validate"):
+                if validator.validate(final_route_plan).get("status") != "validated":
+                    # The finalizer only echoes the plan; keep the one that passed
+                    print("Plan Finalizer changed the plan past capacity; using the validated plan.")
+                    return route_plan
+            return final_route_plan
+
+        feedback = aliases.encode_feedback(validation_result) if aliases else validation_result
+        failure_reason = format_failure_message(feedback)
+        print(failure_reason)
+        # Store the specific reasons for the next attempt
+        previous_failure_message = failure_reason + " Please fix these specific issues in the next plan."
+    return None
+
+async def _plan_parts_concurrently(formatted_data, trucks, shipments, parts, encoding, report, progress=None,
+                                   refresh: bool = False) -> list:
+    """
+    Plans every part at once, at most ROUTE_PARTITION_LLM_CONCURRENCY
+    prompts in flight. A part that fails comes back as None; repair_plan picks up its
+    shipments.
+    """
+    semaphore = asyncio.Semaphore(max(1, ROUTE_PARTITION_LLM_CONCURRENCY))
+    done = 0
+
+    async def run(k, part):
+        nonlocal done
+        async with semaphore:
+            try:
+                plan = await _plan_part(formatted_data, trucks, shipments, part, encoding, report,
+                                        label=f"Part {k + 1}/{len(parts)}: ", refresh=refresh)
+            except (RuntimeError, ValueError) as e:
+                print(f"Part {k + 1}/{len(parts)} failed: {e}")
+                plan = None
+        done += 1
+        if progress:
+            progress(0.1 + 0.8 * done / len(parts), f"Planned {done} of {len(parts)} partitions")
+        return plan
+
+    return await asyncio.gather(*(run(k, part) for k, part in enumerate(parts)))
+
+async def _repair(trucks, shipments, route_plan) -> list:
+    """Cross-partition pass for shipments the partitions left out, see route_solver.repair_plan."""
+    with stage("route_plan", "repair"):
+        plan, placed, unassigned = await run_in_threadpool(repair_plan, trucks, shipments, route_plan)
+    print(f"🔧 Repair placed {placed} leftover shipments; {unassigned} remain unassigned")
+    return plan
+
+def format_prompt_report(report: dict) -> str:
+    """One line comparing the tokens sent with the verbose single-prompt equivalent."""
+    saved = 1 - report["first_prompt_tokens"] / report["json_tokens"] if report["json_tokens"] else 0.0
+    per_call = report["planner_seconds"] / report["planner_calls"] if report["planner_calls"] else 0.0
+    return (
+        f"{report['encoding']} prompt: ~{report['first_prompt_tokens']:,} tokens vs ~{report['json_tokens']:,} as JSON "
+        f"({saved:.0%} smaller) in {report['parts']} part(s); {report['planner_calls']} planner call(s), "
+        f"~{report['prompt_tokens']:,} tokens sent, {report['planner_seconds']:.2f} s ({per_call:.2f} s/call)"
+    )
+
+async def get_optimal_route_plan(db: AsyncSession, solver: str = "llm", progress=None, refresh: bool = False,
+                                 encoding: str = None, partition: str = None, incremental: bool = False,
+                                 neighbourhood: int = 0):
+    """
+    `progress(fraction, message)` is called as the plan advances (see
+    jobs.JobProgress). refresh=True skips cached agent responses.
+    encoding is "compact" or "json", LLM_PROMPT_ENCODING by default.
+    partition is "off", "origin" or "cluster", ROUTE_PARTITION by default;
+    partitions are solved concurrently and then repaired, see route_partitions.
+    incremental=True keeps the committed plan and only inserts unassigned
+    shipments, re-planning at most `neighbourhood` trucks for those that do
+    not fit (see route_insertion); solver and partition do not apply.
+    """
+    encoding = encoding or LLM_PROMPT_ENCODING
+    partition = partition or ROUTE_PARTITION
     try:
+        if incremental:
+            if progress:
+                progress(0.05, "Inserting unassigned shipments into the current plan")
+            with stage("route_plan", "insert"):
+                return await db.run_sync(insert_new_shipments, neighbourhood)
+
         # Step 1: Fetch data from DB
-        trucks, shipments = fetch_truck_shipment_data(db)
-        formatted_data = format_input_for_llm(trucks, shipments)
+        with stage("route_plan", "db_fetch"):
+            trucks, shipments = await db.run_sync(fetch_truck_shipment_data)
+        # Give the connection back to the pool while planning; the objects stay loaded
+        await db.commit()
+        if progress:
+            progress(0.05, f"Loaded {len(trucks)} trucks and {len(shipments)} shipments")
 
         shipment_data_map = {str(s.shipment_id): s for s in shipments}
         truck_data_map = {t.registration_number: t for t in trucks}
 
-        max_attempts = 10 # Increased attempts for more chances to learn
-        previous_failure_message = "" # Initialize empty failure message
-
-        for attempt in range(max_attempts):
-            print(f"Attempt {attempt + 1}: Generating new route plan...")
-            
-            # Step 2: Call Route Planner Agent
-            # The prompt now includes previous failure feedback
-            llm_prompt = {
-                "trucks": formatted_data["trucks"],
-                "shipments": formatted_data["shipments"],
-                "previous_failure": previous_failure_message
-            }
-            raw_plan_response = call_agent_api(route_planner_model, llm_prompt)
+        if partition != "off":
+            with stage("route_plan", "partition"):
+                regions, reserve = await run_in_threadpool(partition_problem, trucks, shipments, partition)
+            print(f"🗺️ {len(regions)} {partition} partitions; {len(reserve)} trucks held in reserve")
 
-            try:
-                cleaned_plan_response = raw_plan_response.strip()
-                json_match = re.search(r"(\[.*\])", cleaned_plan_response, re.DOTALL)
-                
-                if not json_match:
-                    raise ValueError("No valid JSON array found in Route Planner's response.")
-                
-                json_string_to_load = json_match.group(1)
-                route_plan = json.loads(json_string_to_load)
-                
-                if not isinstance(route_plan, list):
-                    raise TypeError("Expected a JSON array from Route Planner.")
-            except (json.JSONDecodeError, TypeError, ValueError) as e:
-                print(f"Error parsing Route Planner response: {e}")
-                previous_failure_message = f"Failed to generate a valid JSON. Response was: {raw_plan_response}"
-                continue
-
-            # Step 3: Capacity Validator Agent - Check the plan
-            print("Submitting plan to Capacity Validator...")
-            validation_data = {
-                "trucks": formatted_data["trucks"],
-                "shipments": formatted_data["shipments"],
-                "proposed_plan": route_plan
-            }
-            
-            validation_response_raw = call_agent_api(capacity_validator_model, validation_data)
-            
-            try:
-                cleaned_validator_response = validation_response_raw.strip()
-                json_match_validator = re.search(r"(\{.*\})", cleaned_validator_response, re.DOTALL)
-                
-                if not json_match_validator:
-                    raise ValueError("No valid JSON object found in Validator's response.")
-                
-                json_string_to_load_validator = json_match_validator.group(1)
-                validation_result = json.loads(json_string_to_load_validator)
-                
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"Error parsing Validator response: {e}. Raw response: '{validation_response_raw}'")
-                previous_failure_message = f"Validator failed to provide a valid JSON. Raw response: {validation_response_raw}"
-                continue
-
-            if validation_result.get("status") == "validated":
-                print("Capacity Validator confirmed the plan is valid! ✅")
-                
-                # Step 4: Plan Finalizer Agent - Confirm and prepare for DB update
-                print("Submitting validated plan to Plan Finalizer...")
-                finalizer_response_raw = call_agent_api(plan_finalizer_model, route_plan)
-                
-                try:
-                    final_route_plan = json.loads(finalizer_response_raw.strip())
-                    if not isinstance(final_route_plan, list):
-                        raise TypeError("Expected a JSON array from Plan Finalizer.")
-                except (json.JSONDecodeError, TypeError) as e:
-                    print(f"Error parsing Finalizer response: {e}")
-                    raise ValueError("Final plan could not be processed.")
-
-                for plan in final_route_plan:
-                    truck_number = plan.get("truck_number")
-                    shipment_ids = plan.get("shipment_ids", [])
-                    
-                    if truck_number not in truck_data_map:
-                        print(f"Skipping update for unknown truck: {truck_number}")
-                        continue
-
-                    for sid in shipment_ids:
-                        if sid in shipment_data_map:
-                            shipment = shipment_data_map[sid]
-                            shipment.vehicle_id = truck_data_map[truck_number].registration_number
-                            print(f"Updated shipment {sid} with vehicle ID {shipment.vehicle_id}")
-                        else:
-                            print(f"Shipment ID {sid} not found in DB data.")
-                
-                db.commit()
-                print("Shipment records updated and committed to DB. 🥳")
-                return final_route_plan
+        if solver == "local":
+            print("Solving route plan locally...")
+            # CPU-bound: keep it off the event loop
+            with stage("route_plan", "local_solve"):
+                if partition == "off":
+                    route_plan = await run_in_threadpool(solve_route_plan, trucks, shipments)
+                else:
+                    route_plan = await run_in_threadpool(solve_partitions_local, trucks, shipments, regions)
+            if partition != "off":
+                route_plan = await _repair(trucks, shipments, route_plan)
+            if progress:
+                progress(0.9, "Saving route plan")
+            with stage("route_plan", "commit"):
+                await db.run_sync(apply_route_plan, route_plan, shipment_data_map, truck_data_map)
+            return route_plan
 
-            else:
-                failure_reason = f"Capacity validation failed. Reason: {validation_result.get('exceeded_type')} on truck {validation_result.get('truck_number')}. "
-                print(failure_reason)
-                # Store the specific reason for the next attempt
-                previous_failure_message = failure_reason + " Please fix this specific capacity issue in the next plan."
+        with stage("route_plan", "prompt_build"):
+            formatted_data = await run_in_threadpool(format_input_for_llm, trucks, shipments)
+            # Problems over the token budget are planned in parts; see prompt_encoding.
+            # Partitions without trucks are left to the repair pass.
+            staffed = [None] if partition == "off" else [region for region in regions if region[0]]
+            parts = await run_in_threadpool(
+                lambda: [part for region in staffed for part in split_for_budget(formatted_data, None, encoding, region)]
+            )
+            json_tokens = await run_in_threadpool(estimate_tokens, {**json_payload(formatted_data), "previous_failure": ""})
+
+        report = {"encoding": encoding, "parts": len(parts), "json_tokens": json_tokens, "first_prompt_tokens": 0,
+                  "prompt_tokens": 0, "planner_calls": 0, "planner_seconds": 0.0}
+        final_route_plan = []
+        if partition != "off":
+            plans = await _plan_parts_concurrently(formatted_data, trucks, shipments, parts, encoding, report,
+                                                   progress, refresh=refresh)
+            failed = sum(plan is None for plan in plans)
+            if failed:
+                print(f"{failed} of {len(parts)} partitions found no valid plan; repairing around them")
+            final_route_plan = await _repair(trucks, shipments, [e for plan in plans if plan for e in plan])
+        else:
+            for k, part in enumerate(parts):
+                label = f"Part {k + 1}/{len(parts)}: " if len(parts) > 1 else ""
+                part_plan = await _plan_part(
+                    formatted_data, trucks, shipments, part, encoding, report, progress,
+                    span=(0.1 + 0.8 * k / len(parts), 0.8 / len(parts)), label=label, refresh=refresh,
+                )
+                if part_plan is None:
+                    print(f"📉 {format_prompt_report(report)}")
+                    print("Failed to find a valid route plan after multiple attempts.")
+                    return None
+                final_route_plan.extend(part_plan)
 
-        print("Failed to find a valid route plan after multiple attempts.")
-        return None
+        print(f"📉 {format_prompt_report(report)}")
+        if progress:
+            progress(0.9, format_prompt_report(report))
+        with stage("route_plan", "commit"):
+            await db.run_sync(apply_route_plan, final_route_plan, shipment_data_map, truck_data_map)
+        return final_route_plan
 
     except Exception as e:
         print(f"An unexpected error occurred during route optimization: {e}")
-        return {"error": "An unexpected server error occurred during optimization."}
\ No newline at end of file
+        return {"error": "An unexpected server error occurred during optimization."}
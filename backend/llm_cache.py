@@ -0,0 +1,259 @@
+# llm_cache.py
+#
+# Content-addressed cache around model calls. A response is keyed on the
+# model name, a hash of the system instruction and a hash of the
+# canonicalized prompt, and stored in the llm_cache table. Entries expire
+# after LLM_CACHE_TTL_HOURS; past LLM_CACHE_MAX_ENTRIES or LLM_CACHE_MAX_BYTES
+# the least recently used ones are evicted. LLM_CACHE_MODE selects:
+#   on      read and write the table (default)
+#   off     always call the model, store nothing
+#   record  like "on", and append every response to the LLM_CASSETTE file
+#   replay  answer only from LLM_CASSETTE; a miss raises LLMCacheMiss and
+#           nothing is sent, so a recorded session replays with zero network
+# Callers can pass `accept` to keep responses they reject (e.g. a route plan
+# that fails the capacity check) out of the table; the cassette keeps them.
+# A replayed prompt must match the recorded one exactly; the route planner
+# prompt lists shipment and truck ids, so replay it against the same data.
+#   python llm_cache.py stats|compact|clear
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import AsyncSessionLocal, SessionLocal, engine
+from metrics import LLM_CACHE_LOOKUPS
+from models import LLMCacheEntry
+
+# ===================== SETTINGS ===================== #
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on").lower()
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "24"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "llm_cassette.jsonl")
+
+MODES = ("on", "off", "record", "replay")
+if LLM_CACHE_MODE not in MODES:
+    raise ValueError(f"LLM_CACHE_MODE must be one of {MODES}, got '{LLM_CACHE_MODE}'")
+
+
+class LLMCacheMiss(RuntimeError):
+    """Replay mode found no recorded response for a prompt."""
+
+
+# ===================== KEYS ===================== #
+def canonical_prompt(prompt) -> str:
+    """
+    JSON prompts are re-serialized with sorted keys and no whitespace; text
+    prompts lose trailing whitespace per line and leading/trailing blank lines.
+    """
+    if not isinstance(prompt, str):
+        return json.dumps(prompt, sort_keys=True, separators=(",", ":"), default=str)
+    return "\n".join(line.rstrip() for line in prompt.strip().splitlines())
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model_name: str, system_instruction: str, prompt) -> tuple:
+    """Returns (key, instruction_hash, prompt_hash)."""
+    instruction_hash = _sha256(system_instruction or "")
+    prompt_hash = _sha256(canonical_prompt(prompt))
+    return _sha256(f"{model_name}\n{instruction_hash}\n{prompt_hash}"), instruction_hash, prompt_hash
+
+
+# ===================== CASSETTE ===================== #
+class Cassette:
+    """Append-only JSONL of recorded responses, loaded on first read."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._responses is None:
+            self._responses = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._responses[entry["key"]] = entry["response"]
+        return self._responses
+
+    def get(self, key: str):
+        with self._lock:
+            return self._load().get(key)
+
+    def record(self, key: str, model_name: str, prompt, response: str):
+        with self._lock:
+            responses = self._load()
+            if responses.get(key) == response:
+                return
+            responses[key] = response
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "model": model_name, "prompt": canonical_prompt(prompt),
+                                    "response": response}) + "\n")
+
+
+cassette = Cassette(LLM_CASSETTE)
+
+
+# ===================== TABLE ===================== #
+def _fresh_after(now: datetime) -> datetime:
+    return now - timedelta(hours=LLM_CACHE_TTL_HOURS)
+
+
+def lookup(db: Session, key: str):
+    """Cached response text, or None if absent or expired. Marks the entry as used."""
+    now = datetime.utcnow()
+    entry = db.get(LLMCacheEntry, key)
+    if entry is None or entry.created_at < _fresh_after(now):
+        return None
+    entry.last_used_at = now
+    entry.hits += 1
+    db.commit()
+    return entry.response
+
+
+def store(db: Session, key: str, model_name: str, instruction_hash: str, prompt_hash: str, response: str):
+    now = datetime.utcnow()
+    try:
+        db.merge(LLMCacheEntry(
+            cache_key=key, model_name=model_name, instruction_hash=instruction_hash, prompt_hash=prompt_hash,
+            response=response, size_bytes=len(response.encode("utf-8")), created_at=now, last_used_at=now, hits=0,
+        ))
+        db.commit()
+    except IntegrityError:
+        # A concurrent call stored the same prompt first
+        db.rollback()
+        return
+    evict(db)
+
+
+def forget(db: Session, key: str):
+    db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key == key).delete(synchronize_session=False)
+    db.commit()
+
+
+def evict(db: Session, max_entries: int = None, max_bytes: int = None) -> int:
+    """Deletes least recently used entries until both limits hold. Returns rows deleted."""
+    max_entries = LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    max_bytes = LLM_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    count, total = db.query(func.count(LLMCacheEntry.cache_key), func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0)).one()
+    if count <= max_entries and total <= max_bytes:
+        return 0
+
+    doomed = []
+    oldest_first = db.query(LLMCacheEntry.cache_key, LLMCacheEntry.size_bytes).order_by(LLMCacheEntry.last_used_at)
+    for key, size in oldest_first.yield_per(500):
+        if count <= max_entries and total <= max_bytes:
+            break
+        doomed.append(key)
+        count -= 1
+        total -= size
+    for start in range(0, len(doomed), 500):
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key.in_(doomed[start:start + 500])).delete(
+            synchronize_session=False
+        )
+    db.commit()
+    return len(doomed)
+
+
+# ===================== CACHED CALL ===================== #
+async def cached_generate(model_name: str, system_instruction: str, prompt, generate,
+                          refresh: bool = False, agent: str = "agent", accept=None) -> str:
+    """
+    Returns the response text for `prompt`, calling `await generate()` only
+    on a miss. refresh=True skips the lookup but still stores the new answer.
+    With `accept(response) -> bool`, only accepted responses are stored and a
+    cached one that is no longer accepted is evicted and generated again.
+    Cache errors are logged and never fail the call.
+    """
+    key, instruction_hash, prompt_hash = cache_key(model_name, system_instruction, prompt)
+
+    if LLM_CACHE_MODE == "replay":
+        response = cassette.get(key)
+        if response is None:
+            LLM_CACHE_LOOKUPS.inc(agent=agent, result="miss")
+            raise LLMCacheMiss(f"No recorded {agent} response in {cassette.path} for prompt {prompt_hash[:12]}")
+        LLM_CACHE_LOOKUPS.inc(agent=agent, result="hit")
+        return response
+
+    response = None
+    if LLM_CACHE_MODE != "off" and not refresh:
+        try:
+            async with AsyncSessionLocal() as db:
+                response = await db.run_sync(lookup, key)
+                if response is not None and accept is not None and not accept(response):
+                    await db.run_sync(forget, key)
+                    response = None
+        except Exception as e:
+            print(f"⚠️ LLM cache lookup failed: {e}")
+    LLM_CACHE_LOOKUPS.inc(agent=agent, result="hit" if response is not None else
+                          "bypass" if refresh or LLM_CACHE_MODE == "off" else "miss")
+
+    if response is None:
+        response = await generate()
+        if LLM_CACHE_MODE != "off" and (accept is None or accept(response)):
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(store, key, model_name, instruction_hash, prompt_hash, response)
+            except Exception as e:
+                print(f"⚠️ LLM cache store failed: {e}")
+
+    if LLM_CACHE_MODE == "record":
+        cassette.record(key, model_name, prompt, response)
+    return response
+
+
+# ===================== MAINTENANCE ===================== #
+def cache_stats(db: Session) -> dict:
+    count, total, hits = db.query(
+        func.count(LLMCacheEntry.cache_key),
+        func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0),
+        func.coalesce(func.sum(LLMCacheEntry.hits), 0),
+    ).one()
+    expired = db.query(LLMCacheEntry).filter(LLMCacheEntry.created_at < _fresh_after(datetime.utcnow())).count()
+    return {"entries": count, "bytes": total, "hits": hits, "expired": expired, "mode": LLM_CACHE_MODE}
+
+
+def compact_llm_cache(db: Session) -> dict:
+    """Deletes expired entries, then evicts down to the size limits."""
+    expired = db.query(LLMCacheEntry).filter(
+        LLMCacheEntry.created_at < _fresh_after(datetime.utcnow())
+    ).delete(synchronize_session=False)
+    db.commit()
+    return {"expired": expired, "evicted": evict(db)}
+
+
+def clear_llm_cache(db: Session) -> int:
+    deleted = db.query(LLMCacheEntry).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the llm_cache table.")
+    parser.add_argument("command", choices=["stats", "compact", "clear"])
+    args = parser.parse_args()
+
+    LLMCacheEntry.__table__.create(bind=engine, checkfirst=True)
+    session = SessionLocal()
+    try:
+        if args.command == "stats":
+            print(cache_stats(session))
+        elif args.command == "compact":
+            print(compact_llm_cache(session))
+        else:
+            print({"deleted": clear_llm_cache(session)})
+    finally:
+        session.close()
@@ -1,12 +1,15 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import datetime
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, date
 from pydantic import BaseModel, Field, EmailStr, HttpUrl    
 from sqlalchemy import or_, and_, func
 from sqlalchemy.orm import Session
-from typing import List
-from database import SessionLocal, engine
+from typing import List, Literal, Optional
+from database import AsyncSessionLocal, SessionLocal, engine, log_database_config
+from migrate import upgrade_schema
 import models
 import schemas
 from schemas import ShipmentCreate, FixedWeightConfig, WeightConfigItem, Truckcreate
@@ -14,24 +17,54 @@ from dotenv import load_dotenv
 from sqlalchemy import or_, and_, func
 from pydantic import BaseModel, Field
 import os
-import requests
 import json
 from fastapi import FastAPI
 from llm import get_optimal_route_plan
-from shipment_delay_checker import assess_shipment_delays
+from route_insertion import MAX_NEIGHBOURHOOD
+from shipment_delay_checker import assess_shipment_delays, DELAY_WORKERS
+from geocode_cache import GeocodeStats
+from batch_geocoder import fill_pending_shipments
 
 OPENCAGE_API_KEY = os.getenv("OPENCAGE_API_KEY")
 
-from priority_model import calculate_priority_scores
+from priority_stats import rescore, score_new_shipments, shrink_bounds
+from shipment_upsert import content_hash, upsert_shipments
+from spatial import (
+    index_shipment, index_truck, nearest_shipments, nearest_trucks, shipments_within, trucks_within,
+)
+from assignments import (
+    fleet_utilization, shipments_on_truck, truck_load, trucks_on_lane, unassign_shipments, unassign_truck,
+)
+from bulk_ingest import INGEST_BATCH_SIZE, MAX_INGEST_BATCH_SIZE, SHIPMENTS, TRUCKS, ingest_request
+from listing import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, shipment_page, truck_page, stream_shipments, stream_trucks,
+)
+from jobs import get_job, list_jobs, start_workers, stop_workers, submit_job
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from metrics import CONTENT_TYPE, RequestTimingMiddleware, render as render_metrics
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
+# With several workers, run `python migrate.py` once beforehand and set
+# DB_MIGRATE_ON_STARTUP=false so the workers do not race on DDL.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Startup work lives here rather than at import time, so importing the app
+# stays cheap; job workers run on the app's event loop, see jobs.py
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_MIGRATE_ON_STARTUP:
+        # Create tables and any indexes missing from an older database
+        upgrade_schema(engine)
+    log_database_config()
+    await start_workers()
+    yield
+    await stop_workers()
 
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- IMPORTANT ---
 # Configure CORS to allow only your Vercel frontend URL
@@ -48,6 +81,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the timings include CORS handling
+app.add_middleware(RequestTimingMiddleware)
 
 # Dependency to get DB session
 def get_db():
@@ -57,6 +92,16 @@ def get_db():
     finally:
         db.close()
 
+# Async session for handlers that await their I/O instead of holding a threadpool worker
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 # insert weight data
 @app.post("/weights/fixed/")
 def update_fixed_weights(config: FixedWeightConfig, db: Session = Depends(get_db)):
@@ -75,16 +120,39 @@ def update_fixed_weights(config: FixedWeightConfig, db: Session = Depends(get_db
 
 # get all weights
 @app.get("/weights/get", response_model=list[WeightConfigItem])
-def get_all_weights(db: Session = Depends(get_db)):
-    return db.query(models.WeightConfig).all()
+async def get_all_weights(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(models.WeightConfig))).all()
 
 
 # 🚀 BULK INSERT ENDPOINT shipment
 @app.post("/shipments/bulk/")
-def create_bulk_shipments(shipments: List[ShipmentCreate], db: Session = Depends(get_db)):
-    shipment_objs = [models.Shipment(**shipment.dict()) for shipment in shipments]
-    db.add_all(shipment_objs)
-    db.commit()
+def create_bulk_shipments(
+    shipments: List[ShipmentCreate],
+    mode: Literal["insert", "upsert"] = Query("insert"),
+    db: Session = Depends(get_db),
+):
+    """
+    mode=insert (default) rejects the whole batch with 409 if any
+    (order_id, customer_id) already exists. mode=upsert makes re-uploads
+    idempotent: new keys are inserted, changed rows updated, and unchanged
+    rows skipped without a write.
+    """
+    rows = [shipment.dict() for shipment in shipments]
+    if mode == "upsert":
+        result = upsert_shipments(db, rows)
+        db.commit()
+        counts = {key: len(ids) for key, ids in result.items()}
+        return {"message": f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped",
+                **counts}
+
+    shipment_objs = [index_shipment(models.Shipment(**row, content_hash=content_hash(row))) for row in rows]
+    try:
+        db.add_all(shipment_objs)
+        score_new_shipments(db, shipment_objs)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Shipment with this order_id and customer_id already exists; use mode=upsert.")
     return {"message": f"{len(shipment_objs)} shipments inserted successfully"}
 
 # Bulk truck enter
@@ -94,19 +162,37 @@ def create_bulk_trucks(trucks: List[Truckcreate], db: Session = Depends(get_db))
     truck_objs = []
 
     for truck in trucks:
-        truck_data = truck.dict()
-
-        # Convert shipment_ids list to JSON string
-        shipment_ids_list = truck_data.get("shipment_ids", [])
-        truck_data["shipment_ids"] = json.dumps(shipment_ids_list)
-
-        truck_objs.append(models.Truck(**truck_data))
+        # Assignments are made by the route optimizer, see assignments.py
+        truck_objs.append(index_truck(models.Truck(**truck.dict())))
 
     db.add_all(truck_objs)
     db.commit()
 
     return {"message": f"{len(truck_objs)} trucks inserted successfully"}
 
+# 🚀 STREAMED BULK INGEST (NDJSON or CSV body)
+@app.post("/shipments/bulk/stream")
+async def ingest_shipments_stream(
+    request: Request,
+    batch_size: int = Query(INGEST_BATCH_SIZE, ge=1, le=MAX_INGEST_BATCH_SIZE),
+    mode: Literal["insert", "upsert"] = Query("insert"),
+):
+    """
+    Send one shipment per line as NDJSON (application/x-ndjson) or CSV
+    (text/csv, addresses as origin_street, origin_city, ...). Rows are validated
+    and inserted batch_size at a time; the response lists every chunk with
+    its shipment_ids and any rejected lines. mode=upsert behaves as on
+    /shipments/bulk/.
+    """
+    return await ingest_request(request, SHIPMENTS, batch_size, upsert=mode == "upsert")
+
+@app.post("/shipments/bulktruck/stream")
+async def ingest_trucks_stream(
+    request: Request,
+    batch_size: int = Query(INGEST_BATCH_SIZE, ge=1, le=MAX_INGEST_BATCH_SIZE),
+):
+    return await ingest_request(request, TRUCKS, batch_size)
+
  # single push shipment
 @app.post("/shipments/single", response_model=schemas.ShipmentCreate)
 def create_shipment(shipment: schemas.ShipmentCreate, db: Session = Depends(get_db)):
@@ -115,13 +201,19 @@ def create_shipment(shipment: schemas.ShipmentCreate, db: Session = Depends(get_
     and stores it in the database.
     """
     # Create a new SQLAlchemy model instance from the Pydantic schema
-    db_shipment = models.Shipment(**shipment.dict())
+    shipment_data = shipment.dict()
+    db_shipment = index_shipment(models.Shipment(**shipment_data, content_hash=content_hash(shipment_data)))
 
-    # Add the new shipment to the session
-    db.add(db_shipment)
+    # Add the new shipment to the session and score it against the stored bounds
+    try:
+        db.add(db_shipment)
+        score_new_shipments(db, [db_shipment])
 
-    # Commit the transaction to save it to the database
-    db.commit()
+        # Commit the transaction to save it to the database
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Shipment with this order_id and customer_id already exists.")
 
     # Refresh the instance to get the new data from the DB (like the generated ID)
     db.refresh(db_shipment)
@@ -130,21 +222,12 @@ def create_shipment(shipment: schemas.ShipmentCreate, db: Session = Depends(get_
     return db_shipment
 
 # insert single truck
-@app.post("/shipments/singletruck/")
+@app.post("/shipments/singletruck/", response_model=schemas.Truckshow)
 def create_truck(truck: schemas.Truckcreate, db: Session = Depends(get_db)):
     """
     Adds a single new truck to the database.
     """
-    truck_data = truck.dict()
-    
-    # Convert optional shipment_ids list to JSON string if it exists
-    if "shipment_ids" in truck_data and truck_data["shipment_ids"] is not None:
-        shipment_ids_list = truck_data.get("shipment_ids", [])
-        truck_data["shipment_ids"] = json.dumps(shipment_ids_list)
-    else:
-        truck_data["shipment_ids"] = "[]" # Ensure it's a JSON string for an empty list
-    
-    db_truck = models.Truck(**truck_data)
+    db_truck = index_truck(models.Truck(**truck.dict()))
     
     db.add(db_truck)
     db.commit()
@@ -155,140 +238,287 @@ def create_truck(truck: schemas.Truckcreate, db: Session = Depends(get_db)):
 
 # ✅ GET all shipments
 @app.get("/shipments/", response_model=List[schemas.Shipment])
-def get_all_shipments(db: Session = Depends(get_db)):
-    return db.query(models.Shipment).all()
+async def get_all_shipments(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(models.Shipment))).all()
+
+# keyset-paginated shipments
+@app.get("/shipments/page", response_model=schemas.ShipmentPage)
+async def get_shipments_page(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[models.ShipmentStatus] = None,
+    vehicle_id: Optional[str] = None,
+    delivery_from: Optional[date] = None,
+    delivery_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Returns up to `limit` shipments ordered by (created_at, shipment_id).
+    Pass the returned next_cursor back to get the following page.
+    """
+    try:
+        items, next_cursor = await db.run_sync(
+            shipment_page, limit, cursor,
+            status=status, vehicle_id=vehicle_id,
+            delivery_from=delivery_from, delivery_to=delivery_to,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+# stream shipments as NDJSON
+@app.get("/shipments/stream")
+def stream_all_shipments(
+    status: Optional[models.ShipmentStatus] = None,
+    vehicle_id: Optional[str] = None,
+    delivery_from: Optional[date] = None,
+    delivery_to: Optional[date] = None,
+):
+    return StreamingResponse(
+        stream_shipments(status=status, vehicle_id=vehicle_id, delivery_from=delivery_from, delivery_to=delivery_to),
+        media_type="application/x-ndjson",
+    )
 
 # get shipment with no geocode
 @app.get("/shipments/no", response_model=List[schemas.ShipmentNo])
-def get_all_shipments(db: Session = Depends(get_db)):
-    shipments = db.query(models.Shipment).filter(
+async def get_all_shipments(db: AsyncSession = Depends(get_async_db)):
+    shipments = await db.scalars(select(models.Shipment).where(
         or_(
             models.Shipment.origin_lat == None,
             models.Shipment.origin_lng == None,
             models.Shipment.destination_lat == None,
             models.Shipment.destination_lng == None
         )
-    ).all()
-    return shipments
+    ))
+    return shipments.all()
 
 # ✅ GET all Trucks
 @app.get("/Trucks/", response_model=List[schemas.Truckshow])
-def get_all_trucks(db: Session = Depends(get_db)):
-    return db.query(models.Truck).all()
+async def get_all_trucks(db: AsyncSession = Depends(get_async_db)):
+    return (await db.scalars(select(models.Truck))).all()
+
+# keyset-paginated trucks
+@app.get("/Trucks/page", response_model=schemas.TruckPage)
+async def get_trucks_page(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[models.TruckStatusEnum] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        items, next_cursor = await db.run_sync(truck_page, limit, cursor, status=status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+# stream trucks as NDJSON
+@app.get("/Trucks/stream")
+def stream_all_trucks(status: Optional[models.TruckStatusEnum] = None):
+    return StreamingResponse(stream_trucks(status=status), media_type="application/x-ndjson")
+
+# 📦 fleet utilization (trucks LEFT JOIN truck_loads)
+@app.get("/trucks/utilization", response_model=List[schemas.TruckLoadOut])
+async def get_fleet_utilization(status: Optional[models.TruckStatusEnum] = None,
+                                db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(fleet_utilization, status=status)
+
+# trucks carrying a lane
+@app.get("/trucks/by-lane", response_model=List[schemas.Truckshow])
+async def get_trucks_on_lane(origin_city: str, destination_city: str, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(trucks_on_lane, origin_city, destination_city)
+
+# 🗺️ shipments whose origin (or destination) is within radius_km of a point
+@app.get("/shipments/near", response_model=List[schemas.NearbyShipment])
+async def get_shipments_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    k: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    end: Literal["origin", "destination"] = "origin",
+    status: Optional[models.ShipmentStatus] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Pass radius_km for a radius search or k for the k nearest."""
+    if (radius_km is None) == (k is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of radius_km or k.")
+    if k is not None:
+        hits = await db.run_sync(nearest_shipments, lat, lng, k, end=end, status=status)
+    else:
+        hits = await db.run_sync(shipments_within, lat, lng, radius_km, end=end, limit=MAX_PAGE_SIZE, status=status)
+    return [{"distance_km": d, "shipment": s} for s, d in hits]
+
+# 🗺️ nearest trucks to a point (e.g. a pickup origin)
+@app.get("/trucks/near", response_model=List[schemas.NearbyTruck])
+async def get_trucks_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    k: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[models.TruckStatusEnum] = models.TruckStatusEnum.available,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Pass radius_km for a radius search or k for the k nearest. Defaults to available trucks."""
+    if (radius_km is None) == (k is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of radius_km or k.")
+    if k is not None:
+        hits = await db.run_sync(nearest_trucks, lat, lng, k, status=status)
+    else:
+        hits = await db.run_sync(trucks_within, lat, lng, radius_km, limit=MAX_PAGE_SIZE, status=status)
+    return [{"distance_km": d, "truck": t} for t, d in hits]
+
+# current load of one truck, read from truck_loads by primary key
+@app.get("/trucks/{truck_id}/load", response_model=schemas.TruckLoadOut)
+async def get_truck_load(truck_id: str, db: AsyncSession = Depends(get_async_db)):
+    db_truck = await db.get(models.Truck, truck_id)
+    if not db_truck:
+        raise HTTPException(status_code=404, detail=f"Truck '{truck_id}' not found.")
+    return await db.run_sync(truck_load, db_truck)
+
+# 🗺️ shipments within radius_km of a truck's current location
+@app.get("/trucks/{truck_id}/nearby-shipments", response_model=List[schemas.NearbyShipment])
+async def get_shipments_near_truck(
+    truck_id: str,
+    radius_km: float = Query(50, gt=0),
+    end: Literal["origin", "destination"] = "origin",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    db_truck = await db.get(models.Truck, truck_id)
+    if not db_truck:
+        raise HTTPException(status_code=404, detail=f"Truck '{truck_id}' not found.")
+    if db_truck.current_location_lat is None or db_truck.current_location_lng is None:
+        raise HTTPException(status_code=400, detail=f"Truck '{truck_id}' has no current location.")
+    hits = await db.run_sync(shipments_within, db_truck.current_location_lat, db_truck.current_location_lng,
+                             radius_km, end=end, limit=limit)
+    return [{"distance_km": d, "shipment": s} for s, d in hits]
+
+# shipments assigned to one truck
+@app.get("/trucks/{truck_id}/shipments", response_model=List[schemas.Shipment])
+async def get_truck_shipments(truck_id: str, db: AsyncSession = Depends(get_async_db)):
+    if not await db.get(models.Truck, truck_id):
+        raise HTTPException(status_code=404, detail=f"Truck '{truck_id}' not found.")
+    return await db.run_sync(shipments_on_truck, truck_id)
 
 
 
 # calculate priority scores
 @app.post("/shipments/score/")
-def calculate_and_update_priority_scores(db: Session = Depends(get_db)):
-    shipments = db.query(models.Shipment).all()
-
-    if not shipments:
-        return {"message": "No shipments found."}
-
-    scoring_input = []
-    for s in shipments:
-        scoring_input.append({
-            "value": s.value,
-            "weight": s.weight,
-            "volume": s.volume,
-            "shelf_life_days": s.shelf_life_days,
-            "delivery_date": s.delivery_date
-        })
-
-    scores = calculate_priority_scores(scoring_input, db)
-
-    for shipment, score in zip(shipments, scores):
-        shipment.priority_score = float(score)
-
-    db.commit()
-    return {"message": f"Updated {len(scores)} shipments with priority scores."}
-
-
-# cordinate fetch from adress
+def calculate_and_update_priority_scores(full: bool = False, db: Session = Depends(get_db)):
+    """
+    Re-scores every shipment only when the normalization bounds or the weights
+    moved since the last full pass; otherwise only unscored rows are touched.
+    Pass ?full=true to force a full pass with freshly aggregated bounds.
+    """
+    result = rescore(db, force_full=full)
 
-def get_coordinates_from_address(address: str) -> dict:
-    api_key = os.getenv("OPENCAGE_API_KEY")
-    if not api_key:
-        raise ValueError("Missing OpenCage API key in environment variables.")
+    if result["mode"] == "empty":
+        return {"message": "No shipments found.", "mode": "empty", "updated": 0}
 
-    url = "https://api.opencagedata.com/geocode/v1/json"
-    params = {"q": address, "key": api_key, "limit": 1}
-    response = requests.get(url, params=params)
+    return {
+        "message": f"Updated {result['updated']} shipments with priority scores ({result['mode']} pass).",
+        "mode": result["mode"],
+        "updated": result["updated"],
+    }
 
-    if response.status_code == 200:
-        results = response.json().get("results")
-        if results:
-            loc = results[0]["geometry"]
-            return {"lat": loc["lat"], "lng": loc["lng"]}
-        else:
-            return {}
-    else:
-        raise Exception(f"OpenCage API Error: {response.status_code} - {response.text}")
 
+@app.post("/shipments/fill", response_model=schemas.ShipmentFillResult)
+async def get_all_shipments(db: AsyncSession = Depends(get_async_db)):
+    lookup_stats = GeocodeStats()
+    fill_result = await fill_pending_shipments(db, stats=lookup_stats)
 
-@app.post("/shipments/fill", response_model=List[schemas.Shipment])
-def get_all_shipments(db: Session = Depends(get_db)):
-    shipments = db.query(models.Shipment).filter(
-        or_(
-            models.Shipment.origin_lat == None,
-            models.Shipment.origin_lng == None,
-            models.Shipment.destination_lat == None,
-            models.Shipment.destination_lng == None
-        )
-    ).all()
-
+    # Reload the updated rows in one query per chunk for the response;
+    # populate_existing because the bulk UPDATE bypassed the loaded objects
+    updated_ids = fill_result["updated_ids"]
     updated_shipments = []
-    for shipment in shipments:
-        try:
-            origin = shipment.origin_address
-            dest = shipment.destination_address
-
-            # Fill origin coordinates
-            if shipment.origin_lat is None or shipment.origin_lng is None:
-                origin_str = f"{origin['street']}, {origin['city']}, {origin['state']}, {origin['pincode']}, {origin['country']}"
-                origin_coords = get_coordinates_from_address(origin_str)
-                if origin_coords:
-                    shipment.origin_lat = origin_coords["lat"]
-                    shipment.origin_lng = origin_coords["lng"]
-
-            # Fill destination coordinates
-            if shipment.destination_lat is None or shipment.destination_lng is None:
-                dest_str = f"{dest['street']}, {dest['city']}, {dest['state']}, {dest['pincode']}, {dest['country']}"
-                dest_coords = get_coordinates_from_address(dest_str)
-                if dest_coords:
-                    shipment.destination_lat = dest_coords["lat"]
-                    shipment.destination_lng = dest_coords["lng"]
-
-            shipment.updated_at = datetime.utcnow()
-            db.add(shipment)
-            updated_shipments.append(shipment)
-
-        except Exception as e:
-            print(f"[ERROR] Shipment {shipment.shipment_id} failed to update: {e}")
-            continue
+    for start in range(0, len(updated_ids), 500):
+        updated_shipments.extend((await db.scalars(
+            select(models.Shipment)
+            .where(models.Shipment.shipment_id.in_(updated_ids[start:start + 500]))
+            .execution_options(populate_existing=True)
+        )).all())
 
-    db.commit()
-    return updated_shipments
+    return {
+        "updated_shipments": updated_shipments,
+        "geocode_lookups": lookup_stats.as_dict(),
+        "throughput": fill_result["throughput"],
+    }
 
 
+# refresh=true skips cached LLM answers (see llm_cache.py) and asks the model again
 @app.post("/optimize-routes/")
-def optimize_routes(db: Session = Depends(get_db)):
+async def optimize_routes(solver: Literal["llm", "local"] = "llm", refresh: bool = False,
+                          partition: Optional[Literal["off", "origin", "cluster"]] = None,
+                          incremental: bool = False, neighbourhood: int = Query(0, ge=0, le=MAX_NEIGHBOURHOOD),
+                          db: AsyncSession = Depends(get_async_db)):
     try:
-        optimized_routes = get_optimal_route_plan(db)
+        optimized_routes = await get_optimal_route_plan(db, solver=solver, refresh=refresh, partition=partition,
+                                                        incremental=incremental, neighbourhood=neighbourhood)
         return {"optimized_routes": optimized_routes}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/delay/")
-def check_shipment_delays(db: Session = Depends(get_db)):
+async def check_shipment_delays(workers: int = Query(DELAY_WORKERS, ge=1, le=32), refresh: bool = False,
+                                db: AsyncSession = Depends(get_async_db)):
     try:
-        delay_info = assess_shipment_delays(db)
+        delay_info = await assess_shipment_delays(db, workers=workers, refresh=refresh)
         return {"shipment_delays": delay_info}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# 🛠️ background jobs: submit returns at once, poll /jobs/{job_id} for progress
+async def _submit(db: AsyncSession, kind: str, params: dict = None):
+    job, deduplicated = await submit_job(db, kind, params)
+    return {"job": job, "deduplicated": deduplicated}
+
+@app.post("/jobs/optimize-routes/", response_model=schemas.JobSubmitted, status_code=status.HTTP_202_ACCEPTED)
+async def submit_optimize_routes(solver: Literal["llm", "local"] = "llm", refresh: bool = False,
+                                 partition: Optional[Literal["off", "origin", "cluster"]] = None,
+                                 incremental: bool = False, neighbourhood: int = Query(0, ge=0, le=MAX_NEIGHBOURHOOD),
+                                 db: AsyncSession = Depends(get_async_db)):
+    return await _submit(db, "optimize_routes", {"solver": solver, "refresh": refresh, "partition": partition,
+                                                 "incremental": incremental, "neighbourhood": neighbourhood})
+
+@app.post("/jobs/delay/", response_model=schemas.JobSubmitted, status_code=status.HTTP_202_ACCEPTED)
+async def submit_delay_check(workers: int = Query(DELAY_WORKERS, ge=1, le=32), refresh: bool = False,
+                             db: AsyncSession = Depends(get_async_db)):
+    return await _submit(db, "delay", {"workers": workers, "refresh": refresh})
+
+@app.post("/jobs/fill/", response_model=schemas.JobSubmitted, status_code=status.HTTP_202_ACCEPTED)
+async def submit_fill(db: AsyncSession = Depends(get_async_db)):
+    return await _submit(db, "fill")
+
+@app.post("/jobs/score/", response_model=schemas.JobSubmitted, status_code=status.HTTP_202_ACCEPTED)
+async def submit_scoring(full: bool = False, db: AsyncSession = Depends(get_async_db)):
+    return await _submit(db, "score", {"full": full})
+
+@app.get("/jobs/", response_model=List[schemas.JobOut])
+async def get_jobs(
+    kind: Optional[str] = None,
+    status: Optional[models.JobStatus] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await list_jobs(db, kind=kind, status=status, limit=limit)
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobOut)
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+@app.get("/jobs/{job_id}/result", response_model=schemas.JobResult)
+async def get_job_result(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    if job.status in (models.JobStatus.queued, models.JobStatus.running):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is still {job.status.value}.")
+    return job
+
+
 # to delete shipment
 @app.delete("/shipments/{shipment_id}", status_code=status.HTTP_200_OK)
 def delete_shipment(shipment_id: str, db: Session = Depends(get_db)):
@@ -305,7 +535,10 @@ def delete_shipment(shipment_id: str, db: Session = Depends(get_db)):
                 detail=f"Shipment with ID '{shipment_id}' not found."
             )
 
+        unassign_shipments(db, [shipment_id])
         db.delete(db_shipment)
+        db.flush()
+        shrink_bounds(db, db_shipment)
         db.commit()
         
         # Return a success message with a 200 OK status code.
@@ -336,7 +569,8 @@ def delete_truck(truck_id: str, db: Session = Depends(get_db)):
                 detail=f"Truck with registration number '{truck_id}' not found."
             )
 
-        # Delete the found object and commit the transaction
+        # Free its shipments, then delete the found object and commit the transaction
+        unassign_truck(db, truck_id)
         db.delete(db_truck)
         db.commit()
 
@@ -0,0 +1,341 @@
+# metrics.py
+#
+# In-process counters and histograms rendered in the Prometheus text format
+# at /metrics, plus a request-timing ASGI middleware. print_summary() renders
+# the same numbers for a CLI run:
+#   python metrics.py score [--full]
+#   python metrics.py fill
+#   python metrics.py optimize [--solver local]
+#   python metrics.py delay [--workers 4]
+# Values are per process; with several uvicorn workers, scrape each one.
+
+import argparse
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds: sub-millisecond lookups up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Seconds per scored row: set-based passes run at well under a microsecond per row
+ROW_BUCKETS = (1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 1e-3, 1e-2)
+# Estimated prompt tokens: a handful of shipments up to a model's context limit
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 1000000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ===================== METRIC TYPES ===================== #
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key, extra=()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def series(self) -> dict:
+        """{label values tuple: value} snapshot."""
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.series().items()):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0.0)
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{self._label_text(key)} {_format(value)}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is None:
+                # [per-bucket counts incl. +Inf, sum, count]
+                entry = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+    def quantile(self, q: float, counts) -> float:
+        """Estimate from bucket counts, interpolating linearly inside the bucket."""
+        total = sum(counts)
+        if not total:
+            return float("nan")
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def _render_series(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else _format(bound)
+            lines.append(f"{self.name}_bucket{self._label_text(key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {_format(total)}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+# ===================== REGISTRY ===================== #
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, *args, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"{name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name: str, help: str, labels=()) -> Counter:
+    return _register(Counter, name, help, labels)
+
+
+def histogram(name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labels, buckets=buckets)
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        metric.reset()
+
+
+# ===================== APP METRICS ===================== #
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"),
+)
+STAGE_SECONDS = histogram(
+    "pipeline_stage_duration_seconds", "Wall time of one stage of a pipeline run.", ("pipeline", "stage"),
+)
+LLM_SECONDS = histogram(
+    "llm_call_duration_seconds", "Latency per model call, by agent.", ("agent",),
+)
+LLM_PROMPT_TOKENS = histogram(
+    "llm_prompt_tokens", "Estimated prompt tokens per route planner call.", ("encoding",), buckets=TOKEN_BUCKETS,
+)
+GEOCODE_SECONDS = histogram("geocode_request_duration_seconds", "Latency of one geocoding provider request.")
+GEOCODE_LOOKUPS = counter("geocode_lookups_total", "Address lookups by the layer that answered them.", ("layer",))
+LLM_CACHE_LOOKUPS = counter(
+    "llm_cache_lookups_total", "Model calls by cache outcome: hit, miss or bypass.", ("agent", "result"),
+)
+SCORING_ROWS = counter("scoring_rows_total", "Shipments given a priority score.", ("mode",))
+SCORING_SECONDS_PER_ROW = histogram(
+    "scoring_seconds_per_row", "Scoring pass time divided by the rows it scored.", ("mode",), buckets=ROW_BUCKETS,
+)
+
+
+def stage(pipeline: str, name: str):
+    """`with stage("route_plan", "db_fetch"):` times one pipeline stage."""
+    return STAGE_SECONDS.time(pipeline=pipeline, stage=name)
+
+
+def observe_scoring(mode: str, rows: int, seconds: float):
+    if rows:
+        SCORING_ROWS.inc(rows, mode=mode)
+        SCORING_SECONDS_PER_ROW.observe(seconds / rows, mode=mode)
+
+
+# ===================== REQUEST TIMING ===================== #
+class RequestTimingMiddleware:
+    """
+    Plain ASGI middleware (no response buffering) that records
+    REQUEST_SECONDS per route template, so /trucks/{truck_id}/load stays
+    one series however many trucks are queried.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=getattr(route, "path", "unmatched"), status=status,
+            )
+
+
+# ===================== CLI SUMMARY ===================== #
+def print_summary():
+    """Count, mean, p50 and p95 per histogram series, and the geocode and LLM cache hit ratios."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    print(f"{'series':<76} {'count':>7} {'mean':>10} {'p50':>10} {'p95':>10}")
+    for metric in metrics:
+        if not isinstance(metric, Histogram):
+            continue
+        for key, (counts, total, count) in sorted(metric.series().items()):
+            if not count:
+                continue
+            name = metric.name + metric._label_text(key)
+            print(f"{name:<76} {count:>7} {total / count:>10.4g} "
+                  f"{metric.quantile(0.5, counts):>10.4g} {metric.quantile(0.95, counts):>10.4g}")
+    lookups = {key[0]: value for key, value in GEOCODE_LOOKUPS.series().items()}
+    answered = sum(lookups.get(layer, 0) for layer in ("memory", "database", "api"))
+    if answered:
+        cached = lookups.get("memory", 0) + lookups.get("database", 0)
+        print(f"geocode cache hit ratio: {cached / answered:.1%} ({int(cached)} of {int(answered)} lookups)")
+    results = {}
+    for (_, result), value in LLM_CACHE_LOOKUPS.series().items():
+        results[result] = results.get(result, 0) + value
+    calls = sum(results.values())
+    if calls:
+        hits = results.get("hit", 0)
+        print(f"LLM cache hit ratio: {hits / calls:.1%} ({int(hits)} of {int(calls)} calls)")
+
+
+def _run_cli():
+    import asyncio
+
+    from database import AsyncSessionLocal, async_engine, engine
+    from jobs import JOB_HANDLERS, JobProgress
+    from migrate import upgrade_schema
+    # The pipelines record into the importable module, not this __main__ copy
+    import metrics
+
+    parser = argparse.ArgumentParser(description="Run one pipeline in-process and print its stage timings.")
+    sub = parser.add_subparsers(dest="pipeline", required=True)
+    score = sub.add_parser("score")
+    score.add_argument("--full", action="store_true")
+    sub.add_parser("fill")
+    optimize = sub.add_parser("optimize")
+    optimize.add_argument("--solver", choices=["llm", "local"], default="llm")
+    optimize.add_argument("--partition", choices=["off", "origin", "cluster"], default=None)
+    optimize.add_argument("--incremental", action="store_true")
+    optimize.add_argument("--neighbourhood", type=int, default=0)
+    delay = sub.add_parser("delay")
+    delay.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    kind, params = {
+        "score": ("score", {"full": getattr(args, "full", False)}),
+        "fill": ("fill", {}),
+        "optimize": ("optimize_routes", {"solver": getattr(args, "solver", "llm"),
+                                         "partition": getattr(args, "partition", None),
+                                         "incremental": getattr(args, "incremental", False),
+                                         "neighbourhood": getattr(args, "neighbourhood", 0)}),
+        "delay": ("delay", {} if getattr(args, "workers", None) is None else {"workers": args.workers}),
+    }[args.pipeline]
+
+    # Same schema upgrade the app runs on startup
+    upgrade_schema(engine)
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                with metrics.stage(kind, "total"):
+                    await JOB_HANDLERS[kind](db, params, JobProgress())
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+    metrics.print_summary()
+
+
+if __name__ == "__main__":
+    _run_cli()
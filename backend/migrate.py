@@ -0,0 +1,121 @@
+# migrate.py
+#
+# Brings an existing database (e.g. the shipments.db shipped with the repo)
+# up to the current models: creates missing tables, columns and indexes.
+#   python migrate.py [--dedupe]
+
+import argparse
+
+from sqlalchemy import delete, func, inspect, select
+
+from assignments import backfill_assignments, refresh_truck_loads
+from database import engine
+from spatial import reindex_all
+import models
+
+
+def _add_missing_columns(bind, inspector, table) -> list:
+    existing = {c["name"] for c in inspector.get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable:
+            raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table")
+        column_type = column.type.compile(dialect=bind.dialect)
+        with bind.begin() as conn:
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _duplicate_groups(bind, index) -> int:
+    columns = list(index.columns)
+    groups = select(*columns).group_by(*columns).having(func.count() > 1).subquery()
+    with bind.connect() as conn:
+        return conn.execute(select(func.count()).select_from(groups)).scalar()
+
+
+def dedupe_shipments(bind=engine) -> int:
+    """
+    Deletes repeated (order_id, customer_id) rows, keeping per key the row
+    already assigned to a truck, else the earliest created. The losers'
+    truck_assignments go in the same transaction (SQLite does not enforce
+    ON DELETE CASCADE here) and their trucks' loads are rebuilt. Returns
+    rows deleted.
+    """
+    table = models.Shipment.__table__
+    assignments = models.TruckAssignment.__table__
+    ranked = select(
+        table.c.shipment_id,
+        func.row_number().over(
+            partition_by=(table.c.order_id, table.c.customer_id),
+            order_by=(table.c.vehicle_id.is_(None), table.c.created_at, table.c.shipment_id),
+        ).label("rank"),
+    ).subquery()
+    losers = select(ranked.c.shipment_id).where(ranked.c.rank > 1)
+    with bind.begin() as conn:
+        touched = conn.execute(
+            select(assignments.c.truck_id).where(assignments.c.shipment_id.in_(losers)).distinct()
+        ).scalars().all()
+        conn.execute(delete(assignments).where(assignments.c.shipment_id.in_(losers)))
+        deleted = conn.execute(delete(table).where(table.c.shipment_id.in_(losers))).rowcount
+        if touched:
+            refresh_truck_loads(conn, touched)
+        if deleted:
+            # Bounds are rebuilt from the remaining rows on the next scoring call
+            conn.execute(delete(models.ScoringStat.__table__))
+    return deleted
+
+
+def upgrade_schema(bind=engine, dedupe: bool = False) -> list:
+    """
+    Idempotent: `create_all` only adds missing tables, so columns and indexes
+    declared later on existing tables are added here one by one. A unique
+    index whose key already has duplicates is skipped with a warning unless
+    `dedupe` is set. Returns the names of the columns and indexes created.
+    """
+    existing_tables = set(inspect(bind).get_table_names())
+    models.Base.metadata.create_all(bind=bind)
+    if "truck_assignments" not in existing_tables and "trucks" in existing_tables:
+        print(f"🚚 Backfilled {backfill_assignments(bind)} truck assignments")
+
+    inspector = inspect(bind)
+    created = []
+    for table in models.Base.metadata.sorted_tables:
+        created += _add_missing_columns(bind, inspector, table)
+    if {"shipments.origin_cell", "trucks.location_cell"} & set(created):
+        print(f"🗺️ Indexed {reindex_all(bind)} rows into the spatial grid")
+
+    for table in models.Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.unique and _duplicate_groups(bind, index):
+                if dedupe and table is models.Shipment.__table__:
+                    print(f"🧹 Removed {dedupe_shipments(bind)} duplicate shipments")
+                else:
+                    print(f"⚠️ Skipping {index.name}: duplicate keys exist, run `python migrate.py --dedupe`")
+                    continue
+            index.create(bind=bind)
+            created.append(index.name)
+
+    # Refresh planner statistics so the new indexes are picked up
+    if created and bind.dialect.name == "sqlite":
+        with bind.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    return created
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dedupe", action="store_true",
+                        help="delete duplicate (order_id, customer_id) shipments so the unique index can be built")
+    args = parser.parse_args()
+
+    created = upgrade_schema(dedupe=args.dedupe)
+    if created:
+        print(f"Created {len(created)} columns/indexes: {', '.join(created)}")
+    else:
+        print("Schema is up to date.")
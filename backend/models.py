@@ -1,8 +1,10 @@
-from sqlalchemy import Column, String, Float, Integer, Date, DateTime, Enum, JSON, Text
+from sqlalchemy import Column, String, Float, Integer, Date, DateTime, Enum, JSON, Text, Boolean, Index, ForeignKey, text
+from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
 import uuid
 import enum
+import json
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 
 
@@ -11,6 +13,12 @@ def generate_uuid():
     return str(uuid.uuid4())
 
 
+# Rows that /shipments/no and /shipments/fill still have to geocode
+NEEDS_GEOCODING = (
+    "origin_lat IS NULL OR origin_lng IS NULL OR destination_lat IS NULL OR destination_lng IS NULL"
+)
+
+
 class ShipmentStatus(str, enum.Enum):
     PENDING = "Pending"
     IN_TRANSIT = "In Transit"
@@ -56,6 +64,29 @@ class Shipment(Base):
     destination_lat = Column(Float, nullable=True)
     destination_lng = Column(Float, nullable=True)
 
+    # Grid cells of the two endpoints, see spatial.py
+    origin_cell = Column(Integer, nullable=True)
+    destination_cell = Column(Integer, nullable=True)
+
+    # sha256 of the upstream payload; lets upsert skip unchanged resends
+    content_hash = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Natural key for idempotent re-uploads (ON CONFLICT target)
+        Index("uq_shipments_order_customer", "order_id", "customer_id", unique=True),
+        # Partial index: only un-geocoded rows are in it, so it stays tiny
+        Index("ix_shipments_needs_geocoding", "shipment_id",
+              sqlite_where=text(NEEDS_GEOCODING), postgresql_where=text(NEEDS_GEOCODING)),
+        Index("ix_shipments_status_delivery", "shipment_status", "delivery_date"),
+        Index("ix_shipments_delivery_date", "delivery_date"),
+        Index("ix_shipments_vehicle_id", "vehicle_id"),
+        Index("ix_shipments_priority_score", priority_score.desc()),
+        # Keyset pagination order for /shipments/page and /shipments/stream
+        Index("ix_shipments_created_at_id", "created_at", "shipment_id"),
+        Index("ix_shipments_origin_cell", "origin_cell"),
+        Index("ix_shipments_destination_cell", "destination_cell"),
+    )
+
 class WeightConfig(Base):
     __tablename__ = "weight_configs"
 
@@ -81,6 +112,133 @@ class Truck(Base):
     truck_type = Column(String, nullable=True)  # e.g., "open", "container")
     driver_contact = Column(String, nullable=True)
     status = Column(Enum(TruckStatusEnum), default=TruckStatusEnum.available, nullable=True)
-
-    # Stores list of shipment UUIDs assigned to this truck
-    shipment_ids = Column(Text, nullable=True)  # Store as JSON string
+    location_cell = Column(Integer, nullable=True)  # grid cell of current location, see spatial.py
+
+    __table_args__ = (
+        Index("ix_trucks_status", "status"),
+        Index("ix_trucks_location_cell", "location_cell"),
+    )
+
+    # Assigned shipments live in truck_assignments; the old shipment_ids JSON
+    # column may still exist in older databases but is no longer read or written
+    assignments = relationship("TruckAssignment", lazy="selectin", viewonly=True)
+
+    @property
+    def shipment_ids(self) -> str:
+        # Same JSON-string shape the API has always returned
+        return json.dumps([a.shipment_id for a in self.assignments])
+
+# --- Truck <-> Shipment Assignments ---
+class TruckAssignment(Base):
+    __tablename__ = "truck_assignments"
+
+    # A shipment rides on at most one truck, so it is the primary key
+    shipment_id = Column(String, ForeignKey("shipments.shipment_id", ondelete="CASCADE"), primary_key=True)
+    truck_id = Column(String, ForeignKey("trucks.truck_id", ondelete="CASCADE"), nullable=False)
+    assigned_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_truck_assignments_truck_id", "truck_id"),
+    )
+
+# Current load per truck, maintained by assignments.refresh_truck_loads
+class TruckLoad(Base):
+    __tablename__ = "truck_loads"
+
+    truck_id = Column(String, ForeignKey("trucks.truck_id", ondelete="CASCADE"), primary_key=True)
+    shipment_count = Column(Integer, nullable=False, default=0)
+    weight_kg = Column(Float, nullable=False, default=0.0)
+    volume_cubic_m = Column(Float, nullable=False, default=0.0)
+    stop_count = Column(Integer, nullable=False, default=0)  # distinct pickup + drop cities
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# --- Priority Scoring Stats ---
+class ScoringStat(Base):
+    __tablename__ = "scoring_stats"
+
+    # value / weight / volume / shelf_life_days, and delivery_date as a date ordinal
+    feature_name = Column(String, primary_key=True)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+
+class ScoringRun(Base):
+    __tablename__ = "scoring_runs"
+
+    run_id = Column(Integer, primary_key=True)  # single row, see priority_stats
+    fingerprint = Column(Text, nullable=False)  # normalization bounds + weights of the last full pass
+    mode = Column(String, nullable=False)
+    scored_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# --- Geocode Cache Table ---
+class GeocodeCacheEntry(Base):
+    __tablename__ = "geocode_cache"
+
+    address_key = Column(String, primary_key=True)  # normalized address, see geocode_cache.normalize_address
+    address = Column(Text, nullable=False)          # address as first looked up
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    found = Column(Boolean, nullable=False, default=True)  # False = provider had no result
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Expiry scans in geocode_cache.compact_geocode_cache
+        Index("ix_geocode_cache_found_fetched_at", "found", "fetched_at"),
+    )
+
+# --- LLM Response Cache ---
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    cache_key = Column(String, primary_key=True)  # see llm_cache.cache_key
+    model_name = Column(String, nullable=False)
+    instruction_hash = Column(String, nullable=False)
+    prompt_hash = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    hits = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Expiry and least-recently-used eviction in llm_cache
+        Index("ix_llm_cache_created_at", "created_at"),
+        Index("ix_llm_cache_last_used_at", "last_used_at"),
+    )
+
+# --- Background Jobs ---
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+# Jobs that still hold their kind's slot, see jobs.submit_job
+ACTIVE_JOB = "status IN ('queued', 'running')"
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    job_id = Column(String, primary_key=True, default=generate_uuid)
+    kind = Column(String, nullable=False)  # optimize_routes / delay / fill / score, see jobs.JOB_HANDLERS
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.queued)
+
+    progress = Column(Float, nullable=False, default=0.0)  # 0..1
+    message = Column(String, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    worker = Column(String, nullable=True)  # host:pid that claimed the job
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # One queued or running job per kind: a second submit coalesces onto it
+        Index("uq_jobs_active_kind", "kind", unique=True,
+              sqlite_where=text(ACTIVE_JOB), postgresql_where=text(ACTIVE_JOB)),
+        # Claiming the oldest queued job and listing recent ones
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+        Index("ix_jobs_created_at", "created_at"),
+    )
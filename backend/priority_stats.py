@@ -0,0 +1,254 @@
+# priority_stats.py
+
+import json
+import time
+from datetime import date, datetime
+
+from sqlalchemy import func, literal, update
+from sqlalchemy.orm import Session
+
+import models
+from metrics import observe_scoring, stage
+
+# Scored features and their weight_config names
+FEATURES = ["value", "weight", "volume", "shelf_life_days", "days_to_delivery"]
+# Lower is more urgent for these, so their normalized value is inverted
+INVERTED = {"shelf_life_days", "days_to_delivery"}
+# Columns whose min/max are persisted; days_to_delivery is derived from delivery_date
+STAT_COLUMNS = ["value", "weight", "volume", "shelf_life_days", "delivery_date"]
+
+_RUN_ID = 1
+
+
+# ===================== BOUNDS ===================== #
+def _column_value(shipment, column):
+    value = getattr(shipment, column)
+    if column == "delivery_date":
+        return float(value.toordinal()) if value else None
+    return float(value) if value is not None else 0.0
+
+
+def recompute_bounds(db: Session):
+    """Rebuilds scoring_stats from the shipments table with one aggregate query."""
+    table = models.Shipment.__table__
+    aggregates = []
+    for column in STAT_COLUMNS:
+        aggregates += [func.min(table.c[column]), func.max(table.c[column])]
+    row = db.query(*aggregates).one()
+
+    existing = {r.feature_name: r for r in db.query(models.ScoringStat).all()}
+    if row[0] is None:
+        for stat in existing.values():
+            db.delete(stat)
+        db.flush()
+        return None
+
+    bounds = {}
+    for i, column in enumerate(STAT_COLUMNS):
+        lo, hi = row[2 * i], row[2 * i + 1]
+        if column == "delivery_date":
+            lo, hi = _as_date(lo).toordinal(), _as_date(hi).toordinal()
+        bounds[column] = (float(lo), float(hi))
+        stat = existing.get(column)
+        if stat is None:
+            stat = models.ScoringStat(feature_name=column)
+            db.add(stat)
+        stat.min_value, stat.max_value = float(lo), float(hi)
+    db.flush()
+    return bounds
+
+
+def _as_date(value):
+    # SQLite hands back aggregates of DATE columns as ISO strings
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def load_bounds(db: Session):
+    """Returns {column: (min, max)} from scoring_stats, rebuilding it if incomplete."""
+    rows = db.query(models.ScoringStat).all()
+    bounds = {r.feature_name: (r.min_value, r.max_value) for r in rows}
+    if set(bounds) != set(STAT_COLUMNS):
+        return recompute_bounds(db)
+    return bounds
+
+
+def expand_bounds(db: Session, shipments) -> bool:
+    """
+    Widens the stored bounds to cover newly inserted shipments.
+    Returns True if any bound moved.
+    """
+    moved = False
+    rows = {r.feature_name: r for r in db.query(models.ScoringStat).all()}
+    if set(rows) != set(STAT_COLUMNS):
+        db.flush()
+        recompute_bounds(db)
+        rows = {r.feature_name: r for r in db.query(models.ScoringStat).all()}
+        moved = True
+
+    for column in STAT_COLUMNS:
+        values = [v for v in (_column_value(s, column) for s in shipments) if v is not None]
+        if not values:
+            continue
+        lo, hi = min(values), max(values)
+        row = rows.get(column)
+        if row is None:
+            # Nothing in the table yet: the new rows define the bounds
+            db.add(models.ScoringStat(feature_name=column, min_value=lo, max_value=hi))
+            moved = True
+            continue
+        if lo < row.min_value:
+            row.min_value = lo
+            moved = True
+        if hi > row.max_value:
+            row.max_value = hi
+            moved = True
+    db.flush()
+    return moved
+
+
+def shrink_bounds(db: Session, *removed) -> bool:
+    """
+    Call after shipments have been deleted, or updated (pass their old
+    values), and flushed. Bounds are only re-aggregated when a removed value
+    sat on one of them; the next rescore() is then a full pass.
+    """
+    rows = {r.feature_name: r for r in db.query(models.ScoringStat).all()}
+    for shipment in removed:
+        for column, row in rows.items():
+            value = _column_value(shipment, column)
+            if value is not None and (value <= row.min_value or value >= row.max_value):
+                recompute_bounds(db)
+                db.query(models.ScoringRun).delete()
+                return True
+    return False
+
+
+# ===================== SCORING ===================== #
+def feature_bounds(bounds, today: date = None) -> dict:
+    """Turns stored column bounds into bounds for the five scored features."""
+    today = today or date.today()
+    result = {column: bounds[column] for column in STAT_COLUMNS if column != "delivery_date"}
+    lo, hi = bounds["delivery_date"]
+    result["days_to_delivery"] = (max(lo - today.toordinal(), 0.0), max(hi - today.toordinal(), 0.0))
+    return result
+
+
+def load_weights(db: Session) -> dict:
+    return {w.feature_name: w.weight_value for w in db.query(models.WeightConfig).all()}
+
+
+def _normalized(value, lo, hi, inverted):
+    # Matches MinMaxScaler: a constant column normalizes to 0
+    scaled = (value - lo) / (hi - lo) if hi > lo else 0.0
+    return 1 - scaled if inverted else scaled
+
+
+def score_shipment(shipment, fbounds, weights, today: date = None) -> float:
+    """O(1) score for one shipment against the current bounds."""
+    today = today or date.today()
+    score = 0.0
+    for feature in FEATURES:
+        weight = weights.get(feature, 0)
+        if not weight:
+            continue
+        if feature == "days_to_delivery":
+            value = max((shipment.delivery_date - today).days, 0) if shipment.delivery_date else 0
+        else:
+            value = getattr(shipment, feature) or 0
+        lo, hi = fbounds[feature]
+        score += weight * _normalized(float(value), lo, hi, feature in INVERTED)
+    return score
+
+
+def fingerprint(fbounds, weights) -> str:
+    return json.dumps(
+        {"bounds": {f: list(fbounds[f]) for f in FEATURES},
+         "weights": {f: weights.get(f, 0) for f in FEATURES}},
+        sort_keys=True,
+    )
+
+
+def _days_to_delivery_expr(db: Session, today: date):
+    column = models.Shipment.__table__.c.delivery_date
+    if db.get_bind().dialect.name == "sqlite":
+        return func.max(func.julianday(column) - func.julianday(literal(today.isoformat())), 0)
+    return func.greatest(column - literal(today), 0)
+
+
+def score_update_statement(db: Session, fbounds, weights, today: date = None):
+    """Single set-based UPDATE that writes priority_score for every matching row."""
+    today = today or date.today()
+    table = models.Shipment.__table__
+    expr = literal(0.0)
+    for feature in FEATURES:
+        weight = weights.get(feature, 0)
+        if not weight:
+            continue
+        lo, hi = fbounds[feature]
+        column = _days_to_delivery_expr(db, today) if feature == "days_to_delivery" else table.c[feature]
+        scaled = (column - lo) * (1.0 / (hi - lo)) if hi > lo else literal(0.0)
+        if feature in INVERTED:
+            scaled = 1.0 - scaled
+        expr = expr + weight * scaled
+    return update(table).values(priority_score=expr)
+
+
+# ===================== ENTRY POINTS ===================== #
+def score_new_shipments(db: Session, shipments):
+    """
+    Insert-time hook: widens the bounds and scores the new rows in O(1) each.
+    If a bound moved, every other row is now stale; the fingerprint check in
+    rescore() picks that up on the next /shipments/score/ call.
+    """
+    if not shipments:
+        return
+    started = time.perf_counter()
+    expand_bounds(db, shipments)
+    bounds = load_bounds(db)
+    fbounds = feature_bounds(bounds)
+    weights = load_weights(db)
+    for shipment in shipments:
+        shipment.priority_score = score_shipment(shipment, fbounds, weights)
+    observe_scoring("insert", len(shipments), time.perf_counter() - started)
+
+
+def rescore(db: Session, force_full: bool = False) -> dict:
+    """
+    Runs a full set-based re-score only when the normalization bounds or the
+    weights changed since the last full pass; otherwise scores just the rows
+    that have no score yet. Returns {"mode", "updated"}.
+    """
+    started = time.perf_counter()
+    bounds = recompute_bounds(db) if force_full else load_bounds(db)
+    if bounds is None:
+        return {"mode": "empty", "updated": 0}
+
+    today = date.today()
+    fbounds = feature_bounds(bounds, today)
+    weights = load_weights(db)
+    current = fingerprint(fbounds, weights)
+
+    run = db.get(models.ScoringRun, _RUN_ID)
+    statement = score_update_statement(db, fbounds, weights, today)
+    if force_full or run is None or run.fingerprint != current:
+        mode = "full"
+    else:
+        mode = "incremental"
+        statement = statement.where(models.Shipment.__table__.c.priority_score.is_(None))
+
+    with stage("score", "update"):
+        updated = db.execute(statement).rowcount
+
+    if mode == "full":
+        if run is None:
+            run = models.ScoringRun(run_id=_RUN_ID)
+            db.add(run)
+        run.fingerprint = current
+        run.mode = mode
+        run.scored_at = datetime.utcnow()
+    with stage("score", "commit"):
+        db.commit()
+    observe_scoring(mode, updated, time.perf_counter() - started)
+    return {"mode": mode, "updated": updated}
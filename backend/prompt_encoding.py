@@ -0,0 +1,236 @@
+# prompt_encoding.py
+#
+# Compact route planner prompts. format_input_for_llm builds one object per
+# truck and shipment with full UUIDs and repeated key names; the compact
+# encoding sends the same facts as:
+#   - short integer aliases instead of UUIDs and registration numbers
+#   - column headers once, then plain rows
+#   - one row per lane (origin city -> destination city) holding its shipments
+#   - city names once, referenced by index
+# PromptAliases maps the planner's answer back before validation.
+# A problem whose prompt would exceed LLM_PROMPT_TOKEN_BUDGET is split into
+# parts by origin city (see split_for_budget) and each part is planned alone.
+# The original verbose prompt stays the default; LLM_PROMPT_ENCODING=compact
+# switches to this one.
+
+import json
+import math
+import os
+
+# ===================== SETTINGS ===================== #
+LLM_PROMPT_ENCODING = os.getenv("LLM_PROMPT_ENCODING", "json").lower()
+LLM_PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "30000"))
+# Rough characters per token for JSON-heavy text
+CHARS_PER_TOKEN = 4.0
+
+ENCODINGS = ("compact", "json")
+if LLM_PROMPT_ENCODING not in ENCODINGS:
+    raise ValueError(f"LLM_PROMPT_ENCODING must be one of {ENCODINGS}, got '{LLM_PROMPT_ENCODING}'")
+
+TRUCK_COLS = ["t", "max_kg", "max_m3", "km_to_origins[[city,km]]"]
+LANE_COLS = ["from", "to", "km", "total_kg", "total_m3", "shipments[[s,kg,m3]]"]
+
+
+# ===================== TOKEN ESTIMATE ===================== #
+def serialize(payload, encoding: str) -> str:
+    """The prompt text as sent; compact prompts also drop JSON whitespace."""
+    if encoding == "compact":
+        return json.dumps(payload, separators=(",", ":"))
+    return json.dumps(payload)
+
+
+def estimate_tokens(payload, encoding: str = "json") -> int:
+    return math.ceil(len(serialize(payload, encoding)) / CHARS_PER_TOKEN)
+
+
+# ===================== ALIASES ===================== #
+class PromptAliases:
+    """Integer aliases for the trucks and shipments of one compact prompt."""
+
+    def __init__(self, truck_numbers, shipment_ids):
+        # Alias n is list position n - 1
+        self.truck_numbers = list(truck_numbers)
+        self.shipment_ids = list(shipment_ids)
+        self.truck_alias = {number: i + 1 for i, number in enumerate(self.truck_numbers)}
+        self.shipment_alias = {sid: i + 1 for i, sid in enumerate(self.shipment_ids)}
+
+    @staticmethod
+    def _lookup(values, alias):
+        if isinstance(alias, int) and not isinstance(alias, bool) and 0 < alias <= len(values):
+            return values[alias - 1]
+        # Unknown aliases pass through so the validator reports them
+        return alias
+
+    def decode_plan(self, plan) -> list:
+        """[{"t": 1, "s": [3, 4]}] -> [{"truck_number": ..., "shipment_ids": [...]}]."""
+        decoded = []
+        for entry in plan:
+            if not isinstance(entry, dict) or not isinstance(entry.get("s", []), list):
+                decoded.append(entry)
+                continue
+            decoded.append({
+                "truck_number": self._lookup(self.truck_numbers, entry.get("t")),
+                "shipment_ids": [self._lookup(self.shipment_ids, s) for s in entry.get("s", [])],
+            })
+        return decoded
+
+    def encode_feedback(self, validation_result: dict) -> dict:
+        """A failed validation with truck numbers and shipment IDs replaced by aliases."""
+        result = dict(validation_result)
+        result["violations"] = [
+            {**v, "truck_number": self.truck_alias.get(v["truck_number"], v["truck_number"])}
+            for v in validation_result.get("violations", [])
+        ]
+        for key in ("duplicate_shipments", "unknown_shipments"):
+            result[key] = [self.shipment_alias.get(s, s) for s in validation_result.get(key, [])]
+        result["unknown_trucks"] = [self.truck_alias.get(t, t) for t in validation_result.get("unknown_trucks", [])]
+        return result
+
+
+# ===================== COMPACT PAYLOAD ===================== #
+def _num(value):
+    """Drops the trailing .0 of whole numbers."""
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def _up(value, digits):
+    # Loads round up and capacities round down, so a plan that fits the
+    # rounded numbers also fits the real ones
+    scale = 10 ** digits
+    return _num(math.ceil(value * scale - 1e-9) / scale)
+
+
+def _down(value, digits):
+    scale = 10 ** digits
+    return _num(math.floor(value * scale + 1e-9) / scale)
+
+
+def json_payload(data: dict, truck_idx=None, shipment_idx=None) -> dict:
+    """The verbose format_input_for_llm payload, optionally restricted to a part."""
+    trucks = data["trucks"] if truck_idx is None else [data["trucks"][i] for i in truck_idx]
+    shipments = data["shipments"] if shipment_idx is None else [data["shipments"][j] for j in shipment_idx]
+    return {"trucks": trucks, "shipments": shipments}
+
+
+def compact_payload(data: dict, truck_idx=None, shipment_idx=None):
+    """
+    Encodes format_input_for_llm output (or the part given by row indices)
+    compactly. Returns (payload, PromptAliases).
+    """
+    part = json_payload(data, truck_idx, shipment_idx)
+    trucks, shipments = part["trucks"], part["shipments"]
+
+    cities = []
+    city_index = {}
+
+    def city(name):
+        if name not in city_index:
+            city_index[name] = len(cities)
+            cities.append(name)
+        return city_index[name]
+
+    lanes = {}
+    for s in shipments:
+        lanes.setdefault((s["origin_address_city"], s["destination_address_city"]), []).append(s)
+
+    # Shipment aliases run lane by lane, so one lane holds consecutive numbers
+    shipment_ids = []
+    lane_rows = []
+    for (origin, destination), members in sorted(lanes.items(), key=lambda item: (str(item[0][0]), str(item[0][1]))):
+        rows = []
+        for s in members:
+            shipment_ids.append(s["id"])
+            rows.append([len(shipment_ids), _up(s["weight"] or 0.0, 1), _up(s["volume"] or 0.0, 3)])
+        known_km = [s["distance_km"] for s in members if s["distance_km"] is not None]
+        lane_rows.append([
+            city(origin), city(destination),
+            round(sum(known_km) / len(known_km)) if known_km else None,
+            round(sum(r[1] for r in rows), 1), round(sum(r[2] for r in rows), 3),
+            rows,
+        ])
+
+    truck_rows = []
+    for i, t in enumerate(trucks):
+        truck_rows.append([
+            i + 1,
+            _down(t["capacity_weight"] or 0.0, 1),
+            None if t["capacity_volume"] is None else _down(t["capacity_volume"], 3),
+            [[city(name), km] for name, km in t["km_to_origin_cities"].items()],
+        ])
+
+    payload = {
+        "cities": cities,
+        "trucks": {"cols": TRUCK_COLS, "rows": truck_rows},
+        "lanes": {"cols": LANE_COLS, "rows": lane_rows},
+    }
+    return payload, PromptAliases([t["truck_number"] for t in trucks], shipment_ids)
+
+
+# ===================== BUDGET SPLIT ===================== #
+def _nearest_origin(truck):
+    # km_to_origin_cities is ordered nearest first
+    return next(iter(truck["km_to_origin_cities"]), None)
+
+
+def _halves(data, truck_idx, shipment_idx):
+    """Splits one part in two, keeping origin cities whole where possible."""
+    shipments = data["shipments"]
+    by_origin = {}
+    for j in shipment_idx:
+        by_origin.setdefault(shipments[j]["origin_address_city"], []).append(j)
+
+    halves = ([], [])
+    if len(by_origin) > 1:
+        # Biggest origins first, each to the lighter half
+        for group in sorted(by_origin.values(), key=len, reverse=True):
+            (halves[0] if len(halves[0]) <= len(halves[1]) else halves[1]).extend(group)
+    else:
+        # One origin: keep each destination's shipments together
+        ordered = sorted(shipment_idx, key=lambda j: str(shipments[j]["destination_address_city"]))
+        middle = len(ordered) // 2
+        halves = (ordered[:middle], ordered[middle:])
+    left_origins = {shipments[j]["origin_address_city"] for j in halves[0]}
+
+    # Trucks go to the half holding their nearest origin, unless that half
+    # already has enough capacity and the other does not
+    demand = [sum(shipments[j]["weight"] or 0.0 for j in half) for half in halves]
+    supply = [0.0, 0.0]
+    truck_halves = ([], [])
+    by_capacity = sorted(truck_idx, key=lambda i: -(data["trucks"][i]["capacity_weight"] or 0.0))
+    for i in by_capacity:
+        origin = _nearest_origin(data["trucks"][i])
+        if len(by_origin) > 1 and origin in by_origin:
+            home = 0 if origin in left_origins else 1
+        else:
+            home = 0 if demand[0] - supply[0] >= demand[1] - supply[1] else 1
+        if supply[home] >= demand[home] and supply[1 - home] < demand[1 - home]:
+            home = 1 - home
+        truck_halves[home].append(i)
+        supply[home] += data["trucks"][i]["capacity_weight"] or 0.0
+    return [(sorted(truck_halves[k]), sorted(halves[k])) for k in (0, 1)]
+
+
+def split_for_budget(data: dict, budget: int = None, encoding: str = None, part=None) -> list:
+    """
+    [(truck_idx, shipment_idx), ...] parts whose prompts each fit the token
+    budget. A problem that fits is returned as one part. `part` restricts
+    the split to those rows, e.g. one route_partitions partition.
+    """
+    budget = LLM_PROMPT_TOKEN_BUDGET if budget is None else budget
+    encoding = encoding or LLM_PROMPT_ENCODING
+
+    def tokens(truck_idx, shipment_idx):
+        if encoding == "compact":
+            return estimate_tokens(compact_payload(data, truck_idx, shipment_idx)[0], encoding)
+        return estimate_tokens(json_payload(data, truck_idx, shipment_idx), encoding)
+
+    pending = [part or (list(range(len(data["trucks"]))), list(range(len(data["shipments"]))))]
+    parts = []
+    while pending:
+        truck_idx, shipment_idx = pending.pop()
+        if len(shipment_idx) <= 1 or tokens(truck_idx, shipment_idx) <= budget:
+            parts.append((truck_idx, shipment_idx))
+            continue
+        pending.extend(half for half in _halves(data, truck_idx, shipment_idx) if half[1])
+    # Stable order: by first shipment
+    return sorted(parts, key=lambda part: part[1][0] if part[1] else -1)
@@ -0,0 +1,167 @@
+# query_plans.py
+#
+# Dumps EXPLAIN QUERY PLAN for the queries behind each endpoint and flags
+# full table scans on queries that are expected to use an index.
+#   python query_plans.py                # plans against a fresh in-memory schema
+#   python query_plans.py --url sqlite:///./shipments.db
+#   python query_plans.py --check        # exit 1 if an indexed query regressed
+#
+# Against a real file the plans follow its ANALYZE statistics, so a tiny
+# table may legitimately be scanned; --check is meant for the default schema.
+# tests/test_query_plans.py runs the same check under pytest.
+
+import argparse
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, func, or_, select, tuple_
+
+import models
+from listing import shipment_filters, truck_filters
+from route_insertion import fleet_headroom_query, lanes_at_query, unassigned_shipments_query
+from spatial import radius_prefilter
+from migrate import upgrade_schema
+
+_shipments = models.Shipment.__table__
+_trucks = models.Truck.__table__
+_assignments = models.TruckAssignment.__table__
+_jobs = models.Job.__table__
+_llm_cache = models.LLMCacheEntry.__table__
+
+
+def endpoint_queries():
+    """
+    (name, statement, full_scan_allowed) for every query an endpoint runs.
+    Scans are allowed only where the endpoint really reads the whole table.
+    """
+    return [
+        ("GET /shipments/no, POST /shipments/fill: needs geocoding",
+         select(_shipments).where(or_(
+             _shipments.c.origin_lat == None,  # noqa: E711
+             _shipments.c.origin_lng == None,  # noqa: E711
+             _shipments.c.destination_lat == None,  # noqa: E711
+             _shipments.c.destination_lng == None,  # noqa: E711
+         )), False),
+        ("GET /shipments/page: first page",
+         select(_shipments).order_by(_shipments.c.created_at, _shipments.c.shipment_id).limit(101), False),
+        ("GET /shipments/page: after cursor",
+         select(_shipments).where(
+             tuple_(_shipments.c.created_at, _shipments.c.shipment_id) > tuple_(datetime(2025, 1, 1), "x")
+         ).order_by(_shipments.c.created_at, _shipments.c.shipment_id).limit(101), False),
+        ("GET /shipments/page: status + delivery range",
+         select(_shipments).where(*shipment_filters(
+             status=models.ShipmentStatus.PENDING, delivery_from=date(2025, 1, 1), delivery_to=date(2025, 2, 1),
+         )), False),
+        ("GET /shipments/page: delivery range",
+         select(_shipments).where(*shipment_filters(delivery_from=date(2025, 1, 1), delivery_to=date(2025, 2, 1))),
+         False),
+        ("GET /shipments/page: by vehicle",
+         select(_shipments).where(*shipment_filters(vehicle_id="RJ14AB1234")), False),
+        ("POST /shipments/bulk/?mode=upsert: key probe",
+         select(_shipments.c.order_id, _shipments.c.customer_id, _shipments.c.shipment_id, _shipments.c.content_hash)
+         .where(_shipments.c.order_id.in_(["ORD-1", "ORD-2"])), False),
+        ("DELETE /shipments/{shipment_id}",
+         select(_shipments).where(_shipments.c.shipment_id == "x"), False),
+        ("top shipments by priority",
+         select(_shipments).order_by(_shipments.c.priority_score.desc()).limit(100), False),
+        ("GET /Trucks/page: by status",
+         select(_trucks).where(*truck_filters(status=models.TruckStatusEnum.available)), False),
+        ("DELETE /trucks/{truck_id}",
+         select(_trucks).where(_trucks.c.truck_id == "x"), False),
+        ("GET /trucks/{truck_id}/shipments",
+         select(_shipments).join(_assignments, _assignments.c.shipment_id == _shipments.c.shipment_id)
+         .where(_assignments.c.truck_id == "x"), False),
+        ("GET /trucks/{truck_id}/load",
+         select(models.TruckLoad.__table__).where(models.TruckLoad.__table__.c.truck_id == "x"), False),
+        ("assignments: trucks of shipments",
+         select(_assignments.c.truck_id).where(_assignments.c.shipment_id.in_(["x", "y"])), False),
+        ("GET /trucks/utilization",
+         select(_trucks, models.TruckLoad.__table__).select_from(_trucks.outerjoin(
+             models.TruckLoad.__table__, models.TruckLoad.__table__.c.truck_id == _trucks.c.truck_id
+         )), True),
+        ("GET /shipments/near: origin radius",
+         select(_shipments.c.shipment_id).where(radius_prefilter(
+             _shipments.c.origin_cell, _shipments.c.origin_lat, _shipments.c.origin_lng, 28.6, 77.2, 100
+         )), False),
+        ("GET /trucks/near: radius",
+         select(_trucks.c.truck_id).where(radius_prefilter(
+             _trucks.c.location_cell, _trucks.c.current_location_lat, _trucks.c.current_location_lng, 28.6, 77.2, 100
+         )), False),
+        ("GET /shipments/stream",
+         select(_shipments).order_by(_shipments.c.created_at, _shipments.c.shipment_id), False),
+        ("GET /shipments/",
+         select(_shipments), True),
+        ("POST /shipments/score/: bounds",
+         select(func.min(_shipments.c.value), func.max(_shipments.c.value)), True),
+        ("POST /delay/: lanes",
+         select(_shipments.c.shipment_id, _shipments.c.origin_address, _shipments.c.destination_address), True),
+        ("POST /jobs/*: active job of a kind",
+         select(_jobs).where(_jobs.c.kind == "fill", _jobs.c.status.in_(["queued", "running"])), False),
+        ("jobs worker: claim oldest queued",
+         select(_jobs.c.job_id).where(_jobs.c.status == "queued").order_by(_jobs.c.created_at).limit(5), False),
+        ("jobs worker: stale running jobs",
+         select(_jobs.c.job_id).where(_jobs.c.status == "running", _jobs.c.heartbeat_at < datetime(2025, 1, 1)),
+         False),
+        ("GET /jobs/",
+         select(_jobs).order_by(_jobs.c.created_at.desc()).limit(50), False),
+        ("llm_cache: least recently used first",
+         select(_llm_cache.c.cache_key, _llm_cache.c.size_bytes).order_by(_llm_cache.c.last_used_at), False),
+        ("llm_cache: expired entries",
+         select(_llm_cache.c.cache_key).where(_llm_cache.c.created_at < datetime(2025, 1, 1)), False),
+        ("POST /optimize-routes/?incremental=true: unassigned shipments", unassigned_shipments_query(), False),
+        ("POST /optimize-routes/?incremental=true: fleet headroom", fleet_headroom_query(), True),
+        # The origin city lives in JSON, so matching it reads every assignment
+        ("POST /optimize-routes/?incremental=true: lanes at origins", lanes_at_query(["delhi", "mumbai"]), True),
+    ]
+
+
+def explain(engine, statement) -> list:
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN shipments" reads every row; "SCAN shipments USING INDEX ..." walks an index in order
+    return detail.startswith("SCAN ") and "USING" not in detail and detail != "SCAN CONSTANT ROW"
+
+
+def collect_plans(engine) -> list:
+    """Returns [{"name", "plan", "full_scan", "allowed"}] for every endpoint query."""
+    results = []
+    for name, statement, allowed in endpoint_queries():
+        plan = explain(engine, statement)
+        full_scan = any(is_full_scan(d) for d in plan)
+        results.append({"name": name, "plan": plan, "full_scan": full_scan, "allowed": allowed})
+    return results
+
+
+def regressions(results) -> list:
+    return [r["name"] for r in results if r["full_scan"] and not r["allowed"]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dump EXPLAIN QUERY PLAN for endpoint queries.")
+    parser.add_argument("--url", default="sqlite://", help="database to explain against (default: in-memory)")
+    parser.add_argument("--check", action="store_true", help="exit 1 if an indexed query does a full scan")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    if engine.dialect.name != "sqlite":
+        sys.exit("EXPLAIN QUERY PLAN is SQLite-only.")
+    upgrade_schema(engine)
+
+    results = collect_plans(engine)
+    for r in results:
+        flag = "FULL SCAN" if r["full_scan"] else "indexed"
+        print(f"{r['name']}  [{flag}{' (expected)' if r['full_scan'] and r['allowed'] else ''}]")
+        for detail in r["plan"]:
+            print(f"    {detail}")
+
+    bad = regressions(results)
+    if bad:
+        print(f"\n{len(bad)} queries regressed to a full table scan:")
+        for name in bad:
+            print(f"  - {name}")
+    if args.check and bad:
+        sys.exit(1)
@@ -0,0 +1,266 @@
+# route_insertion.py
+#
+# Incremental re-optimization: the committed plan stays fixed and only
+# shipments without a truck (Shipment.vehicle_id IS NULL) are placed, each
+# on the feasible truck with the cheapest insertion given the headroom in
+# truck_loads:
+#   - a truck already loading at the shipment's origin city costs the km from
+#     the new drop-off to its nearest existing drop-off (0 for the same city)
+#   - an idle truck costs its deadhead to the origin plus ROUTE_INSERT_OPEN_KM,
+#     so filling trucks already on the road wins over opening new ones
+#   - trucks loading only at other origins are left alone
+# With neighbourhood=K, shipments that fit nowhere get a bounded repair: the
+# K trucks loading at their origin with the most room are re-planned together
+# with them by route_solver.solve_route_plan. The result is kept only if none
+# of those trucks' shipments is dropped.
+# Reads are the new shipments, one load row per truck and the lanes served at
+# the batch's origin cities, so the work follows the batch, not the plan.
+
+import math
+import os
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session
+
+import models
+from assignments import _city, assign_shipments
+from metrics import stage
+from route_solver import solve_route_plan
+from spatial import haversine_km
+
+# ===================== SETTINGS ===================== #
+# Cost of putting a new truck on the road, in km of detour
+ROUTE_INSERT_OPEN_KM = float(os.getenv("ROUTE_INSERT_OPEN_KM", "250"))
+# Detour assumed when a drop-off or truck has no coordinates
+ROUTE_INSERT_UNKNOWN_KM = float(os.getenv("ROUTE_INSERT_UNKNOWN_KM", "500"))
+MAX_NEIGHBOURHOOD = 50
+
+# Absolute slack for float summation noise, as in CapacityValidator
+TOLERANCE = 1e-6
+
+_assignments = models.TruckAssignment.__table__
+_loads = models.TruckLoad.__table__
+_shipments = models.Shipment.__table__
+_trucks = models.Truck.__table__
+
+
+def _key(city) -> str:
+    # Same normalization as assignments._city in SQL
+    return str(city or "").strip().lower()
+
+
+# ===================== QUERIES ===================== #
+def unassigned_shipments_query():
+    """Shipments on no truck; the vehicle_id index keeps this proportional to the batch."""
+    return (
+        select(models.Shipment)
+        .where(models.Shipment.vehicle_id.is_(None))
+        .where(~exists().where(_assignments.c.shipment_id == models.Shipment.shipment_id))
+        .order_by(models.Shipment.created_at, models.Shipment.shipment_id)
+    )
+
+
+def fleet_headroom_query():
+    """Every truck with its current load, one trucks LEFT JOIN truck_loads."""
+    return select(
+        _trucks.c.truck_id, _trucks.c.registration_number,
+        _trucks.c.current_location_lat, _trucks.c.current_location_lng,
+        _trucks.c.capacity_kg, _trucks.c.available_volume_cubic_m,
+        func.coalesce(_loads.c.shipment_count, 0), func.coalesce(_loads.c.weight_kg, 0.0),
+        func.coalesce(_loads.c.volume_cubic_m, 0.0),
+    ).select_from(_trucks.outerjoin(_loads, _loads.c.truck_id == _trucks.c.truck_id))
+
+
+def lanes_at_query(origin_keys):
+    """(truck_id, origin, destination, mean drop-off lat, lng) for trucks loading at these origin cities."""
+    origin = _city(_shipments.c.origin_address)
+    destination = _city(_shipments.c.destination_address)
+    return (
+        select(_assignments.c.truck_id, origin, destination,
+               func.avg(_shipments.c.destination_lat), func.avg(_shipments.c.destination_lng))
+        .join(_shipments, _shipments.c.shipment_id == _assignments.c.shipment_id)
+        .where(origin.in_(list(origin_keys)))
+        .group_by(_assignments.c.truck_id, origin, destination)
+    )
+
+
+# ===================== FLEET STATE ===================== #
+class _Truck:
+    """A truck's remaining room and the drop-offs it already makes per origin city."""
+
+    __slots__ = ("truck_id", "number", "lat", "lng", "free_weight", "free_volume", "loaded", "drops")
+
+    def __init__(self, row):
+        truck_id, number, lat, lng, capacity_kg, volume, count, weight_kg, volume_m3 = row
+        self.truck_id = truck_id
+        self.number = number
+        self.lat = np.nan if lat is None else lat
+        self.lng = np.nan if lng is None else lng
+        self.free_weight = (capacity_kg or 0.0) - weight_kg
+        # A truck without a declared volume is only constrained by weight
+        self.free_volume = math.inf if volume is None else volume - volume_m3
+        self.loaded = count > 0
+        self.drops = defaultdict(dict)  # origin -> {destination: (lat, lng)}
+
+    def fits(self, shipment) -> bool:
+        return (
+            (shipment.weight or 0.0) <= self.free_weight + TOLERANCE
+            and (shipment.volume or 0.0) <= self.free_volume + TOLERANCE
+        )
+
+    def add(self, shipment, origin, destination):
+        self.free_weight -= shipment.weight or 0.0
+        self.free_volume -= shipment.volume or 0.0
+        self.loaded = True
+        self.drops[origin].setdefault(destination, (shipment.destination_lat, shipment.destination_lng))
+
+
+def _drop_cost(truck, origin, destination, shipment) -> float:
+    drops = truck.drops[origin]
+    if destination in drops:
+        return 0.0
+    known = [p for p in drops.values() if p[0] is not None and p[1] is not None]
+    if not known or shipment.destination_lat is None or shipment.destination_lng is None:
+        return ROUTE_INSERT_UNKNOWN_KM
+    lats, lngs = np.array(known, dtype=np.float64).T
+    return float(haversine_km(shipment.destination_lat, shipment.destination_lng, lats, lngs).min())
+
+
+def _cheapest(shipment, origin, destination, serving, idle):
+    """(truck, cost) of the cheapest feasible insertion, or (None, inf)."""
+    best, best_cost = None, math.inf
+    for truck in serving:
+        if truck.fits(shipment):
+            cost = _drop_cost(truck, origin, destination, shipment)
+            if cost < best_cost or (cost == best_cost and truck.free_weight < best.free_weight):
+                best, best_cost = truck, cost
+
+    candidates = [t for t in idle if t.fits(shipment)]
+    if candidates:
+        if shipment.origin_lat is None or shipment.origin_lng is None:
+            deadhead = np.full(len(candidates), ROUTE_INSERT_UNKNOWN_KM)
+        else:
+            deadhead = haversine_km(shipment.origin_lat, shipment.origin_lng,
+                                    np.array([t.lat for t in candidates]), np.array([t.lng for t in candidates]))
+            deadhead = np.where(np.isnan(deadhead), ROUTE_INSERT_UNKNOWN_KM, deadhead)
+        # Nearest idle truck, the smallest that fits on ties
+        i = min(range(len(candidates)), key=lambda i: (deadhead[i], candidates[i].free_weight, candidates[i].number))
+        if ROUTE_INSERT_OPEN_KM + deadhead[i] < best_cost:
+            best, best_cost = candidates[i], ROUTE_INSERT_OPEN_KM + float(deadhead[i])
+    return best, best_cost
+
+
+# ===================== REPAIR ===================== #
+def _repair(db: Session, serving, leftovers, neighbourhood, repaired, pending) -> tuple:
+    """
+    Re-plans up to `neighbourhood` trucks loading at the leftovers' origin
+    together with the leftovers and what `pending` (truck_id -> shipments)
+    inserted on them this run. Returns (truck_id -> full shipment id list,
+    shipment id -> truck it was on) for an accepted re-plan, ({}, {}) if
+    it would drop a shipment or place none of the leftovers. Trucks in
+    `repaired` are not re-planned twice.
+    """
+    trucks = sorted((t for t in serving if t.truck_id not in repaired),
+                    key=lambda t: (-t.free_weight, t.number))[:neighbourhood]
+    if not trucks:
+        return {}, {}
+    truck_ids = [t.truck_id for t in trucks]
+    rows = db.scalars(select(models.Truck).where(models.Truck.truck_id.in_(truck_ids))).all()
+    current = db.execute(
+        select(models.Shipment, models.TruckAssignment.truck_id)
+        .join(models.TruckAssignment, models.TruckAssignment.shipment_id == models.Shipment.shipment_id)
+        .where(models.TruckAssignment.truck_id.in_(truck_ids))
+    ).all()
+    previous = {str(shipment.shipment_id): truck_id for shipment, truck_id in current}
+    carried = [shipment for shipment, _ in current] + [s for truck_id in truck_ids for s in pending.get(truck_id, [])]
+
+    plan = solve_route_plan(rows, carried + leftovers)
+    placed = {sid for entry in plan for sid in entry["shipment_ids"]}
+    if not {str(s.shipment_id) for s in carried} <= placed or not any(str(s.shipment_id) in placed for s in leftovers):
+        return {}, {}
+
+    repaired.update(truck_ids)
+    by_number = {t.number: t for t in trucks}
+    # Trucks the re-plan left empty get an empty list, replacing anything inserted earlier
+    replanned = {truck_id: [] for truck_id in truck_ids}
+    for entry in plan:
+        replanned[by_number[entry["truck_number"]].truck_id] = entry["shipment_ids"]
+    return replanned, previous
+
+
+# ===================== INSERTION ===================== #
+def insert_new_shipments(db: Session, neighbourhood: int = 0) -> list:
+    """
+    Places every unassigned shipment without moving committed ones (except
+    within a repair neighbourhood) and commits. Returns the assignments this
+    run wrote, as [{"truck_number", "shipment_ids"}].
+    """
+    neighbourhood = max(0, min(int(neighbourhood or 0), MAX_NEIGHBOURHOOD))
+    with stage("route_insert", "db_fetch"):
+        new = db.scalars(unassigned_shipments_query()).all()
+        if not new:
+            print("No unassigned shipments to insert.")
+            return []
+        fleet = [_Truck(row) for row in db.execute(fleet_headroom_query())]
+        by_id = {t.truck_id: t for t in fleet}
+        origins = {_key((s.origin_address or {}).get("city")) for s in new}
+        serving = defaultdict(list)
+        for truck_id, origin, destination, lat, lng in db.execute(lanes_at_query(origins)):
+            truck = by_id.get(truck_id)
+            if truck is None:
+                continue
+            if not truck.drops[origin]:
+                serving[origin].append(truck)
+            truck.drops[origin][destination] = (lat, lng)
+
+    with stage("route_insert", "insert"):
+        idle = [t for t in fleet if not t.loaded]
+        inserted = defaultdict(list)
+        pending = defaultdict(list)
+        leftovers = defaultdict(list)
+        # Heaviest first: they have the fewest trucks to choose from
+        for shipment in sorted(new, key=lambda s: (-(s.weight or 0.0), str(s.shipment_id))):
+            origin = _key((shipment.origin_address or {}).get("city"))
+            destination = _key((shipment.destination_address or {}).get("city"))
+            truck, _ = _cheapest(shipment, origin, destination, serving[origin], idle)
+            if truck is None:
+                leftovers[origin].append(shipment)
+                continue
+            if not truck.drops[origin]:
+                serving[origin].append(truck)
+            if truck in idle:
+                idle.remove(truck)
+            truck.add(shipment, origin, destination)
+            inserted[truck.truck_id].append(str(shipment.shipment_id))
+            pending[truck.truck_id].append(shipment)
+
+    plan = dict(inserted)
+    # Truck each re-planned shipment was on before, to report only what moved
+    previous = {}
+    unplaced = sum(len(group) for group in leftovers.values())
+    repaired_count = 0
+    if neighbourhood and unplaced:
+        with stage("route_insert", "repair"):
+            repaired = set()
+            for origin, group in leftovers.items():
+                replanned, was_on = _repair(db, serving[origin], group, neighbourhood, repaired, pending)
+                plan.update(replanned)
+                previous.update(was_on)
+                placed = {sid for ids in replanned.values() for sid in ids}
+                repaired_count += sum(str(s.shipment_id) in placed for s in group)
+            unplaced -= repaired_count
+
+    with stage("route_insert", "commit"):
+        assign_shipments(db, plan)
+        db.commit()
+
+    changes = []
+    for truck_id, shipment_ids in plan.items():
+        moved = [sid for sid in shipment_ids if previous.get(sid) != truck_id]
+        if moved:
+            changes.append({"truck_number": by_id[truck_id].number, "shipment_ids": moved})
+    print(f"➕ Inserted {len(new) - unplaced} of {len(new)} new shipments into {len(changes)} trucks "
+          f"({repaired_count} by repair); {unplaced} still unassigned")
+    return changes
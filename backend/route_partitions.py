@@ -0,0 +1,191 @@
+# route_partitions.py
+#
+# Decomposed route planning. Shipments are partitioned by origin city, or by
+# geographic cluster (origin cities within ROUTE_CLUSTER_KM of each other
+# share a partition), and every partition gets a share of the fleet sized to
+# its load, nearest trucks first. Trucks left once every partition is covered
+# stay in reserve. Partitions are solved independently and concurrently, see
+# llm.get_optimal_route_plan; route_solver.repair_plan then places leftover
+# shipments across partitions, on spare room or reserve trucks.
+# Partitions are (truck_idx, shipment_idx) lists of row indices, the same
+# shape prompt_encoding.split_for_budget uses.
+
+import math
+import multiprocessing
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from distance_matrix import centroids, distance_matrix
+from route_solver import _city_key, solve_route_plan
+
+# ===================== SETTINGS ===================== #
+# off (one problem), origin or cluster
+ROUTE_PARTITION = os.getenv("ROUTE_PARTITION", "off").lower()
+ROUTE_CLUSTER_KM = float(os.getenv("ROUTE_CLUSTER_KM", "150"))
+# Capacity a partition receives per unit of its load, for packing losses
+ROUTE_PARTITION_SLACK = float(os.getenv("ROUTE_PARTITION_SLACK", "1.25"))
+# Solver processes for solver="local"; 1 solves the parts one after another
+ROUTE_PARTITION_WORKERS = int(os.getenv("ROUTE_PARTITION_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Partition prompts in flight at once for solver="llm"
+ROUTE_PARTITION_LLM_CONCURRENCY = int(os.getenv("ROUTE_PARTITION_LLM_CONCURRENCY", "16"))
+
+PARTITION_MODES = ("off", "origin", "cluster")
+if ROUTE_PARTITION not in PARTITION_MODES:
+    raise ValueError(f"ROUTE_PARTITION must be one of {PARTITION_MODES}, got '{ROUTE_PARTITION}'")
+
+
+# ===================== SHIPMENT GROUPS ===================== #
+def _origin_groups(shipments) -> dict:
+    groups = defaultdict(list)
+    for j, s in enumerate(shipments):
+        groups[_city_key((s.origin_address or {}).get("city"))].append(j)
+    return groups
+
+
+def _clusters(points: np.ndarray, radius_km: float) -> list:
+    """Single linkage: points within radius_km of each other end up together."""
+    parent = list(range(len(points)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Unknown positions are NaN and never close to anything
+    matrix = distance_matrix(points, points)
+    for i, j in np.argwhere(matrix <= radius_km):
+        parent[find(i)] = find(j)
+    members = defaultdict(list)
+    for i in range(len(points)):
+        members[find(i)].append(i)
+    return list(members.values())
+
+
+def _shipment_partitions(shipments, by: str, radius_km: float) -> list:
+    groups = _origin_groups(shipments)
+    if by == "origin":
+        return [groups[key] for key in sorted(groups)]
+
+    cities, points = centroids({
+        key: [(shipments[j].origin_lat, shipments[j].origin_lng) for j in rows] for key, rows in groups.items()
+    })
+    return [
+        sorted(j for c in cluster for j in groups[cities[c]])
+        for cluster in sorted(_clusters(points, radius_km), key=lambda cluster: cities[cluster[0]])
+    ]
+
+
+# ===================== FLEET SHARES ===================== #
+def partition_problem(trucks, shipments, by: str = None, radius_km: float = None, slack: float = None):
+    """
+    Returns (parts, reserve): parts as (truck_idx, shipment_idx) pairs and
+    the indices of the trucks no partition needed. Trucks are handed out
+    nearest first until each partition holds `slack` times its weight and
+    volume; trucks without a position go to the partition furthest short.
+    """
+    by = by or ROUTE_PARTITION
+    radius_km = ROUTE_CLUSTER_KM if radius_km is None else radius_km
+    slack = ROUTE_PARTITION_SLACK if slack is None else slack
+    if by == "off":
+        return [(list(range(len(trucks))), list(range(len(shipments))))], []
+
+    shipment_parts = _shipment_partitions(shipments, by, radius_km)
+    if not shipment_parts:
+        return [], list(range(len(trucks)))
+    n_parts = len(shipment_parts)
+    demand_weight = np.array([sum(shipments[j].weight or 0.0 for j in part) for part in shipment_parts]) * slack
+    demand_volume = np.array([sum(shipments[j].volume or 0.0 for j in part) for part in shipment_parts]) * slack
+    _, part_points = centroids({
+        p: [(shipments[j].origin_lat, shipments[j].origin_lng) for j in part] for p, part in enumerate(shipment_parts)
+    })
+    deadhead = distance_matrix([(t.current_location_lat, t.current_location_lng) for t in trucks], part_points)
+
+    supply_weight = np.zeros(n_parts)
+    supply_volume = np.zeros(n_parts)
+    truck_parts = [[] for _ in range(n_parts)]
+    assigned = np.zeros(len(trucks), dtype=bool)
+
+    def short(p):
+        return not truck_parts[p] or supply_weight[p] < demand_weight[p] or supply_volume[p] < demand_volume[p]
+
+    def give(t, p):
+        truck = trucks[t]
+        truck_parts[p].append(t)
+        supply_weight[p] += truck.capacity_kg or 0.0
+        supply_volume[p] += math.inf if truck.available_volume_cubic_m is None else truck.available_volume_cubic_m
+        assigned[t] = True
+        if not short(p):
+            needy.discard(p)
+
+    needy = set(range(n_parts))
+    # Closest (truck, partition) pairs first; NaN distances sort last
+    for flat in np.argsort(deadhead, axis=None, kind="stable"):
+        if not needy:
+            break
+        t, p = divmod(int(flat), n_parts)
+        if assigned[t]:
+            continue
+        if np.isnan(deadhead[t, p]):
+            p = max(sorted(needy), key=lambda q: (demand_weight[q] - supply_weight[q]) / max(demand_weight[q], 1e-9))
+        if p in needy:
+            give(t, p)
+
+    parts = [(sorted(truck_parts[p]), shipment_parts[p]) for p in range(n_parts)]
+    return parts, [t for t in range(len(trucks)) if not assigned[t]]
+
+
+# ===================== LOCAL SOLVE ===================== #
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared solver processes, started on first use. Spawned, since the app process runs threads."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _plain_truck(truck):
+    return SimpleNamespace(
+        registration_number=truck.registration_number, capacity_kg=truck.capacity_kg,
+        available_volume_cubic_m=truck.available_volume_cubic_m,
+        current_location_lat=truck.current_location_lat, current_location_lng=truck.current_location_lng,
+    )
+
+
+def _plain_shipment(shipment):
+    return SimpleNamespace(
+        shipment_id=str(shipment.shipment_id), origin_address=shipment.origin_address,
+        destination_address=shipment.destination_address, weight=shipment.weight, volume=shipment.volume,
+        origin_lat=shipment.origin_lat, origin_lng=shipment.origin_lng,
+        destination_lat=shipment.destination_lat, destination_lng=shipment.destination_lng,
+    )
+
+
+def solve_partitions_local(trucks, shipments, parts, workers: int = None) -> list:
+    """
+    Runs route_solver.solve_route_plan on every part, in solver processes
+    when there is more than one part, and returns the concatenated plan.
+    Parts without trucks or shipments are skipped and left to repair_plan.
+    """
+    workers = ROUTE_PARTITION_WORKERS if workers is None else workers
+    # Plain rows: ORM objects do not travel to another process
+    jobs = [
+        ([_plain_truck(trucks[i]) for i in truck_idx], [_plain_shipment(shipments[j]) for j in shipment_idx])
+        for truck_idx, shipment_idx in parts
+        if truck_idx and shipment_idx
+    ]
+    if workers <= 1 or len(jobs) <= 1:
+        plans = [solve_route_plan(*job) for job in jobs]
+    else:
+        plans = list(_process_pool(workers).map(solve_route_plan, *zip(*jobs)))
+    return [entry for plan in plans for entry in plan]
@@ -0,0 +1,346 @@
+# route_solver.py
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from distance_matrix import centroids, distance_matrix
+
+
+# ===================== SOLVER INPUT ===================== #
+class _Stop:
+    """A shipment reduced to the fields the solver needs."""
+
+    __slots__ = ("id", "origin", "destination", "weight", "volume", "dest_lat", "dest_lng", "origin_lat", "origin_lng")
+
+    def __init__(self, shipment):
+        origin = shipment.origin_address or {}
+        destination = shipment.destination_address or {}
+        self.id = str(shipment.shipment_id)
+        self.origin = _city_key(origin.get("city"))
+        self.destination = _city_key(destination.get("city"))
+        self.weight = float(shipment.weight or 0.0)
+        self.volume = float(shipment.volume or 0.0)
+        self.origin_lat = getattr(shipment, "origin_lat", None)
+        self.origin_lng = getattr(shipment, "origin_lng", None)
+        self.dest_lat = getattr(shipment, "destination_lat", None)
+        self.dest_lng = getattr(shipment, "destination_lng", None)
+
+
+class _Load:
+    """A truck and the shipments currently packed on it."""
+
+    def __init__(self, truck, order):
+        self.order = order
+        self.truck_number = truck.registration_number
+        self.lat = getattr(truck, "current_location_lat", None)
+        self.lng = getattr(truck, "current_location_lng", None)
+        self.capacity_weight = float(truck.capacity_kg or 0.0)
+        # A truck without a declared volume is only constrained by weight
+        volume = truck.available_volume_cubic_m
+        self.capacity_volume = math.inf if volume is None else float(volume)
+        self.origin = None
+        self.stops = []
+        self.weight = 0.0
+        self.volume = 0.0
+
+    def fits(self, stop):
+        return (
+            self.weight + stop.weight <= self.capacity_weight
+            and self.volume + stop.volume <= self.capacity_volume
+        )
+
+    def add(self, stop):
+        if not self.stops:
+            self.origin = stop.origin
+        self.stops.append(stop)
+        self.weight += stop.weight
+        self.volume += stop.volume
+
+    def remove(self, stop):
+        self.stops.remove(stop)
+        # Re-sum instead of subtracting so the totals never drift from the stops
+        self.weight = sum(s.weight for s in self.stops)
+        self.volume = sum(s.volume for s in self.stops)
+        if not self.stops:
+            self.origin = None
+
+    def destinations(self):
+        return {s.destination for s in self.stops}
+
+    def headroom(self):
+        return self.capacity_weight - self.weight
+
+
+def _city_key(city) -> str:
+    return " ".join(str(city or "").split()).casefold()
+
+
+# ===================== SWEEP ORDERING ===================== #
+def _sweep_order(stops):
+    """
+    Orders the shipments of one origin so that nearby destinations are adjacent.
+    Destinations with coordinates are swept by bearing around the origin,
+    the rest are grouped by city name after them.
+    """
+    origin_coords = [(s.origin_lat, s.origin_lng) for s in stops if s.origin_lat is not None and s.origin_lng is not None]
+    dest_coords = [(s.dest_lat, s.dest_lng) for s in stops if s.dest_lat is not None and s.dest_lng is not None]
+    if origin_coords:
+        center_lat = sum(c[0] for c in origin_coords) / len(origin_coords)
+        center_lng = sum(c[1] for c in origin_coords) / len(origin_coords)
+    elif dest_coords:
+        center_lat = sum(c[0] for c in dest_coords) / len(dest_coords)
+        center_lng = sum(c[1] for c in dest_coords) / len(dest_coords)
+    else:
+        center_lat = center_lng = None
+
+    # Average bearing per destination city so a city's shipments stay together
+    bearing_sums = defaultdict(lambda: [0.0, 0.0])
+    for s in stops:
+        if center_lat is None or s.dest_lat is None or s.dest_lng is None:
+            continue
+        angle = math.atan2(s.dest_lat - center_lat, s.dest_lng - center_lng)
+        bearing_sums[s.destination][0] += math.sin(angle)
+        bearing_sums[s.destination][1] += math.cos(angle)
+    bearings = {city: math.atan2(y, x) for city, (y, x) in bearing_sums.items()}
+
+    def key(s):
+        bearing = bearings.get(s.destination)
+        if bearing is None:
+            return (1, 0.0, s.destination, -s.weight, s.id)
+        return (0, bearing, s.destination, -s.weight, s.id)
+
+    return sorted(stops, key=key)
+
+
+# ===================== CONSTRUCTION ===================== #
+def _pick_empty_truck(empty_loads, remaining_weight, remaining_volume, first_stop, deadhead):
+    """
+    Chooses the smallest idle truck that can take the rest of the origin group,
+    or the largest one if no single truck can. Among equally sized trucks the
+    one closest to the origin wins.
+    """
+    candidates = [l for l in empty_loads if l.fits(first_stop)]
+    if not candidates:
+        return None
+    whole = [l for l in candidates if l.capacity_weight >= remaining_weight and l.capacity_volume >= remaining_volume]
+    if whole:
+        return min(whole, key=lambda l: (l.capacity_weight, l.capacity_volume, deadhead(l, first_stop.origin), l.order))
+    return max(candidates, key=lambda l: (l.capacity_weight, l.capacity_volume, -deadhead(l, first_stop.origin), -l.order))
+
+
+def _best_fit(loads, stop):
+    """Returns the feasible truck that is left with the least weight headroom."""
+    best = None
+    for load in loads:
+        if load.fits(stop) and (best is None or load.headroom() < best.headroom()):
+            best = load
+    return best
+
+
+def _construct(loads, stops, deadhead):
+    by_origin = defaultdict(list)
+    for stop in stops:
+        by_origin[stop.origin].append(stop)
+
+    # Heaviest origins get first pick of the fleet
+    groups = sorted(by_origin.items(), key=lambda item: (-sum(s.weight for s in item[1]), item[0]))
+
+    empty = list(loads)
+    unassigned = []
+    for origin, group in groups:
+        ordered = _sweep_order(group)
+        remaining_weight = sum(s.weight for s in ordered)
+        remaining_volume = sum(s.volume for s in ordered)
+        open_loads = []
+        current = None
+
+        for stop in ordered:
+            target = None
+            if current is not None and current.fits(stop):
+                target = current
+            else:
+                target = _best_fit(open_loads, stop)
+            if target is None:
+                target = _pick_empty_truck(empty, remaining_weight, remaining_volume, stop, deadhead)
+                if target is not None:
+                    empty.remove(target)
+                    open_loads.append(target)
+            if target is None:
+                unassigned.append(stop)
+            else:
+                target.add(stop)
+                current = target
+            remaining_weight -= stop.weight
+            remaining_volume -= stop.volume
+
+    return unassigned
+
+
+# ===================== LOCAL SEARCH ===================== #
+def _consolidate_stops(loads):
+    """Moves a lone drop-off onto a same-origin truck that already visits that city."""
+    improved = False
+    by_origin = defaultdict(list)
+    for load in loads:
+        if load.stops:
+            by_origin[load.origin].append(load)
+
+    for group in by_origin.values():
+        if len(group) < 2:
+            continue
+        for load in group:
+            counts = defaultdict(int)
+            for s in load.stops:
+                counts[s.destination] += 1
+            for stop in [s for s in load.stops if counts[s.destination] == 1]:
+                for other in group:
+                    if other is load or not other.stops:
+                        continue
+                    if stop.destination in other.destinations() and other.fits(stop):
+                        load.remove(stop)
+                        other.add(stop)
+                        improved = True
+                        break
+    return improved
+
+
+def _close_trucks(loads):
+    """Empties lightly loaded trucks into the spare room of same-origin trucks."""
+    improved = False
+    for load in sorted([l for l in loads if l.stops], key=lambda l: (l.weight, l.order)):
+        if not load.stops:
+            continue
+        others = [l for l in loads if l is not load and l.stops and l.origin == load.origin]
+        if not others:
+            continue
+
+        # Tentatively place every shipment; roll back if any does not fit
+        moves = []
+        for stop in sorted(load.stops, key=lambda s: (-s.weight, s.id)):
+            same_city = [l for l in others if stop.destination in l.destinations()]
+            target = _best_fit(same_city, stop) or _best_fit(others, stop)
+            if target is None:
+                break
+            target.add(stop)
+            moves.append((stop, target))
+        else:
+            for stop, _ in moves:
+                load.remove(stop)
+            improved = True
+            continue
+
+        for stop, target in moves:
+            target.remove(stop)
+    return improved
+
+
+def _place_leftovers(loads, unassigned):
+    """Last resort for shipments that did not fit a truck of their own origin."""
+    still_unassigned = []
+    for stop in sorted(unassigned, key=lambda s: (-s.weight, s.id)):
+        same_origin = [l for l in loads if l.stops and l.origin == stop.origin]
+        target = _best_fit(same_origin, stop) or _best_fit([l for l in loads if not l.stops], stop) or _best_fit(loads, stop)
+        if target is None:
+            still_unassigned.append(stop)
+        else:
+            target.add(stop)
+    return still_unassigned
+
+
+# ===================== REPAIR ===================== #
+def repair_plan(trucks, shipments, route_plan):
+    """
+    Completes a plan merged from independently solved parts. Shipments it
+    leaves out go to spare room on trucks from the same origin, then to idle
+    trucks, then wherever they fit (see _place_leftovers). Entries for
+    unknown trucks and repeated shipments are dropped, and a shipment that
+    would overload its planned truck is treated as left out.
+    Returns (plan, shipments placed, shipments still unassigned).
+    """
+    loads = [_Load(truck, order) for order, truck in enumerate(trucks)]
+    by_number = {load.truck_number: load for load in loads}
+    stops = {}
+    for shipment in shipments:
+        stop = _Stop(shipment)
+        stops[stop.id] = stop
+
+    placed = set()
+    for entry in route_plan:
+        load = by_number.get(entry.get("truck_number"))
+        if load is None:
+            continue
+        for sid in entry.get("shipment_ids", []):
+            stop = stops.get(str(sid))
+            # Checked here too: a finalizer answer or overlapping parts can overload a truck
+            if stop is not None and stop.id not in placed and load.fits(stop):
+                load.add(stop)
+                placed.add(stop.id)
+
+    leftovers = [stop for sid, stop in stops.items() if sid not in placed]
+    unassigned = _place_leftovers(loads, leftovers)
+    plan = [
+        {"truck_number": load.truck_number, "shipment_ids": [s.id for s in load.stops]}
+        for load in loads
+        if load.stops
+    ]
+    return plan, len(leftovers) - len(unassigned), len(unassigned)
+
+
+# ===================== DEADHEAD ===================== #
+def _deadhead_lookup(loads, stops):
+    """
+    Returns deadhead(load, origin) -> km from the truck's current location to
+    the origin's centroid, from the shared distance matrix. Unknown positions
+    count as infinitely far so located trucks are preferred.
+    """
+    by_origin = defaultdict(list)
+    for stop in stops:
+        by_origin[stop.origin].append((stop.origin_lat, stop.origin_lng))
+    origins, origin_points = centroids(by_origin)
+    column = {origin: j for j, origin in enumerate(origins)}
+    matrix = distance_matrix([(l.lat, l.lng) for l in loads], origin_points)
+
+    def deadhead(load, origin):
+        km = matrix[load.order, column[origin]]
+        return math.inf if np.isnan(km) else float(km)
+
+    return deadhead
+
+
+# ===================== MAIN SOLVER ===================== #
+def solve_route_plan(trucks, shipments, max_iterations: int = 20):
+    """
+    Builds a route plan locally, without any LLM calls.
+
+    Shipments are grouped by origin city, swept by destination so nearby
+    drop-offs share a truck, and packed so that no truck ever exceeds its
+    weight or volume capacity. A local search then merges lone stops and
+    frees under-used trucks. Returns the same shape as the LLM planner:
+    [{"truck_number": "...", "shipment_ids": [...]}].
+    """
+    loads = [_Load(truck, order) for order, truck in enumerate(trucks)]
+    stops = [_Stop(s) for s in shipments]
+
+    unassigned = _construct(loads, stops, _deadhead_lookup(loads, stops))
+
+    for _ in range(max_iterations):
+        consolidated = _consolidate_stops(loads)
+        closed = _close_trucks(loads)
+        if not (consolidated or closed):
+            break
+
+    unassigned = _place_leftovers(loads, unassigned)
+    if unassigned:
+        print(f"Local solver could not place {len(unassigned)} shipments within truck capacity.")
+
+    for load in loads:
+        if load.weight > load.capacity_weight or load.volume > load.capacity_volume:
+            raise RuntimeError(f"Local solver overloaded truck {load.truck_number}.")
+
+    return [
+        {"truck_number": load.truck_number, "shipment_ids": [s.id for s in load.stops]}
+        for load in loads
+        if load.stops
+    ]
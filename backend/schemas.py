@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import Any, List, Optional, Literal
 from datetime import date, datetime
 from uuid import UUID
 
@@ -85,6 +85,23 @@ class Shipment(BaseModel):
     class Config:
         orm_mode = True
 
+class GeocodeLookupStats(BaseModel):
+    memory: int = 0
+    database: int = 0
+    api: int = 0
+    errors: int = 0
+
+class GeocodeThroughput(BaseModel):
+    unique_addresses: int
+    seconds: float
+    addresses_per_second: Optional[float] = None
+    skipped_addresses: int = 0
+
+class ShipmentFillResult(BaseModel):
+    updated_shipments: List[Shipment]
+    geocode_lookups: GeocodeLookupStats
+    throughput: Optional[GeocodeThroughput] = None
+
 class FixedWeightConfig(BaseModel):
     value: float = Field(..., ge=0, le=1)
     weight: float = Field(..., ge=0, le=1)
@@ -132,4 +149,55 @@ class Truckshow(BaseModel):
     driver_contact: Optional[str] = None
     status: Optional[str] = None
     truck_id: str
-    shipment_ids: str
\ No newline at end of file
+    shipment_ids: str
+
+class ShipmentPage(BaseModel):
+    items: List[Shipment]
+    next_cursor: Optional[str] = None
+
+class TruckPage(BaseModel):
+    items: List[Truckshow]
+    next_cursor: Optional[str] = None
+
+class TruckLoadOut(BaseModel):
+    truck_id: str
+    registration_number: str
+    shipment_count: int
+    stop_count: int
+    weight_kg: float
+    volume_cubic_m: float
+    capacity_kg: float
+    available_volume_cubic_m: Optional[float] = None
+    weight_utilization: Optional[float] = None
+    volume_utilization: Optional[float] = None
+
+class NearbyShipment(BaseModel):
+    distance_km: float
+    shipment: Shipment
+
+class NearbyTruck(BaseModel):
+    distance_km: float
+    truck: Truckshow
+
+class JobOut(BaseModel):
+    job_id: str
+    kind: str
+    params: dict
+    status: str
+    progress: float
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class JobSubmitted(BaseModel):
+    job: JobOut
+    deduplicated: bool  # True when the submit coalesced onto a queued or running job
+
+class JobResult(JobOut):
+    result: Optional[Any] = None
@@ -0,0 +1,176 @@
+# shipment_upsert.py
+
+import hashlib
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import Text, case, cast, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from assignments import refresh_loads_for_shipments
+import models
+from models import generate_uuid
+from priority_stats import STAT_COLUMNS, score_new_shipments, shrink_bounds
+from spatial import index_shipment
+
+# Natural key of a shipment as sent by upstream systems
+UPSERT_KEY = ("order_id", "customer_id")
+# Columns an upstream resend may change. Assignment (vehicle_id, carrier_id),
+# status and geocoding are owned by this service and are never overwritten.
+CONTENT_COLUMNS = (
+    "origin_address", "destination_address", "value", "weight", "volume",
+    "shelf_life_days", "delivery_date", "shipment_type", "regulatory_flags",
+    "pickup_time", "delivery_time",
+)
+# Bind parameters per probe query; stays under SQLite's default variable limit
+PROBE_CHUNK = 900
+KEY_INDEX = "uq_shipments_order_customer"
+
+# Database URLs already seen with the key index; it is never dropped once built
+_key_indexed = set()
+
+
+def content_hash(row: dict) -> str:
+    """sha256 over the key and CONTENT_COLUMNS of a validated ShipmentCreate dict."""
+    payload = {c: row.get(c) for c in UPSERT_KEY + CONTENT_COLUMNS}
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _existing_hashes(db: Session, keys) -> dict:
+    """
+    {(order_id, customer_id): (shipment_id, content_hash, scoring values)}
+    for the keys that exist; the scoring values (STAT_COLUMNS) are the row
+    as it was, for shrink_bounds.
+    """
+    table = models.Shipment.__table__
+    wanted = set(keys)
+    order_ids = sorted({order_id for order_id, _ in wanted})
+    found = {}
+    # SQLite scans for a row-value IN, so probe on the index prefix instead
+    # and match customer_id here; upstream order_ids are nearly unique.
+    for start in range(0, len(order_ids), PROBE_CHUNK):
+        statement = select(
+            table.c.order_id, table.c.customer_id, table.c.shipment_id, table.c.content_hash,
+            *(table.c[c] for c in STAT_COLUMNS),
+        ).where(table.c.order_id.in_(order_ids[start:start + PROBE_CHUNK]))
+        for order_id, customer_id, shipment_id, digest, *values in db.execute(statement):
+            if (order_id, customer_id) in wanted:
+                old = SimpleNamespace(**dict(zip(STAT_COLUMNS, values)))
+                found[(order_id, customer_id)] = (shipment_id, digest, old)
+    return found
+
+
+def _key_is_unique(db: Session) -> bool:
+    """
+    True once KEY_INDEX exists. migrate.py skips it while duplicate keys
+    remain (until `--dedupe`), and ON CONFLICT needs it as the target.
+    """
+    url = str(db.get_bind().url)
+    if url in _key_indexed:
+        return True
+    indexes = inspect(db.connection()).get_indexes(models.Shipment.__tablename__)
+    if not any(ix["name"] == KEY_INDEX and ix["unique"] for ix in indexes):
+        print(f"⚠️ {KEY_INDEX} is missing (duplicate shipments?); upserting on shipment_id. "
+              "Run `python migrate.py --dedupe` to build it.")
+        return False
+    _key_indexed.add(url)
+    return True
+
+
+def _upsert_statement(db: Session):
+    table = models.Shipment.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        statement = sqlite_insert(table)
+    elif dialect == "postgresql":
+        statement = postgresql_insert(table)
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {dialect}")
+
+    excluded = statement.excluded
+    values = {c: excluded[c] for c in CONTENT_COLUMNS}
+    values.update(content_hash=excluded.content_hash, priority_score=excluded.priority_score,
+                  updated_at=excluded.updated_at)
+    # Keep coordinates (and their grid cells) unless the address they were geocoded from changed
+    for prefix in ("origin", "destination"):
+        same_address = cast(table.c[f"{prefix}_address"], Text) == cast(excluded[f"{prefix}_address"], Text)
+        for axis in ("lat", "lng", "cell"):
+            column = f"{prefix}_{axis}"
+            values[column] = case(
+                (same_address, func.coalesce(excluded[column], table.c[column])), else_=excluded[column]
+            )
+
+    # Existing keys already carry their shipment_id from the probe, so the
+    # primary key is an equivalent target; only the natural key also stops
+    # two concurrent uploads from inserting the same new key twice
+    target = UPSERT_KEY if _key_is_unique(db) else ("shipment_id",)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c[k] for k in target],
+        set_=values,
+        # Replays of an unchanged row take no write at all
+        where=table.c.content_hash.is_distinct_from(excluded.content_hash),
+    )
+
+
+def upsert_shipments(db: Session, rows) -> dict:
+    """
+    Inserts new shipments and updates changed ones, keyed on
+    (order_id, customer_id). `rows` are validated ShipmentCreate dicts.
+    Returns {"inserted", "updated", "skipped"}, each a list of shipment IDs.
+    The caller commits.
+    """
+    # Last occurrence of a key within the batch wins
+    latest = {}
+    superseded = []
+    for row in rows:
+        key = tuple(row[k] for k in UPSERT_KEY)
+        if key in latest:
+            superseded.append(key)
+        latest[key] = row
+
+    existing = _existing_hashes(db, list(latest))
+    result = {"inserted": [], "updated": [], "skipped": []}
+    ids = {}
+    now = datetime.utcnow()
+    writes = []
+    previous = []
+    for key, row in latest.items():
+        row = index_shipment(dict(row))
+        row["content_hash"] = content_hash(row)
+        if key in existing:
+            shipment_id, digest, old = existing[key]
+            ids[key] = shipment_id
+            if digest == row["content_hash"]:
+                result["skipped"].append(shipment_id)
+                continue
+            row["shipment_id"] = shipment_id
+            result["updated"].append(shipment_id)
+            previous.append(old)
+        else:
+            row["shipment_id"] = ids[key] = generate_uuid()
+            row["created_at"] = now
+            result["inserted"].append(row["shipment_id"])
+        row["updated_at"] = now
+        writes.append(row)
+
+    if writes:
+        shipments = [SimpleNamespace(**row) for row in writes]
+        score_new_shipments(db, shipments)
+        for row, shipment in zip(writes, shipments):
+            row["priority_score"] = shipment.priority_score
+            row.setdefault("created_at", now)
+        db.execute(_upsert_statement(db), writes)
+        if result["updated"]:
+            # Updated rows may sit on a truck whose cached load is now stale
+            refresh_loads_for_shipments(db, result["updated"])
+            # score_new_shipments only widens the bounds; an old value that
+            # sat on a bound may have been its only holder
+            shrink_bounds(db, *previous)
+
+    # Earlier copies of a key repeated within the batch are superseded, not written
+    result["skipped"] += [ids[key] for key in superseded]
+    return result
@@ -0,0 +1,216 @@
+# spatial.py
+#
+# Uniform lat/lng grid over shipment and truck coordinates. Each point is
+# stored with an integer cell id (indexed), numbered row-major so the cells
+# of one grid row are contiguous. A radius query therefore becomes one
+# `cell BETWEEN a AND b` range per grid row, then a lat/lng bounding box,
+# then exact haversine on the survivors.
+
+import math
+import os
+
+import numpy as np
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+# ~28 km at the equator; a radius query touches about 2R / 28 + 1 grid rows
+SPATIAL_CELL_DEG = float(os.getenv("SPATIAL_CELL_DEG", "0.25"))
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = math.pi * EARTH_RADIUS_KM / 180
+# Half the Earth's circumference: every point is within this distance
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM
+
+_COLUMNS = int(math.ceil(360 / SPATIAL_CELL_DEG))
+_ROWS = int(math.ceil(180 / SPATIAL_CELL_DEG))
+
+
+# ===================== CELLS ===================== #
+def _row(lat: float) -> int:
+    return min(int((lat + 90) // SPATIAL_CELL_DEG), _ROWS - 1)
+
+
+def _col(lng: float) -> int:
+    return int(((lng + 180) % 360) // SPATIAL_CELL_DEG)
+
+
+def cell_of(lat, lng):
+    """Cell id of a point, or None if either coordinate is missing."""
+    if lat is None or lng is None:
+        return None
+    return _row(lat) * _COLUMNS + _col(lng)
+
+
+def index_shipment(shipment):
+    """Sets origin_cell/destination_cell on an ORM object, SimpleNamespace or dict row."""
+    if isinstance(shipment, dict):
+        shipment["origin_cell"] = cell_of(shipment.get("origin_lat"), shipment.get("origin_lng"))
+        shipment["destination_cell"] = cell_of(shipment.get("destination_lat"), shipment.get("destination_lng"))
+    else:
+        shipment.origin_cell = cell_of(shipment.origin_lat, shipment.origin_lng)
+        shipment.destination_cell = cell_of(shipment.destination_lat, shipment.destination_lng)
+    return shipment
+
+
+def index_truck(truck):
+    """Sets location_cell on an ORM object or dict row."""
+    if isinstance(truck, dict):
+        truck["location_cell"] = cell_of(truck.get("current_location_lat"), truck.get("current_location_lng"))
+    else:
+        truck.location_cell = cell_of(truck.current_location_lat, truck.current_location_lng)
+    return truck
+
+
+# ===================== DISTANCE ===================== #
+def haversine_km(lat, lng, lats, lngs) -> np.ndarray:
+    """Great-circle distance from one point to arrays of points, in km."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lngs, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# ===================== PREFILTER ===================== #
+def bounding_box(lat: float, lng: float, radius_km: float):
+    """
+    (lat_min, lat_max, [(lng_min, lng_max), ...]) covering the radius; the
+    longitude span is split in two where it crosses the antimeridian.
+    """
+    dlat = radius_km / KM_PER_DEG_LAT
+    lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    widest = max(abs(lat_min), abs(lat_max))
+    if widest >= 90.0 or radius_km >= MAX_RADIUS_KM:
+        return lat_min, lat_max, [(-180.0, 180.0)]
+    dlng = radius_km / (KM_PER_DEG_LAT * math.cos(math.radians(widest)))
+    if dlng >= 180:
+        return lat_min, lat_max, [(-180.0, 180.0)]
+    lo, hi = lng - dlng, lng + dlng
+    if lo < -180:
+        return lat_min, lat_max, [(lo + 360, 180.0), (-180.0, hi)]
+    if hi > 180:
+        return lat_min, lat_max, [(lo, 180.0), (-180.0, hi - 360)]
+    return lat_min, lat_max, [(lo, hi)]
+
+
+def radius_prefilter(cell_column, lat_column, lng_column, lat: float, lng: float, radius_km: float):
+    """SQL condition: grid-row cell ranges (index) AND the exact bounding box."""
+    lat_min, lat_max, spans = bounding_box(lat, lng, radius_km)
+    if radius_km >= MAX_RADIUS_KM:
+        return lat_column.isnot(None)
+    ranges = []
+    for row in range(_row(lat_min), _row(lat_max) + 1):
+        for lng_min, lng_max in spans:
+            first = _col(lng_min)
+            last = _col(lng_max) if lng_max < 180 else _COLUMNS - 1
+            ranges.append(cell_column.between(row * _COLUMNS + first, row * _COLUMNS + last))
+    box = [lat_column.between(lat_min, lat_max)]
+    if spans != [(-180.0, 180.0)]:
+        box.append(or_(*(lng_column.between(lo, hi) for lo, hi in spans)))
+    return and_(or_(*ranges), *box)
+
+
+# ===================== QUERIES ===================== #
+def _columns(end: str):
+    table = models.Shipment.__table__
+    if end not in ("origin", "destination"):
+        raise ValueError("end must be 'origin' or 'destination'")
+    return table.c[f"{end}_cell"], table.c[f"{end}_lat"], table.c[f"{end}_lng"]
+
+
+def _refine(rows, lat, lng, radius_km, limit=None):
+    """rows are (key, lat, lng); returns [(key, distance_km)] nearest first."""
+    if not rows:
+        return []
+    distances = haversine_km(lat, lng, [r[1] for r in rows], [r[2] for r in rows])
+    order = np.argsort(distances, kind="stable")
+    hits = [(rows[i][0], float(distances[i])) for i in order if distances[i] <= radius_km]
+    return hits[:limit] if limit else hits
+
+
+def shipments_within(db: Session, lat: float, lng: float, radius_km: float, end: str = "origin",
+                     limit: int = None, status=None) -> list:
+    """[(shipment, distance_km)] whose `end` point lies within radius_km, nearest first."""
+    cell, lat_column, lng_column = _columns(end)
+    table = models.Shipment.__table__
+    statement = select(table.c.shipment_id, lat_column, lng_column).where(
+        radius_prefilter(cell, lat_column, lng_column, lat, lng, radius_km)
+    )
+    if status is not None:
+        statement = statement.where(table.c.shipment_status == status)
+    hits = _refine(db.execute(statement).all(), lat, lng, radius_km, limit)
+    return _load(db, models.Shipment, models.Shipment.shipment_id, hits)
+
+
+def trucks_within(db: Session, lat: float, lng: float, radius_km: float, limit: int = None, status=None) -> list:
+    """[(truck, distance_km)] currently within radius_km, nearest first."""
+    table = models.Truck.__table__
+    statement = select(table.c.truck_id, table.c.current_location_lat, table.c.current_location_lng).where(
+        radius_prefilter(table.c.location_cell, table.c.current_location_lat, table.c.current_location_lng,
+                   lat, lng, radius_km)
+    )
+    if status is not None:
+        statement = statement.where(table.c.status == status)
+    hits = _refine(db.execute(statement).all(), lat, lng, radius_km, limit)
+    return _load(db, models.Truck, models.Truck.truck_id, hits)
+
+
+def _load(db: Session, model, key_column, hits) -> list:
+    keys = [k for k, _ in hits]
+    objects = {}
+    # Chunked to stay under SQLite's bind-parameter limit
+    for start in range(0, len(keys), 900):
+        for o in db.query(model).filter(key_column.in_(keys[start:start + 900])):
+            objects[getattr(o, key_column.key)] = o
+    return [(objects[k], d) for k, d in hits if k in objects]
+
+
+def _nearest(search, db: Session, lat: float, lng: float, k: int, **kwargs) -> list:
+    """
+    k nearest via an expanding radius: starts at one cell and doubles until
+    k hits are found inside the searched radius, so none can be missed.
+    """
+    radius = SPATIAL_CELL_DEG * KM_PER_DEG_LAT
+    while True:
+        hits = search(db, lat, lng, radius, limit=k, **kwargs)
+        if len(hits) >= k or radius >= MAX_RADIUS_KM:
+            return hits
+        radius = min(radius * 2, MAX_RADIUS_KM)
+
+
+def nearest_shipments(db: Session, lat: float, lng: float, k: int, end: str = "origin", status=None) -> list:
+    return _nearest(shipments_within, db, lat, lng, k, end=end, status=status)
+
+
+def nearest_trucks(db: Session, lat: float, lng: float, k: int, status=None) -> list:
+    return _nearest(trucks_within, db, lat, lng, k, status=status)
+
+
+# ===================== BACKFILL ===================== #
+def reindex_all(bind) -> int:
+    """Recomputes every cell column from the stored coordinates. Returns rows updated."""
+    shipments = models.Shipment.__table__
+    trucks = models.Truck.__table__
+    updated = 0
+    with bind.begin() as conn:
+        rows = conn.execute(select(
+            shipments.c.shipment_id, shipments.c.origin_lat, shipments.c.origin_lng,
+            shipments.c.destination_lat, shipments.c.destination_lng,
+        )).all()
+        if rows:
+            conn.execute(
+                update(shipments).where(shipments.c.shipment_id == bindparam("key")).values(
+                    origin_cell=bindparam("origin_cell"), destination_cell=bindparam("destination_cell")
+                ),
+                [{"key": r[0], "origin_cell": cell_of(r[1], r[2]), "destination_cell": cell_of(r[3], r[4])}
+                 for r in rows],
+            )
+            updated += len(rows)
+        rows = conn.execute(select(trucks.c.truck_id, trucks.c.current_location_lat, trucks.c.current_location_lng)).all()
+        if rows:
+            conn.execute(
+                update(trucks).where(trucks.c.truck_id == bindparam("key")).values(location_cell=bindparam("location_cell")),
+                [{"key": r[0], "location_cell": cell_of(r[1], r[2])} for r in rows],
+            )
+            updated += len(rows)
+    return updated
@@ -0,0 +1,84 @@
+# tests/conftest.py
+#
+# Every test module shares one throwaway SQLite database, created before
+# the backend modules are imported (they read DATABASE_URL at import time).
+# Run from the backend directory:
+#   python -m pytest -q
+
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_workdir = tempfile.mkdtemp(prefix="backend_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["JOB_WORKERS"] = "0"
+os.environ["DB_MIGRATE_ON_STARTUP"] = "false"
+
+import models  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from migrate import upgrade_schema  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def schema():
+    upgrade_schema(engine)
+    return engine
+
+
+@pytest.fixture
+def db(schema):
+    """A session on an empty schema; every table is wiped afterwards."""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(models.Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
+
+
+@pytest.fixture
+def without_key_index(db, monkeypatch):
+    """The schema as migrate.py leaves it while duplicate (order_id, customer_id) keys exist."""
+    import shipment_upsert
+
+    monkeypatch.setattr(shipment_upsert, "_key_indexed", set())
+    db.execute(text(f"DROP INDEX {shipment_upsert.KEY_INDEX}"))
+    db.commit()
+    yield db
+    db.rollback()
+    db.execute(models.Shipment.__table__.delete())
+    db.commit()
+    index = next(ix for ix in models.Shipment.__table__.indexes if ix.name == shipment_upsert.KEY_INDEX)
+    index.create(bind=db.get_bind())
+
+
+def make_truck(number: str, capacity_kg: float, lat=None, lng=None, volume=None) -> models.Truck:
+    return models.Truck(
+        truck_id=number, registration_number=number, capacity_kg=capacity_kg,
+        available_volume_cubic_m=volume, current_location_lat=lat, current_location_lng=lng,
+    )
+
+
+def _address(city: str) -> dict:
+    return {"street": "1 Main Road", "city": city, "state": "MH", "pincode": "400001", "country": "India"}
+
+
+def make_shipment(shipment_id: str, weight: float, origin="Pune", destination="Mumbai", volume=1.0,
+                  origin_at=(18.52, 73.86), destination_at=(19.08, 72.88)) -> models.Shipment:
+    return models.Shipment(
+        shipment_id=shipment_id, order_id=shipment_id, customer_id="C1",
+        origin_address=_address(origin), destination_address=_address(destination),
+        value=100.0, weight=weight, volume=volume, shelf_life_days=10, delivery_date=date(2030, 1, 1),
+        shipment_type="normal", origin_lat=origin_at[0], origin_lng=origin_at[1],
+        destination_lat=destination_at[0], destination_lng=destination_at[1],
+    )
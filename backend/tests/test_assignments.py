@@ -0,0 +1,50 @@
+# tests/test_assignments.py
+
+from fastapi.testclient import TestClient
+
+import models
+from assignments import fleet_utilization
+from conftest import make_shipment, make_truck
+from llm import apply_route_plan
+
+
+def _state(db):
+    db.expire_all()
+    vehicles = {s.shipment_id: s.vehicle_id for s in db.query(models.Shipment)}
+    assigned = {a.shipment_id: a.truck_id for a in db.query(models.TruckAssignment)}
+    loads = {l.truck_id: l.weight_kg for l in db.query(models.TruckLoad)}
+    return vehicles, assigned, loads
+
+
+def test_replan_releases_shipments_the_plan_leaves_out(db):
+    truck = make_truck("T1", 100.0)
+    a, b = make_shipment("A", 60.0), make_shipment("B", 90.0)
+    db.add_all([truck, a, b])
+    db.commit()
+
+    apply_route_plan(db, [{"truck_number": "T1", "shipment_ids": ["A"]}], {"A": a}, {"T1": truck})
+    apply_route_plan(db, [{"truck_number": "T1", "shipment_ids": ["B"]}], {"A": a, "B": b}, {"T1": truck})
+
+    vehicles, assigned, loads = _state(db)
+    assert vehicles == {"A": None, "B": "T1"}
+    assert assigned == {"B": "T1"}
+    assert loads == {"T1": 90.0}
+
+
+def test_replan_endpoint_never_overloads_a_truck(db):
+    db.add_all([make_truck("T1", 100.0, lat=18.52, lng=73.86), make_shipment("A", 60.0)])
+    db.commit()
+
+    import main
+
+    with TestClient(main.app) as client:
+        assert client.post("/optimize-routes/?solver=local").status_code == 200
+        db.add(make_shipment("B", 90.0))
+        db.commit()
+        assert client.post("/optimize-routes/?solver=local").status_code == 200
+
+    vehicles, assigned, loads = _state(db)
+    assert sum(v == "T1" for v in vehicles.values()) == 1
+    assert set(assigned) == {s for s, v in vehicles.items() if v == "T1"}
+    assert loads["T1"] <= 100.0
+    assert all(row["weight_utilization"] <= 1.0 for row in fleet_utilization(db))
@@ -0,0 +1,50 @@
+# tests/test_batch_geocoder.py
+
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import models
+from batch_geocoder import TokenBucket, fill_missing_coordinates
+from conftest import make_shipment
+from database import AsyncSessionLocal
+
+
+class _EveryAddressGeocoder:
+    def __init__(self):
+        self.asked = []
+
+    async def geocode_many(self, addresses, db, stats=None, progress=None):
+        self.asked.extend(addresses)
+        return {address: {"lat": 20.0, "lng": 75.0} for address in addresses}
+
+
+def test_incomplete_addresses_are_skipped_not_fatal(db):
+    broken = make_shipment("A", 10.0, origin_at=(None, None))
+    broken.origin_address = {"city": "Pune"}
+    db.add_all([broken, make_shipment("B", 10.0, origin_at=(None, None))])
+    db.commit()
+    geocoder = _EveryAddressGeocoder()
+
+    async def fill():
+        async with AsyncSessionLocal() as session:
+            shipments = (await session.scalars(select(models.Shipment))).all()
+            result = await fill_missing_coordinates(session, shipments, geocoder)
+            await session.commit()
+            return result
+
+    result = asyncio.run(fill())
+
+    assert result["updated_ids"] == ["B"]
+    assert result["throughput"]["skipped_addresses"] == 1
+    assert geocoder.asked == ["1 Main Road, Pune, MH, 400001, India"]
+    db.expire_all()
+    assert db.get(models.Shipment, "B").origin_lat == 20.0
+    assert db.get(models.Shipment, "A").origin_lat is None
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_token_bucket_rejects_non_positive_rates(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
@@ -0,0 +1,19 @@
+# tests/test_capacity_validator.py
+
+from capacity_validator import CapacityValidator
+from conftest import make_shipment, make_truck
+
+
+def test_non_string_truck_numbers_are_unknown_trucks():
+    validator = CapacityValidator([make_truck("T1", 100.0)], [make_shipment("A", 60.0)])
+    plan = [
+        {"truck_number": ["T1"], "shipment_ids": ["A"]},
+        {"truck_number": {"number": "T1"}, "shipment_ids": ["A"]},
+        {"truck_number": "T1", "shipment_ids": ["A"]},
+    ]
+
+    result = validator.validate(plan)
+
+    assert result["status"] == "invalid_plan"
+    assert result["unknown_trucks"] == [["T1"], {"number": "T1"}]
+    assert result["duplicate_shipments"] == []
@@ -0,0 +1,52 @@
+# tests/test_listing.py
+
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import schemas
+from assignments import assign_shipments
+from conftest import make_shipment, make_truck
+from listing import decode_cursor
+
+
+@pytest.fixture
+def client(db):
+    db.add_all([make_truck("T1", 100.0), make_truck("T2", 100.0), make_shipment("A", 10.0), make_shipment("B", 20.0)])
+    db.flush()
+    assign_shipments(db, {"T1": ["A", "B"]})
+    db.commit()
+    with TestClient(main.app) as client:
+        yield client
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_streams_have_the_paged_record_shape(client):
+    shipments = _lines(client.get("/shipments/stream"))
+    assert [set(r) for r in shipments] == [set(item) for item in client.get("/shipments/page").json()["items"]]
+    assert set(shipments[0]) <= set(schemas.Shipment.__fields__)
+    assert not {"content_hash", "origin_cell", "destination_cell"} & set(shipments[0])
+
+    trucks = _lines(client.get("/Trucks/stream"))
+    assert trucks == client.get("/Trucks/page").json()["items"]
+
+
+def _cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize("values", [[1, "x"], ["2025-01-01T00:00:00", None], ["a"], {"a": 1}, "x"])
+def test_crafted_cursors_are_rejected_with_400(client, values):
+    assert client.get("/shipments/page", params={"cursor": _cursor(values)}).status_code == 400
+
+
+def test_issued_cursors_decode():
+    assert decode_cursor(_cursor(["2025-01-01T00:00:00", "A"]), 2) == ["2025-01-01T00:00:00", "A"]
+    with pytest.raises(ValueError):
+        decode_cursor(_cursor([5]), 1)
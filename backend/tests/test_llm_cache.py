@@ -0,0 +1,86 @@
+# tests/test_llm_cache.py
+
+import asyncio
+import json
+import os
+import sys
+
+import llm
+from conftest import make_shipment, make_truck
+from database import AsyncSessionLocal
+from llm_cache import cached_generate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from stub_llm import StubGenerativeModel  # noqa: E402
+
+
+def _generate(responses):
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        return responses[len(calls) - 1]
+    return generate, calls
+
+
+def test_rejected_responses_are_not_cached(db):
+    generate, calls = _generate(["bad", "good", "unused"])
+    accept = lambda response: response == "good"  # noqa: E731
+
+    assert asyncio.run(cached_generate("m", "sys", {"q": 1}, generate, accept=accept)) == "bad"
+    assert asyncio.run(cached_generate("m", "sys", {"q": 1}, generate, accept=accept)) == "good"
+    assert asyncio.run(cached_generate("m", "sys", {"q": 1}, generate, accept=accept)) == "good"
+    assert len(calls) == 2
+
+
+def test_cached_response_that_is_no_longer_accepted_is_evicted(db):
+    generate, calls = _generate(["old", "new"])
+    asyncio.run(cached_generate("m", "sys", "p", generate))
+    assert asyncio.run(cached_generate("m", "sys", "p", generate, accept=lambda r: r != "old")) == "new"
+    assert asyncio.run(cached_generate("m", "sys", "p", generate)) == "new"
+    assert len(calls) == 2
+
+
+def test_overloaded_plans_reach_the_planner_on_every_attempt(db, monkeypatch):
+    db.add_all([make_truck("T1", 100.0, lat=18.52, lng=73.86), make_shipment("A", 60.0), make_shipment("B", 90.0)])
+    db.commit()
+    # Always both shipments on the one truck: 150 kg on 100 kg
+    planner = StubGenerativeModel(lambda prompt: json.dumps([{"t": 1, "s": [1, 2]}]))
+    monkeypatch.setattr(llm, "get_agent", lambda agent: planner)
+
+    async def optimize():
+        async with AsyncSessionLocal() as session:
+            return await llm.get_optimal_route_plan(session, solver="llm", encoding="compact", partition="off")
+
+    assert asyncio.run(optimize()) is None
+    assert planner.calls == 10
+    assert asyncio.run(optimize()) is None
+    assert planner.calls == 20
+
+
+def test_overloaded_finalizer_answer_is_not_cached_or_committed(db, monkeypatch):
+    db.add_all([make_truck("T1", 100.0, lat=18.52, lng=73.86), make_truck("T2", 100.0, lat=18.52, lng=73.86),
+                make_shipment("A", 60.0), make_shipment("B", 90.0)])
+    db.commit()
+    planner = StubGenerativeModel(lambda prompt: json.dumps([{"t": 1, "s": [1]}, {"t": 2, "s": [2]}]))
+    finalizer = StubGenerativeModel(lambda prompt: json.dumps([{"t": 1, "s": [1, 2]}]))
+    monkeypatch.setattr(llm, "get_agent", lambda agent: finalizer if agent == "finalizer" else planner)
+
+    async def optimize():
+        async with AsyncSessionLocal() as session:
+            return await llm.get_optimal_route_plan(session, solver="llm", encoding="compact", partition="off")
+
+    for _ in range(2):
+        plan = asyncio.run(optimize())
+        assert sorted((e["truck_number"], e["shipment_ids"]) for e in plan) == [("T1", ["A"]), ("T2", ["B"])]
+    assert (planner.calls, finalizer.calls) == (1, 2)
+
+
+def test_malformed_delay_answer_is_not_cached(db, monkeypatch):
+    import shipment_delay_checker
+
+    model = StubGenerativeModel(lambda prompt: "Sorry, I cannot browse right now.")
+    monkeypatch.setattr(shipment_delay_checker, "get_model", lambda: model)
+    for _ in range(2):
+        assert asyncio.run(shipment_delay_checker.call_gemini_with_web("lanes")) == "Sorry, I cannot browse right now."
+    assert model.calls == 2
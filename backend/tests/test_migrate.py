@@ -0,0 +1,25 @@
+# tests/test_migrate.py
+
+from datetime import datetime
+
+import models
+from assignments import assign_shipments
+from conftest import make_shipment, make_truck
+from migrate import dedupe_shipments
+
+
+def test_dedupe_removes_the_losers_assignments_and_loads(without_key_index, schema):
+    db = without_key_index
+    keep, loser = make_shipment("KEEP", 40.0), make_shipment("LOSE", 30.0)
+    loser.order_id = keep.order_id
+    keep.created_at, loser.created_at = datetime(2025, 1, 1), datetime(2025, 1, 2)
+    db.add_all([make_truck("T1", 100.0), make_truck("T2", 100.0), keep, loser])
+    db.flush()
+    assign_shipments(db, {"T1": ["KEEP"], "T2": ["LOSE"]})
+    db.commit()
+
+    assert dedupe_shipments(schema) == 1
+
+    db.expire_all()
+    assert {a.shipment_id for a in db.query(models.TruckAssignment)} == {"KEEP"}
+    assert {l.truck_id: l.weight_kg for l in db.query(models.TruckLoad)} == {"T1": 40.0}
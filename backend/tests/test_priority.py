@@ -0,0 +1,31 @@
+# tests/test_priority.py
+
+from datetime import date, timedelta
+
+import pytest
+
+import models
+import priority_stats
+from conftest import make_shipment
+
+WEIGHTS = {"value": 0.1, "weight": 0.3, "volume": 0.2, "shelf_life_days": 0.25, "days_to_delivery": 0.15}
+
+
+def test_set_based_and_incremental_scores_agree(db):
+    shipments = []
+    for i in range(20):
+        shipment = make_shipment(f"S{i}", weight=10.0 + 7 * i, volume=1.0 + (i % 5))
+        shipment.value = 100.0 * ((i * 37) % 11)
+        shipment.shelf_life_days = 1 + (i * 13) % 30
+        shipment.delivery_date = date.today() + timedelta(days=(i * 7) % 20)
+        shipments.append(shipment)
+    db.add_all(shipments + [models.WeightConfig(feature_name=k, weight_value=v) for k, v in WEIGHTS.items()])
+    db.commit()
+
+    fbounds = priority_stats.feature_bounds(priority_stats.recompute_bounds(db))
+    incremental = [priority_stats.score_shipment(s, fbounds, WEIGHTS) for s in shipments]
+
+    db.execute(priority_stats.score_update_statement(db, fbounds, WEIGHTS))
+    db.expire_all()
+    assert [db.get(models.Shipment, s.shipment_id).priority_score for s in shipments] == \
+        pytest.approx(incremental, abs=1e-9)
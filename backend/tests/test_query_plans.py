@@ -0,0 +1,26 @@
+# tests/test_query_plans.py
+
+import pytest
+from sqlalchemy import create_engine
+
+from migrate import upgrade_schema
+from query_plans import collect_plans, endpoint_queries, explain, is_full_scan
+
+
+@pytest.fixture(scope="module")
+def plan_engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    upgrade_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name,statement,allowed", endpoint_queries(), ids=[q[0] for q in endpoint_queries()])
+def test_indexed_queries_do_not_scan(plan_engine, name, statement, allowed):
+    plan = explain(plan_engine, statement)
+    if not allowed:
+        assert not any(is_full_scan(detail) for detail in plan), "\n".join(plan)
+
+
+def test_every_query_is_explained(plan_engine):
+    assert all(r["plan"] for r in collect_plans(plan_engine))
@@ -0,0 +1,28 @@
+# tests/test_route_solver.py
+
+from capacity_validator import CapacityValidator
+from conftest import make_shipment, make_truck
+from route_solver import repair_plan
+
+
+def test_repair_rejects_entries_that_overload_a_truck():
+    trucks = [make_truck("T1", 100.0, lat=18.52, lng=73.86), make_truck("T2", 100.0, lat=18.52, lng=73.86)]
+    shipments = [make_shipment("A", 60.0), make_shipment("B", 90.0)]
+    # Two parts both claimed T1
+    merged = [{"truck_number": "T1", "shipment_ids": ["A"]}, {"truck_number": "T1", "shipment_ids": ["B"]}]
+
+    plan, placed, unassigned = repair_plan(trucks, shipments, merged)
+
+    assert (placed, unassigned) == (1, 0)
+    assert sorted(sid for entry in plan for sid in entry["shipment_ids"]) == ["A", "B"]
+    assert CapacityValidator(trucks, shipments).validate(plan)["status"] == "validated"
+
+
+def test_repair_leaves_unassigned_what_fits_nowhere():
+    trucks = [make_truck("T1", 100.0)]
+    shipments = [make_shipment("A", 60.0), make_shipment("B", 90.0)]
+
+    plan, placed, unassigned = repair_plan(trucks, shipments, [{"truck_number": "T1", "shipment_ids": ["A", "B"]}])
+
+    assert plan == [{"truck_number": "T1", "shipment_ids": ["A"]}]
+    assert (placed, unassigned) == (0, 1)
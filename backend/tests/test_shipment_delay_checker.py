@@ -0,0 +1,37 @@
+# tests/test_shipment_delay_checker.py
+
+import asyncio
+import json
+
+import models
+import shipment_delay_checker
+from conftest import make_shipment
+from database import AsyncSessionLocal
+
+
+def test_echoed_shipment_id_cannot_redirect_the_write(db, monkeypatch):
+    db.add_all([make_shipment("A", 10.0), make_shipment("B", 10.0, origin="Delhi", destination="Jaipur")])
+    db.commit()
+
+    async def answer(prompt, refresh=False):
+        lanes = json.loads(prompt[prompt.index("["):prompt.rindex("]") + 1])
+        return json.dumps([{
+            "lane_id": lane["lane_id"], "shipment_id": "B", "possible_delay_reason": "strike",
+            "estimated_delay_hours": 4, "normal_duration_hours": 10, "expected_duration_hours": 14, "note": "x",
+        } for lane in lanes])
+
+    monkeypatch.setattr(shipment_delay_checker, "call_gemini_with_web", answer)
+    monkeypatch.setattr(shipment_delay_checker.lane_cache, "get", lambda lane: None)
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return await shipment_delay_checker.assess_shipment_delays(session)
+
+    results = asyncio.run(run())
+    assert sorted(r["shipment_id"] for r in results) == ["A", "B"]
+    db.expire_all()
+    for shipment in db.query(models.Shipment):
+        info = json.loads(shipment.regulatory_flags) if isinstance(shipment.regulatory_flags, str) \
+            else shipment.regulatory_flags
+        assert info["shipment_id"] == shipment.shipment_id
+        assert set(info) == {"shipment_id", *shipment_delay_checker.ASSESSMENT_FIELDS}
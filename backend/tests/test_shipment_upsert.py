@@ -0,0 +1,51 @@
+# tests/test_shipment_upsert.py
+
+import os
+import sys
+
+import pytest
+
+import models
+import priority_stats
+from schemas import ShipmentCreate
+from shipment_upsert import upsert_shipments
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from synthetic_data import make_shipments  # noqa: E402
+
+
+def _rows(*weights) -> list:
+    rows = [ShipmentCreate(**row).dict() for row in make_shipments(len(weights), seed=1)]
+    for row, weight in zip(rows, weights):
+        row["weight"] = weight
+    return rows
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_upsert_inserts_updates_and_skips(db, request, indexed):
+    if not indexed:
+        request.getfixturevalue("without_key_index")
+
+    first = upsert_shipments(db, _rows(10.0, 20.0))
+    db.commit()
+    second = upsert_shipments(db, _rows(10.0, 25.0, 5.0))
+    db.commit()
+
+    assert len(first["inserted"]) == 2
+    assert len(second["inserted"]) == 1
+    assert (second["updated"], second["skipped"]) == (first["inserted"][1:], first["inserted"][:1])
+    assert sorted(s.weight for s in db.query(models.Shipment)) == [5.0, 10.0, 25.0]
+
+
+def test_update_off_a_bound_shrinks_it_and_forces_a_full_rescore(db):
+    upsert_shipments(db, _rows(10.0, 20.0, 15.0))
+    db.commit()
+    assert priority_stats.rescore(db)["mode"] == "full"
+    assert priority_stats.rescore(db)["mode"] == "incremental"
+
+    # The 20 kg row held the max; lowering it must pull the bound in
+    upsert_shipments(db, _rows(10.0, 12.0, 15.0))
+    db.commit()
+
+    assert priority_stats.load_bounds(db)["weight"] == (10.0, 15.0)
+    assert priority_stats.rescore(db)["mode"] == "full"
@@ -0,0 +1,138 @@
+# tests/test_spatial.py
+#
+# Grid prefilter results against brute-force haversine, and the work a
+# radius query does as the table grows (SQLite VM steps, counted with the
+# connection's progress handler).
+
+import random
+from datetime import date
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+import models
+import spatial
+
+ADDRESS = {"city": "c"}
+
+
+def _rows(points):
+    return [spatial.index_shipment({
+        "shipment_id": f"S{i}", "order_id": f"O{i}", "customer_id": "C",
+        "origin_address": ADDRESS, "destination_address": ADDRESS,
+        "value": 1.0, "weight": 1.0, "volume": 1.0, "shelf_life_days": 1,
+        "delivery_date": date(2030, 1, 1), "shipment_type": "normal",
+        "origin_lat": lat, "origin_lng": lng, "destination_lat": lat, "destination_lng": lng,
+    }) for i, (lat, lng) in enumerate(points)]
+
+
+def _session(points) -> Session:
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    session = Session(engine)
+    session.execute(insert(models.Shipment.__table__), _rows(points))
+    session.commit()
+    return session
+
+
+def _brute_force(points, lat, lng, radius_km):
+    distances = spatial.haversine_km(lat, lng, [p[0] for p in points], [p[1] for p in points])
+    return {f"S{i}": float(d) for i, d in enumerate(distances) if d <= radius_km}
+
+
+@pytest.fixture(scope="module")
+def world():
+    rng = random.Random(3)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(3000)]
+    # Dense patches where the grid wraps or degenerates
+    for lat, lng in [(10.0, 179.9), (-5.0, -179.9), (89.5, 0.0), (-89.5, 120.0)]:
+        points += [(min(90.0, max(-90.0, lat + rng.uniform(-2, 2))), (lng + rng.uniform(-3, 3) + 180) % 360 - 180)
+                   for _ in range(300)]
+    session = _session(points)
+    yield session, points
+    session.close()
+
+
+@pytest.mark.parametrize("lat,lng,radius_km", [
+    (28.6, 77.2, 50), (28.6, 77.2, 800), (10.0, 179.9, 300), (-5.0, -179.9, 300),
+    (89.5, 0.0, 200), (-89.5, 120.0, 500), (0.0, 0.0, 5000), (0.0, 0.0, spatial.MAX_RADIUS_KM),
+])
+def test_radius_query_matches_brute_force(world, lat, lng, radius_km):
+    session, points = world
+    hits = spatial.shipments_within(session, lat, lng, radius_km)
+    expected = _brute_force(points, lat, lng, radius_km)
+
+    assert {s.shipment_id for s, _ in hits} == set(expected)
+    assert [d for _, d in hits] == sorted(d for _, d in hits)
+    for shipment, distance in hits:
+        assert distance == pytest.approx(expected[shipment.shipment_id], abs=1e-6)
+
+
+def test_prefilter_never_drops_a_point_in_range(world):
+    session, points = world
+    table = models.Shipment.__table__
+    rng = random.Random(5)
+    for _ in range(30):
+        lat, lng, radius_km = rng.uniform(-90, 90), rng.uniform(-180, 180), rng.uniform(1, 3000)
+        condition = spatial.radius_prefilter(table.c.origin_cell, table.c.origin_lat, table.c.origin_lng,
+                                             lat, lng, radius_km)
+        candidates = set(session.scalars(select(table.c.shipment_id).where(condition)))
+        assert set(_brute_force(points, lat, lng, radius_km)) <= candidates
+
+
+@pytest.mark.parametrize("lat,lng", [(28.6, 77.2), (10.0, 179.9), (89.9, -45.0)])
+def test_nearest_matches_brute_force(world, lat, lng):
+    session, points = world
+    distances = _brute_force(points, lat, lng, spatial.MAX_RADIUS_KM)
+    expected = sorted(distances.values())[:7]
+    hits = spatial.nearest_shipments(session, lat, lng, 7)
+    assert [d for _, d in hits] == pytest.approx(expected, abs=1e-6)
+
+
+def test_refine_keeps_nearest_within_radius():
+    rows = [("a", 0.0, 0.0), ("b", 0.0, 1.0), ("c", 0.0, 0.5), ("d", 0.0, 5.0)]
+    hits = spatial._refine(rows, 0.0, 0.0, 120.0, limit=2)
+    assert [k for k, _ in hits] == ["a", "c"]
+    assert hits[1][1] == pytest.approx(float(spatial.haversine_km(0.0, 0.0, [0.0], [0.5])[0]))
+    assert spatial._refine([], 0.0, 0.0, 10.0) == []
+
+
+def _vm_steps(session, statement) -> int:
+    """SQLite virtual machine instructions executed for `statement`, in tens."""
+    steps = [0]
+
+    def count():
+        steps[0] += 1
+        return 0
+
+    raw = session.connection().connection.dbapi_connection
+    raw.set_progress_handler(count, 10)
+    try:
+        session.execute(statement).all()
+    finally:
+        raw.set_progress_handler(None, 1)
+    return steps[0]
+
+
+def test_radius_query_work_is_sublinear_in_table_size():
+    table = models.Shipment.__table__
+    lat, lng, radius_km = 5.0, 75.0, 100.0
+    indexed, scanned, sizes = [], [], []
+    for strips in (1, 4, 16):
+        # Same density over a wider area: the neighbourhood of the query stays the same
+        rng = random.Random(strips)
+        points = [(rng.uniform(0, 10), rng.uniform(70, 70 + 10 * strips)) for _ in range(1000 * strips)]
+        session = _session(points)
+        condition = spatial.radius_prefilter(table.c.origin_cell, table.c.origin_lat, table.c.origin_lng,
+                                             lat, lng, radius_km)
+        indexed.append(_vm_steps(session, select(table.c.shipment_id).where(condition)))
+        scanned.append(_vm_steps(session, select(func.count()).select_from(table)
+                                 .where(table.c.origin_lat.between(lat - 1, lat + 1))))
+        sizes.append(len(points))
+        session.close()
+
+    growth = sizes[-1] / sizes[0]
+    assert scanned[-1] / scanned[0] > growth / 2
+    assert indexed[-1] / indexed[0] < np.sqrt(growth)